@@ -0,0 +1,118 @@
+"""Background autosave for PyurCad.
+
+The main (Tk) thread only takes a snapshot of the drawing, which is a
+shallow list of its entity objects. Entities are never modified once
+they are in the drawing (edits replace them), so the worker thread can
+safely build the drawlist, pickle it and write it out. The file is
+written in chunks of pickled lists, yielding between chunks so the Tk
+thread is never held off for long, and is put in place with an atomic
+rename. load() reads such a file like any other .pkl, but never makes it
+the drawing's file: it is only a copy to recover from.
+"""
+
+import os
+import pickle
+import queue
+import tempfile
+import threading
+import time
+
+CHUNK = 2000    # entities pickled between yields to the Tk thread
+
+
+SUFFIX = '.autosave.pkl'
+
+
+def autosave_path(filename):
+    """Return the autosave file name for a drawing (None = untitled).
+
+    Untitled drawings are autosaved in the temp directory under the
+    process id, so that sessions running side by side keep apart."""
+    if filename:
+        return os.path.splitext(filename)[0] + SUFFIX
+    return os.path.join(tempfile.gettempdir(),
+                        'pyurcad-%d%s' % (os.getpid(), SUFFIX))
+
+
+def is_autosave(filename):
+    return filename.endswith(SUFFIX)
+
+
+def newer_autosave(filename):
+    """Return the autosave path of drawing filename if that file exists
+    and was written after the drawing, else None."""
+    path = autosave_path(filename)
+    try:
+        if os.path.getmtime(path) > os.path.getmtime(filename):
+            return path
+    except OSError:
+        pass
+    return None
+
+
+def write_drawing(path, entity_list):
+    """Write entity_list to path as chunked pickles, atomically."""
+    tmpfile = path + '.tmp'
+    with open(tmpfile, 'wb') as f:
+        for i in range(0, len(entity_list), CHUNK):
+            drawlist = [{e.type: e.get_attribs()}
+                        for e in entity_list[i:i+CHUNK]]
+            pickle.dump(drawlist, f, 4)
+            time.sleep(0)   # let the Tk thread run
+        if not entity_list:
+            pickle.dump([], f, 4)
+    os.replace(tmpfile, path)
+
+
+class AutoSaver:
+    """Writes drawing snapshots on a worker thread.
+
+    changes counts the committed changes since the last snapshot was
+    handed over; the caller decides when enough have accumulated."""
+
+    def __init__(self):
+        self.changes = 0
+        self.generation = 0     # bumped by discard, to drop older snapshots
+        self._lock = threading.Lock()   # held while a snapshot is written
+        self.last_saved = None  # (path, time) of last completed autosave
+        self.last_error = None
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, path, entity_list):
+        """Queue a snapshot for writing. Return False if still busy."""
+        try:
+            self._queue.put_nowait((path, entity_list, self.generation))
+        except queue.Full:
+            return False
+        self.changes = 0
+        return True
+
+    def discard(self, path):
+        """Remove the autosave file at path, now that the drawing has been
+        saved, along with any snapshot not yet written."""
+        with self._lock:
+            self.generation += 1
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.changes = 0
+
+    def _run(self):
+        while True:
+            path, entity_list, generation = self._queue.get()
+            with self._lock:
+                if generation != self.generation:   # discarded
+                    continue
+                try:
+                    write_drawing(path, entity_list)
+                    self.last_saved = (path, time.time())
+                    self.last_error = None
+                except OSError as e:
+                    self.last_error = e
@@ -0,0 +1,11 @@
+"""Reproducible performance benchmarks for PyurCad.
+
+synth    parametric synthetic drawings (drawlists)
+model    headless model of the drawing / undo machinery
+run      command line runner; writes JSON and compares with a baseline
+
+Run from the repository root, for example:
+    python -m benchmarks.run --sizes 1000,10000 --out bench.json
+    python -m benchmarks.run --gui --baseline bench.json
+The --gui benchmarks need a display (use xvfb-run on a headless box).
+"""
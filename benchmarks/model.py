@@ -0,0 +1,68 @@
+"""Headless model of PyurCad's drawing map and undo / redo.
+
+Mirrors the bookkeeping PyurCad does around self.curr (a VersionedDict
+keyed by handle), save_delta, undo and redo, with integer handles in
+place of canvas items, so that it can be benchmarked without Tk.
+"""
+
+import history
+from versioned import VersionedDict
+
+
+class Model:
+
+    def __init__(self):
+        self.curr = VersionedDict()
+        self.prev = self.curr.snapshot()
+        self.undo_stack = history.UndoHistory()
+        self.redo_stack = history.UndoHistory()
+        self.next_handle = 1
+
+    def add(self, entity):
+        handle = self.next_handle
+        self.next_handle += 1
+        self.curr[handle] = entity
+        return handle
+
+    def remove(self, entity):
+        """Remove entity by value, as PyurCad.rem_draw does."""
+        for k, v in list(self.curr.items()):
+            if v == entity:
+                del self.curr[k]
+
+    def load(self, drawlist):
+        for ent_dict in drawlist:
+            (t, attribs), = ent_dict.items()
+            self.add(history.ENTITY_CLASSES[t](attribs))
+        self.save_delta()
+
+    def drawlist(self):
+        return [{e.type: e.get_attribs()} for e in self.curr.values()]
+
+    def save_delta(self):
+        if self.curr.changed(self.prev):
+            plus, minus = self.curr.diff(self.prev)
+            if plus or minus:
+                self.undo_stack.append({'+': plus, '-': minus})
+                self.redo_stack.clear()
+            self.prev = self.curr.snapshot()
+
+    def undo(self):
+        if self.undo_stack:
+            delta = self.undo_stack.pop()
+            self.redo_stack.append(delta)
+            for e in delta['+']:
+                self.remove(e)
+            for e in delta['-']:
+                self.add(e)
+            self.prev = self.curr.snapshot()
+
+    def redo(self):
+        if self.redo_stack:
+            delta = self.redo_stack.pop()
+            self.undo_stack.append(delta)
+            for e in delta['+']:
+                self.add(e)
+            for e in delta['-']:
+                self.remove(e)
+            self.prev = self.curr.snapshot()
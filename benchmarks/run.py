@@ -0,0 +1,317 @@
+"""Run the PyurCad benchmarks and write the results as JSON.
+
+Results are stored as {drawing: {benchmark: {size: seconds}}}, each the
+best of --repeat runs. With --baseline, every result is compared with the
+same entry of an earlier results file and those slower by more than
+--tolerance are reported as regressions.
+"""
+
+import argparse
+import json
+import os
+import pickle
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import geometryhelpers as gh
+import history
+from benchmarks import synth
+from benchmarks.model import Model
+
+SELECTION = 100     # entities moved / copied by the modify benchmarks
+
+
+def best_of(repeat, func, setup=None):
+    """Return the shortest of repeat timed calls of func(setup())."""
+    best = None
+    for i in range(repeat):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        func(arg)
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    return best
+
+
+def translated(entity, dp):
+    (t, attribs), = {entity.type: entity.get_attribs()}.items()
+    if t == 'gl':
+        (p0, p1), color = attribs
+        return history.ENTITY_CLASSES[t](
+            ((gh.add_pt(p0, dp), gh.add_pt(p1, dp)), color))
+    if t in ('gc', 'ga'):
+        coords, color = attribs
+        return history.ENTITY_CLASSES[t](
+            ((gh.add_pt(coords[0], dp),) + tuple(coords[1:]), color))
+    if t == 'tx':
+        return history.ENTITY_CLASSES[t]((gh.add_pt(attribs[0], dp),)
+                                         + attribs[1:])
+    return entity
+
+
+def rotated(entity, ang, ctr):
+    t = entity.type
+    if t == 'gl':
+        (p0, p1), color = entity.get_attribs()
+        return history.ENTITY_CLASSES[t](
+            ((gh.rotate_pt(p0, ang, ctr), gh.rotate_pt(p1, ang, ctr)), color))
+    if t in ('gc', 'ga'):
+        coords, color = entity.get_attribs()
+        coords = (gh.rotate_pt(coords[0], ang, ctr),) + tuple(coords[1:])
+        if t == 'ga':
+            coords = coords[:2] + (coords[2] + ang, coords[3] + ang)
+        return history.ENTITY_CLASSES[t]((coords, color))
+    return entity
+
+
+def headless_benchmarks(drawlist, repeat, tmpdir):
+    results = {}
+    pkl = os.path.join(tmpdir, 'bench.pkl')
+
+    def save_pkl(arg):
+        with open(pkl, 'wb') as f:
+            pickle.dump(drawlist, f)
+
+    def load_pkl(arg):
+        with open(pkl, 'rb') as f:
+            pickle.load(f)
+
+    results['pkl_save'] = best_of(repeat, save_pkl)
+    results['pkl_load'] = best_of(repeat, load_pkl)
+    try:
+        import dxf
+    except ImportError:     # ezdxf is optional
+        dxf = None
+    if dxf:
+        dxffile = os.path.join(tmpdir, 'bench.dxf')
+        results['dxf_save'] = best_of(
+            repeat, lambda arg: dxf.native2dxf(drawlist, dxffile))
+        results['dxf_load'] = best_of(
+            repeat, lambda arg: dxf.dxf2native(dxffile))
+
+    results['model_load'] = best_of(repeat, lambda m: m.load(drawlist), Model)
+
+    def loaded():
+        model = Model()
+        model.load(drawlist)
+        return model
+
+    def translate_copies(model):
+        for e in list(model.curr.values())[:SELECTION]:
+            model.add(translated(e, (5.0, 5.0)))
+        model.save_delta()
+
+    def rotate_copies(model):
+        for e in list(model.curr.values())[:SELECTION]:
+            model.add(rotated(e, 30.0, (0.0, 0.0)))
+        model.save_delta()
+
+    results['translate_copies'] = best_of(repeat, translate_copies, loaded)
+    results['rotate_copies'] = best_of(repeat, rotate_copies, loaded)
+
+    def modified():
+        model = loaded()
+        translate_copies(model)
+        return model
+
+    def undone():
+        model = modified()
+        model.undo()
+        return model
+
+    results['undo'] = best_of(repeat, lambda m: m.undo(), modified)
+    results['redo'] = best_of(repeat, lambda m: m.redo(), undone)
+    return results
+
+
+class Event:
+    """Stand-in for a Tk event passed to PyurCad's handlers."""
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def gui_benchmarks(app, drawlist, repeat, tmpdir):
+    results = {}
+    pkl = os.path.join(tmpdir, 'bench.pkl')
+    with open(pkl, 'wb') as f:
+        pickle.dump(drawlist, f)
+
+    def fresh():
+        app.del_all()
+        app.update_idletasks()
+
+    def load(arg):
+        app.load(pkl)
+        app.update_idletasks()
+
+    results['gui_load'] = best_of(repeat, load, fresh)
+
+    def regen(arg):
+        app.regen()
+        app.update_idletasks()
+
+    def pan(arg):
+        for i in range(10):
+            app.canvas.move_can(7, 3)
+            app.update_idletasks()
+        app.regen_pan()
+        app.update_idletasks()
+
+    def zoom(arg):
+        for factor in (1.1, 1.1, 1 / 1.1, 1 / 1.1):
+            app.canvas.scale(400, 270, factor, factor)
+            app.update_idletasks()
+        app.regen()
+        app.update_idletasks()
+
+    results['regen'] = best_of(repeat, regen)
+    results['pan'] = best_of(repeat, pan)
+    results['zoom'] = best_of(repeat, zoom)
+
+    rnd = random.Random(1)
+    points = [(rnd.randrange(800), rnd.randrange(540)) for i in range(200)]
+
+    def snap(arg):
+        app.set_sel_mode('pnt')
+        for x, y in points:
+            app.mouse_move(Event(x, y))
+        app.end()
+
+    results['snap_200'] = best_of(repeat, snap)
+
+    def selection():
+        app.end()
+        return [k for k, v in app.curr.items()
+                if v.type in ('gl', 'gc', 'ga', 'tx')][:SELECTION]
+
+    def translate_copies(handles):
+        app.obj_stack = [handles]
+        app.pt_stack = [(0.0, 0.0), (5.0, 5.0)]
+        app.float_stack = [1.0]
+        app.translate()
+        app.end()
+        app.update_idletasks()
+
+    def rotate_copies(handles):
+        app.obj_stack = [handles]
+        app.pt_stack = [(0.0, 0.0)]
+        app.float_stack = [30.0]
+        app.repeat = 1
+        app.rotate()
+        app.end()
+        app.update_idletasks()
+
+    results['translate_copies'] = best_of(repeat, translate_copies, selection)
+    results['rotate_copies'] = best_of(repeat, rotate_copies, selection)
+
+    def undo(arg):
+        app.undo()
+        app.update_idletasks()
+
+    def redo(arg):
+        app.redo()
+        app.update_idletasks()
+
+    results['undo'] = best_of(1, undo)
+    results['redo'] = best_of(1, redo)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print a comparison; return list of regressed (drawing, bench, size)."""
+    regressions = []
+    print('%-8s %-18s %9s %10s %10s %7s' % ('drawing', 'benchmark', 'size',
+                                           'base s', 'new s', 'ratio'))
+    for drawing, benches in sorted(results.items()):
+        for bench, sizes in sorted(benches.items()):
+            for size, seconds in sorted(sizes.items(), key=lambda i: int(i[0])):
+                base = baseline.get(drawing, {}).get(bench, {}).get(size)
+                if not base:
+                    continue
+                ratio = seconds / base
+                flag = ''
+                if ratio > 1 + tolerance:
+                    flag = '  SLOWER'
+                    regressions.append((drawing, bench, size))
+                print('%-8s %-18s %9s %10.4f %10.4f %7.2f%s' % (
+                    drawing, bench, size, base, seconds, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1000,10000',
+                        help='comma separated entity counts (up to 1000000)')
+    parser.add_argument('--drawings', default=','.join(synth.DRAWINGS),
+                        help='comma separated subset of: %s'
+                        % ', '.join(synth.DRAWINGS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--gui', action='store_true',
+                        help='also benchmark a live PyurCad window')
+    parser.add_argument('--out', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare with this JSON file')
+    parser.add_argument('--tolerance', type=float, default=.15,
+                        help='allowed slowdown vs baseline (0.15 = 15%%)')
+    args = parser.parse_args(argv)
+
+    sizes = [int(n) for n in args.sizes.split(',')]
+    drawings = args.drawings.split(',')
+    app = None
+    if args.gui:
+        import pyurcad
+        app = pyurcad.PyurCad()
+        app.update_idletasks()
+
+    results = {'headless': {}, 'gui': {}}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in drawings:
+            for n in sizes:
+                drawlist = synth.DRAWINGS[name](n)
+                print('%s %d...' % (name, n), file=sys.stderr)
+                r = headless_benchmarks(drawlist, args.repeat, tmpdir)
+                for bench, seconds in r.items():
+                    results['headless'].setdefault(name, {}).setdefault(
+                        bench, {})[str(n)] = seconds
+                if app:
+                    r = gui_benchmarks(app, drawlist, args.repeat, tmpdir)
+                    for bench, seconds in r.items():
+                        results['gui'].setdefault(name, {}).setdefault(
+                            bench, {})[str(n)] = seconds
+    if app:
+        app.destroy()
+
+    output = {'meta': {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'sizes': sizes,
+                       'repeat': args.repeat},
+              'results': results}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(output, f, indent=1)
+    else:
+        json.dump(output, sys.stdout, indent=1)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = []
+        for mode in results:
+            print('[%s]' % mode)
+            regressions += compare(results[mode], baseline.get(mode, {}),
+                                   args.tolerance)
+        if regressions:
+            print('%d regression(s)' % len(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
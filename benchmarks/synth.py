@@ -0,0 +1,98 @@
+"""Generate synthetic drawings as drawlists of {type: attribs} dicts.
+
+Every generator takes the number of entities wanted and returns a list in
+the format PyurCad saves and loads, so the results can be pickled, fed to
+dxf.native2dxf or loaded into the app. Output depends only on the
+arguments, so runs are reproducible.
+"""
+
+import math
+
+GEOMCOLOR = 'white'
+CONSTRCOLOR = 'magenta'
+TEXTCOLOR = 'white'
+DIMCOLOR = 'red'
+
+
+def _side(n):
+    return max(int(math.sqrt(n)), 1)
+
+
+def grid_lines(n, pitch=10.0):
+    """Square grid of short line segments (like a mesh of walls)."""
+    side = _side(n)
+    drawlist = []
+    for i in range(n):
+        row, col = divmod(i, side)
+        x, y = col * pitch, row * pitch
+        if i % 2:
+            coords = ((x, y), (x + pitch, y))
+        else:
+            coords = ((x, y), (x, y + pitch))
+        drawlist.append({'gl': (coords, GEOMCOLOR)})
+    return drawlist
+
+
+def clines(n, pitch=10.0):
+    """Alternating horizontal and vertical construction lines."""
+    drawlist = []
+    for i in range(n):
+        d = (i // 2) * pitch
+        coords = (0, 1, -d) if i % 2 else (1, 0, -d)
+        drawlist.append({'cl': (coords, CONSTRCOLOR)})
+    return drawlist
+
+
+def arc_part(n, pitch=30.0):
+    """Rows of 'bosses': a circle plus slotted arcs and connecting lines."""
+    side = _side(n // 4 + 1)
+    drawlist = []
+    i = 0
+    while len(drawlist) < n:
+        row, col = divmod(i, side)
+        cx, cy = col * pitch, row * pitch
+        r = pitch / 4
+        drawlist.append({'gc': (((cx, cy), r / 2), GEOMCOLOR)})
+        drawlist.append({'ga': (((cx, cy), r, 0.0, 180.0), GEOMCOLOR)})
+        drawlist.append({'ga': (((cx, cy), r, 180.0, 360.0), GEOMCOLOR)})
+        drawlist.append({'gl': (((cx + r, cy), (cx + pitch - r, cy)),
+                                GEOMCOLOR)})
+        i += 1
+    return drawlist[:n]
+
+
+def text_sheet(n, pitch=20.0):
+    """Grid of text labels in a few styles and sizes."""
+    side = _side(n)
+    styles = ('Arial', 'Calibri', 'Courier')
+    drawlist = []
+    for i in range(n):
+        row, col = divmod(i, side)
+        attribs = ((col * pitch * 3, row * pitch), 'T%d' % i,
+                   styles[i % 3], 8 + i % 3, TEXTCOLOR)
+        drawlist.append({'tx': attribs})
+    return drawlist
+
+
+def dim_sheet(n, pitch=20.0):
+    """Grid of horizontal and vertical linear dimensions."""
+    side = _side(n)
+    drawlist = []
+    for i in range(n):
+        row, col = divmod(i, side)
+        x, y = col * pitch * 2, row * pitch * 2
+        if i % 2:
+            coords = ((x, y), (x + pitch, y), (x + pitch / 2, y + pitch / 2),
+                      (0, 1, 0))
+        else:
+            coords = ((x, y), (x, y + pitch), (x - pitch / 2, y + pitch / 2),
+                      (1, 0, 0))
+        drawlist.append({'dl': (coords, DIMCOLOR)})
+    return drawlist
+
+
+DRAWINGS = {'lines': grid_lines,
+            'clines': clines,
+            'arcs': arc_part,
+            'text': text_sheet,
+            'dims': dim_sheet}
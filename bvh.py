@@ -0,0 +1,249 @@
+"""Bounding volume hierarchy for picking in the 3D view.
+
+A BVH is built once over the faces (or the edges) of a Mesh, by
+splitting the items at the median of the longest axis of their bounding
+box until a few are left in each leaf. Nodes are kept in flat arrays
+and each is numbered before its children, so refit() can recompute
+every box after the mesh's vertices have moved in one backward sweep,
+leaving the tree itself as it is.
+
+Rays are cast in the mesh's own coordinates, so turning the view never
+touches the tree: the ray from a canvas click is taken back through the
+inverse of the view transform instead.
+"""
+
+from array import array
+import math
+
+LEAF_SIZE = 4   # most items in a leaf
+INF = float('inf')
+
+
+class BVH:
+    """Hierarchy of axis-aligned boxes over the faces or edges of part."""
+
+    def __init__(self, part, kind='faces'):
+        self.part = part
+        self.kind = kind
+        if kind == 'faces':
+            self.count = part.face_count()
+        else:
+            self.count = part.edge_count()
+        self.order = array('i', range(self.count))  # items, leaf by leaf
+        self.boxes = array('d')     # 6 per node: xmin, ymin, zmin, max...
+        self.first = array('i')     # leaf: start in order, else -1
+        self.size = array('i')      # leaf: item count
+        self.left = array('i')      # inner node: children
+        self.right = array('i')
+        item_boxes = self.item_boxes()
+        self._build(item_boxes)
+
+    def item_boxes(self):
+        """Return the flat boxes of the items, at the current vertices."""
+        v = self.part.vertices
+        boxes = array('d')
+        if self.kind == 'faces':
+            start = self.part.face_start
+            index = self.part.face_index
+            runs = (index[start[f]:start[f+1]] for f in range(self.count))
+        else:
+            e = self.part.edges
+            runs = (e[2*k:2*k+2] for k in range(self.count))
+        for run in runs:
+            xs = [v[3*i] for i in run]
+            ys = [v[3*i+1] for i in run]
+            zs = [v[3*i+2] for i in run]
+            boxes.extend((min(xs), min(ys), min(zs),
+                          max(xs), max(ys), max(zs)))
+        return boxes
+
+    def _build(self, item_boxes):
+        order = self.order
+        # (node, lo, hi): node covers order[lo:hi]
+        self._add_node()
+        stack = [(0, 0, self.count)]
+        while stack:
+            node, lo, hi = stack.pop()
+            box = union(item_boxes, order[lo:hi])
+            self.boxes[6*node:6*node+6] = box
+            if hi - lo <= LEAF_SIZE:
+                self.first[node] = lo
+                self.size[node] = hi - lo
+                continue
+            extent = [box[3] - box[0], box[4] - box[1], box[5] - box[2]]
+            axis = extent.index(max(extent))
+            items = sorted(order[lo:hi], key=lambda i: item_boxes[6*i+axis]
+                           + item_boxes[6*i+axis+3])
+            order[lo:hi] = array('i', items)
+            mid = (lo + hi) // 2
+            left = self._add_node()
+            right = self._add_node()
+            self.left[node] = left
+            self.right[node] = right
+            stack.append((right, mid, hi))
+            stack.append((left, lo, mid))
+
+    def _add_node(self):
+        self.boxes.extend((0.0,) * 6)
+        self.first.append(-1)
+        self.size.append(0)
+        self.left.append(-1)
+        self.right.append(-1)
+        return len(self.first) - 1
+
+    def refit(self):
+        """Recompute the boxes after the part's vertices moved."""
+        item_boxes = self.item_boxes()
+        boxes = self.boxes
+        # children are numbered after their parent
+        for node in range(len(self.first) - 1, -1, -1):
+            if self.first[node] >= 0:
+                lo = self.first[node]
+                box = union(item_boxes, self.order[lo:lo+self.size[node]])
+            else:
+                a = 6 * self.left[node]
+                b = 6 * self.right[node]
+                box = [min(boxes[a+k], boxes[b+k]) for k in range(3)] + \
+                      [max(boxes[a+k], boxes[b+k]) for k in range(3, 6)]
+            boxes[6*node:6*node+6] = array('d', box)
+
+    def candidates(self, origin, direction, pad=0.0, tmax=INF):
+        """Return the items whose boxes, grown by pad, the ray meets
+        before parameter tmax."""
+        if not self.count:
+            return []
+        inv = [1 / d if d else INF for d in direction]
+        boxes = self.boxes
+        found = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if not ray_box(origin, inv, boxes, 6*node, pad, tmax):
+                continue
+            if self.first[node] >= 0:
+                lo = self.first[node]
+                found.extend(self.order[lo:lo+self.size[node]])
+            else:
+                stack.append(self.right[node])
+                stack.append(self.left[node])
+        return found
+
+
+def union(item_boxes, items):
+    lo = [INF] * 3
+    hi = [-INF] * 3
+    for i in items:
+        for k in range(3):
+            if item_boxes[6*i+k] < lo[k]:
+                lo[k] = item_boxes[6*i+k]
+            if item_boxes[6*i+k+3] > hi[k]:
+                hi[k] = item_boxes[6*i+k+3]
+    return array('d', lo + hi)
+
+
+def ray_box(origin, inv, boxes, b, pad, tmax):
+    """Slab test of the ray against the box at boxes[b:b+6]."""
+    t0 = -INF
+    t1 = tmax
+    for k in range(3):
+        lo = boxes[b+k] - pad
+        hi = boxes[b+k+3] + pad
+        if inv[k] == INF:   # ray parallel to this slab
+            if not lo <= origin[k] <= hi:
+                return False
+            continue
+        ta = (lo - origin[k]) * inv[k]
+        tb = (hi - origin[k]) * inv[k]
+        if ta > tb:
+            ta, tb = tb, ta
+        if ta > t0:
+            t0 = ta
+        if tb < t1:
+            t1 = tb
+        if t0 > t1:
+            return False
+    return t1 >= 0
+
+
+def ray_face(part, f, origin, direction):
+    """Return the ray parameter t where the ray meets face f (split into
+    a fan of triangles), or None."""
+    v = part.vertices
+    face = part.face(f)
+    a = face[0]
+    pa = (v[3*a], v[3*a+1], v[3*a+2])
+    for b, c in zip(face[1:], face[2:]):
+        t = ray_triangle(origin, direction, pa, (v[3*b], v[3*b+1], v[3*b+2]),
+                         (v[3*c], v[3*c+1], v[3*c+2]))
+        if t is not None:
+            return t
+    return None
+
+
+def ray_triangle(o, d, a, b, c):
+    """Moller-Trumbore ray / triangle test (either side). Return t or None."""
+    e1 = (b[0]-a[0], b[1]-a[1], b[2]-a[2])
+    e2 = (c[0]-a[0], c[1]-a[1], c[2]-a[2])
+    p = (d[1]*e2[2] - d[2]*e2[1], d[2]*e2[0] - d[0]*e2[2],
+         d[0]*e2[1] - d[1]*e2[0])
+    det = e1[0]*p[0] + e1[1]*p[1] + e1[2]*p[2]
+    if abs(det) < 1e-12:
+        return None
+    s = (o[0]-a[0], o[1]-a[1], o[2]-a[2])
+    u = (s[0]*p[0] + s[1]*p[1] + s[2]*p[2]) / det
+    if u < 0 or u > 1:
+        return None
+    q = (s[1]*e1[2] - s[2]*e1[1], s[2]*e1[0] - s[0]*e1[2],
+         s[0]*e1[1] - s[1]*e1[0])
+    w = (d[0]*q[0] + d[1]*q[1] + d[2]*q[2]) / det
+    if w < 0 or u + w > 1:
+        return None
+    t = (e2[0]*q[0] + e2[1]*q[1] + e2[2]*q[2]) / det
+    return t if t >= 0 else None
+
+
+def ray_segment(o, d, p, q):
+    """Return (distance, t) between the ray and segment p-q at their
+    closest points, t being the parameter along the ray."""
+    u = (q[0]-p[0], q[1]-p[1], q[2]-p[2])
+    w = (o[0]-p[0], o[1]-p[1], o[2]-p[2])
+    a = d[0]*d[0] + d[1]*d[1] + d[2]*d[2]
+    b = d[0]*u[0] + d[1]*u[1] + d[2]*u[2]
+    c = u[0]*u[0] + u[1]*u[1] + u[2]*u[2]
+    dw = d[0]*w[0] + d[1]*w[1] + d[2]*w[2]
+    uw = u[0]*w[0] + u[1]*w[1] + u[2]*w[2]
+    den = a*c - b*b
+    s = (a*uw - b*dw) / den if den > 1e-12 * a * c else 0.0
+    s = min(1.0, max(0.0, s))      # along the segment
+    t = max(0.0, (b*s - dw) / a)   # along the ray
+    x = o[0] + t*d[0] - p[0] - s*u[0]
+    y = o[1] + t*d[1] - p[1] - s*u[1]
+    z = o[2] + t*d[2] - p[2] - s*u[2]
+    return math.sqrt(x*x + y*y + z*z), t
+
+
+def pick(faces, edges, origin, direction, tol):
+    """Return ('edge', e, t), ('face', f, t) or None for the ray.
+
+    The nearest face the ray meets is found first; an edge passing within
+    tol of the ray in front of (or on) that face is preferred to it."""
+    part = faces.part
+    best = None
+    tmax = INF
+    for f in faces.candidates(origin, direction):
+        t = ray_face(part, f, origin, direction)
+        if t is not None and t < tmax:
+            best = ('face', f, t)
+            tmax = t
+    # allow for the edges of the face hit, which lie on it
+    slack = tol / math.sqrt(sum(c*c for c in direction))
+    v = part.vertices
+    e = part.edges
+    closest = tol
+    for k in edges.candidates(origin, direction, tol, tmax + slack):
+        i, j = e[2*k], e[2*k+1]
+        dist, t = ray_segment(origin, direction, v[3*i:3*i+3], v[3*j:3*j+3])
+        if dist <= closest and t <= tmax + slack:
+            best = ('edge', k, t)
+            closest = dist
+    return best
@@ -0,0 +1,112 @@
+"""Perspective camera for the 3D view.
+
+The camera looks down its -z axis at an orbit target from a distance.
+Points go from world (ECS, mm) to view space by view(), and on to clip
+space by projection(); a point is in front of the near plane when
+z + w >= 0 in clip space. Edges are clipped against the near plane in
+clip space, before the divide by w, so that points behind the camera
+never reach the canvas.
+
+focus() ties the camera to the 2D view: the target is the ECS point at
+the middle of the canvas, and the distance is chosen so that, at the
+target, a mm covers as many pixels as it does in the 2D view. Panning
+and zooming the canvas with the Ctrl bindings thus move and dolly the
+camera.
+"""
+
+from array import array
+import math
+from matrix import Transform4
+
+try:
+    import numpy
+except ImportError:     # clip_points falls back to pure Python
+    numpy = None
+
+
+class Camera:
+    """Perspective camera orbiting target at distance."""
+
+    def __init__(self, fov=40.0, near=1.0, far=1e6,
+                 target=(0.0, 0.0, 0.0), distance=1000.0):
+        self.fov = fov              # vertical field of view, degrees
+        self.near = near
+        self.far = far
+        self.target = target
+        self.distance = distance
+
+    def focal(self, height):
+        """Return the focal length in pixels for a view height pixels high."""
+        return height / 2 / math.tan(math.radians(self.fov) / 2)
+
+    def focus(self, target, scale, height):
+        """Aim at target, from where a mm at target covers scale pixels."""
+        self.target = target
+        self.distance = self.focal(height) / scale
+
+    def view(self):
+        """Return the Transform4 from world to view space."""
+        x, y, z = self.target
+        return Transform4.translation(-x, -y, -z - self.distance)
+
+    def projection(self, aspect):
+        """Return the Transform4 from view to clip space."""
+        f = 1 / math.tan(math.radians(self.fov) / 2)
+        n = self.near
+        fr = self.far
+        return Transform4((f/aspect, 0.0, 0.0, 0.0,
+                           0.0, f, 0.0, 0.0,
+                           0.0, 0.0, (fr+n)/(n-fr), 2*fr*n/(n-fr),
+                           0.0, 0.0, -1.0, 0.0))
+
+    def viewport(self, left, top, width, height):
+        """Return (sx, tx, sy, ty) mapping normalized device x, y to
+        canvas coords for a view at left, top, width x height pixels."""
+        return (width/2, left + width/2, -height/2, top + height/2)
+
+
+def clip_points(T, xyz):
+    """Return the flat clip space coords [x0, y0, z0, w0, x1, ...] of the
+    points of the flat buffer xyz, by Transform4 T, without the divide."""
+    if numpy is not None:
+        pts = numpy.asarray(xyz, dtype=float).reshape(-1, 3)
+        m = numpy.array(T.m).reshape(4, 4)
+        return array('d', (pts @ m[:, :3].T + m[:, 3]).ravel())
+    a00, a01, a02, a03, a10, a11, a12, a13, \
+        a20, a21, a22, a23, a30, a31, a32, a33 = T.m
+    out = array('d')
+    extend = out.extend
+    it = iter(xyz)
+    for x, y, z in zip(it, it, it):
+        extend((a00*x+a01*y+a02*z+a03, a10*x+a11*y+a12*z+a13,
+                a20*x+a21*y+a22*z+a23, a30*x+a31*y+a32*z+a33))
+    return out
+
+
+def clip_edges(hom, edges, viewport):
+    """Clip edges to the near plane and return their canvas coords.
+
+    hom is as returned by clip_points, edges a flat list of vertex index
+    pairs. Return a flat list [x0, y0, x1, y1, ...] with one segment per
+    edge that is at least partly in front of the near plane."""
+    sx, tx, sy, ty = viewport
+    segments = []
+    extend = segments.extend
+    it = iter(edges)
+    for i, j in zip(it, it):
+        x0, y0, z0, w0 = hom[4*i:4*i+4]
+        x1, y1, z1, w1 = hom[4*j:4*j+4]
+        d0 = z0 + w0
+        d1 = z1 + w1
+        if d0 < 0:
+            if d1 < 0:
+                continue    # all behind the near plane
+            t = d0 / (d0 - d1)
+            x0, y0, w0 = x0 + t*(x1-x0), y0 + t*(y1-y0), w0 + t*(w1-w0)
+        elif d1 < 0:
+            t = d1 / (d1 - d0)
+            x1, y1, w1 = x1 + t*(x0-x1), y1 + t*(y0-y1), w1 + t*(w0-w1)
+        if w0 <= 0 or w1 <= 0:
+            continue    # degenerate: on the plane through the eye
+        extend((sx*x0/w0+tx, sy*y0/w0+ty, sx*x1/w1+tx, sy*y1/w1+ty))
+    return segments
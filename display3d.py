@@ -0,0 +1,227 @@
+"""Display list for the 3D view.
+
+Deleting every canvas item and creating it again on each frame makes Tk
+allocate, tag and index thousands of items per mouse motion. A
+DisplayList instead creates one line item per edge once, and on later
+frames only moves the items with canvas.coords(). Items are created or
+deleted only when the set of edges (the mesh topology) changes.
+
+A FaceList does the same for filled faces, with back-face culling, a
+depth sort and flat shading, and a SegmentList for the pieces of edges
+left by hidden-line removal.
+"""
+
+import math
+
+
+class DisplayList:
+    """Canvas line items showing the edges of a projected 3D model.
+
+    edges is a flat sequence of vertex indices [i0, j0, i1, j1, ...], one
+    pair per edge; coords is the flat list of canvas coordinates of the
+    vertices [x0, y0, x1, y1, ...], as returned by matrix.project_points."""
+
+    def __init__(self, canvas, tags='demo', **options):
+        self.canvas = canvas
+        self.tags = tags
+        self.options = options  # e.g. fill='red'
+        self.items = []
+        self.edges = ()
+        self.hidden = False
+
+    def draw(self, edges, coords):
+        """Show edges with their vertices at coords."""
+        if edges is not self.edges and edges != self.edges:
+            self.set_edges(edges)
+        if self.hidden:
+            self.set_state('normal')
+        canvas_coords = self.canvas.coords
+        it = iter(self.edges)
+        for item, i, j in zip(self.items, it, it):
+            canvas_coords(item, coords[2*i], coords[2*i+1],
+                          coords[2*j], coords[2*j+1])
+
+    def set_edges(self, edges):
+        """Create or delete line items so there is one per edge."""
+        n = len(edges) // 2
+        while len(self.items) < n:
+            self.items.append(self.canvas.create_line(
+                0, 0, 0, 0, tags=self.tags, **self.options))
+        while len(self.items) > n:
+            self.canvas.delete(self.items.pop())
+        self.edges = edges
+
+    def hide(self):
+        """Hide the items (without deleting them) until the next draw()."""
+        if not self.hidden:
+            self.set_state('hidden')
+
+    def set_state(self, state):
+        for item in self.items:
+            self.canvas.itemconfigure(item, state=state)
+        self.hidden = state == 'hidden'
+
+    def clear(self):
+        for item in self.items:
+            self.canvas.delete(item)
+        self.items = []
+        self.edges = ()
+        self.hidden = False
+
+
+class SegmentList:
+    """Pool of canvas line items showing loose segments, such as the
+    visible parts of edges found by hidden-line removal.
+
+    Items left over when fewer segments are drawn are hidden, so they can
+    be reused without creating them again."""
+
+    def __init__(self, canvas, tags='demo', **options):
+        self.canvas = canvas
+        self.tags = tags
+        self.options = options
+        self.items = []
+        self.shown = 0      # number of items in use
+
+    def draw(self, segments):
+        """Show segments, a flat list [x0, y0, x1, y1, ...] of coords."""
+        canvas = self.canvas
+        n = len(segments) // 4
+        while len(self.items) < n:
+            self.items.append(canvas.create_line(
+                0, 0, 0, 0, tags=self.tags, **self.options))
+        for k in range(self.shown, n):
+            canvas.itemconfigure(self.items[k], state='normal')
+        for k in range(n, self.shown):
+            canvas.itemconfigure(self.items[k], state='hidden')
+        self.shown = n
+        for k in range(n):
+            canvas.coords(self.items[k], segments[4*k:4*k+4])
+
+    def hide(self):
+        self.draw(())
+
+    def clear(self):
+        for item in self.items:
+            self.canvas.delete(item)
+        self.items = []
+        self.shown = 0
+
+
+LIGHT = (0.32, 0.45, 0.83)  # unit vector towards the light, in view space
+AMBIENT = 0.25              # fraction of full brightness facing away from it
+SHADES = 32                 # number of distinct shades of a face color
+
+
+class FaceList:
+    """Pool of canvas polygons showing the faces of a projected mesh.
+
+    Each frame, faces turned away from the viewer (+z in view space) are
+    culled if the mesh is closed, the rest are sorted back to front and
+    handed to the polygons in stacking order, so no restacking is needed.
+    Polygons left over are hidden, not deleted, and a polygon's fill is
+    only changed when its shade does."""
+
+    def __init__(self, canvas, tags='demo', color=(200, 200, 200),
+                 outline=''):
+        self.canvas = canvas
+        self.tags = tags
+        self.outline = outline
+        self.items = []
+        self.fills = []     # fill of each item, '' for a hidden item
+        r, g, b = color
+        self.shades = ['#%02x%02x%02x' % (int(r*i), int(g*i), int(b*i))
+                       for i in (AMBIENT + (1-AMBIENT)*k/SHADES
+                                 for k in range(SHADES+1))]
+
+    def draw(self, part, view, coords, transform, eye=None, near=None):
+        """Show the faces of Mesh part.
+
+        view holds the vertices transformed to view space (x, y, z per
+        vertex), coords their canvas coordinates (x, y per vertex) and
+        transform is the Transform4 that took the vertices to view space,
+        by which the face normals are turned. eye and near are as for
+        visible_faces()."""
+        faces = visible_faces(part, view, transform, eye, near)
+        faces.sort()
+        while len(self.items) < len(faces):
+            self.items.append(self.canvas.create_polygon(
+                0, 0, 0, 0, 0, 0, outline=self.outline, tags=self.tags))
+            self.fills.append(None)
+        canvas = self.canvas
+        start = part.face_start
+        index = part.face_index
+        for k, (depth, shade, f) in enumerate(faces):
+            item = self.items[k]
+            xy = []
+            for i in index[start[f]:start[f+1]]:
+                xy.append(coords[2*i])
+                xy.append(coords[2*i+1])
+            canvas.coords(item, xy)
+            fill = self.shades[shade]
+            if fill != self.fills[k]:
+                if not self.fills[k]:
+                    canvas.itemconfigure(item, state='normal')
+                canvas.itemconfigure(item, fill=fill)
+                self.fills[k] = fill
+        for k in range(len(faces), len(self.items)):
+            if self.fills[k]:
+                canvas.itemconfigure(self.items[k], state='hidden')
+                self.fills[k] = ''
+
+    def hide(self):
+        """Hide all the polygons (without deleting them)."""
+        for k, item in enumerate(self.items):
+            if self.fills[k]:
+                self.canvas.itemconfigure(item, state='hidden')
+                self.fills[k] = ''
+
+    def clear(self):
+        for item in self.items:
+            self.canvas.delete(item)
+        self.items = []
+        self.fills = []
+
+
+def visible_faces(part, view, transform, eye=None, near=None):
+    """Return [(depth, shade, face), ...] for the faces of part to draw.
+
+    depth is the mean view space z of the face's vertices. Faces whose
+    turned normal points away from the viewer are left out if the mesh
+    is closed; those of an open mesh are shaded from the side seen.
+    The viewer looks down -z from infinitely far away, or, for a
+    perspective view, from the view space point eye, in which case faces
+    reaching past the near plane (z > -near) are left out too."""
+    m = transform.m
+    a00, a01, a02, a10, a11, a12, a20, a21, a22 = (
+        m[0], m[1], m[2], m[4], m[5], m[6], m[8], m[9], m[10])
+    lx, ly, lz = LIGHT
+    cull = part.closed
+    normals = part.normals
+    start = part.face_start
+    index = part.face_index
+    faces = []
+    for f in range(len(start) - 1):
+        face = index[start[f]:start[f+1]]
+        if near is not None and max(view[3*i+2] for i in face) > -near:
+            continue
+        x, y, z = normals[3*f], normals[3*f+1], normals[3*f+2]
+        nx = a00*x + a01*y + a02*z
+        ny = a10*x + a11*y + a12*z
+        nz = a20*x + a21*y + a22*z
+        if eye is None:
+            facing = nz
+        else:
+            i = face[0]
+            facing = (nx*(eye[0] - view[3*i]) + ny*(eye[1] - view[3*i+1])
+                      + nz*(eye[2] - view[3*i+2]))
+        if facing <= 0 and cull:
+            continue
+        length = math.sqrt(nx*nx + ny*ny + nz*nz) or 1.0
+        if facing < 0:
+            length = -length     # back side of an open mesh
+        lit = (nx*lx + ny*ly + nz*lz) / length
+        shade = int(lit * SHADES) if lit > 0 else 0
+        depth = sum(view[3*i+2] for i in face) / len(face)
+        faces.append((depth, shade, f))
+    return faces
@@ -2,6 +2,7 @@
 """Utilities for translating between dxf and native cadvas (.pkl) format"""
 import math
 import ezdxf
+import entities
 
 GEOMCOLOR = "white"
 CONSTRCOLOR = "magenta"
@@ -29,6 +30,10 @@ def coef_to_pnt_n_vctr(coords):
     vector = normalize_vector((b, -a, 0))
     return (p0, vector)
 
+def xy(pnt):
+    """Return the (x, y) of a dxf point."""
+    return (pnt[0], pnt[1])
+
 def cnvrt_2pts_to_coef(pt1, pt2):
     """Return (a,b,c) coefficients of cline defined by 2 (x,y) pts."""
     x1, y1 = pt1
@@ -42,6 +47,7 @@ def dxf2native(filename):
     """Generate a dictionary of {k=type: v=attribs} from dxf entities."""
 
     drawlist = []
+    blocks = set()  # names of the blocks already defined in drawlist
     dwg = ezdxf.readfile(filename)
     for e in dwg.modelspace():  # e = dxf entity
         if e.dxftype() == 'XLINE':
@@ -52,6 +58,8 @@ def dxf2native(filename):
             # print(e.dxfattribs())
             coords = (e.dxf.start, e.dxf.end)
             drawlist.append({'gl': (coords, GEOMCOLOR)})
+        elif e.dxftype() == 'LWPOLYLINE':
+            drawlist.append({'pl': (lwpolyline_coords(e), GEOMCOLOR)})
         elif e.dxftype() == 'CIRCLE':
             # print(e.dxfattribs())
             coords = (e.dxf.center, e.dxf.radius)
@@ -69,31 +77,122 @@ def dxf2native(filename):
             size = e.dxfattribs()['height']
             attribs = (coords, text, style, size, 'white')  # no dxf color attrib
             drawlist.append({'tx': attribs})
+        elif e.dxftype() == 'INSERT':
+            name = e.dxf.name
+            if name not in blocks:
+                blocks.add(name)
+                block = dwg.blocks.get(name)
+                source = block_source(block, block.block.dxf.base_point)
+                drawlist.append({'bd': ((name, source), GEOMCOLOR)})
+            x, y = xy(e.dxf.insert)
+            coords = (name, (x, y), e.dxf.xscale, e.dxf.yscale,
+                      e.dxf.rotation)
+            drawlist.append({'bi': (coords, GEOMCOLOR)})
             
     return drawlist
 
 
+def lwpolyline_coords(e):
+    """Return the coords (points, bulges, closed) of a native polyline
+    from dxf LWPOLYLINE e."""
+
+    points = []
+    bulges = []
+    for x, y, b in e.get_points('xyb'):
+        points.extend((x, y))
+        bulges.append(b)
+    if not any(bulges):
+        bulges = []
+    return (tuple(points), tuple(bulges), bool(e.closed))
+
+
+def block_source(block, base_point):
+    """Return the source of a native block definition: the lines, circles
+    and arcs of dxf block, moved to put base_point at the origin. Other
+    entities (nested inserts included) are left out."""
+
+    bx, by = xy(base_point)
+    source = []
+    for e in block:
+        if e.dxftype() == 'LINE':
+            (x0, y0), (x1, y1) = xy(e.dxf.start), xy(e.dxf.end)
+            coords = ((x0 - bx, y0 - by), (x1 - bx, y1 - by))
+            source.append(('gl', (coords, GEOMCOLOR)))
+        elif e.dxftype() == 'LWPOLYLINE':
+            (points, bulges, closed) = lwpolyline_coords(e)
+            it = iter(points)
+            points = tuple(c for x, y in zip(it, it) for c in (x - bx, y - by))
+            source.append(('pl', ((points, bulges, closed), GEOMCOLOR)))
+        elif e.dxftype() == 'CIRCLE':
+            x, y = xy(e.dxf.center)
+            coords = ((x - bx, y - by), e.dxf.radius)
+            source.append(('gc', (coords, GEOMCOLOR)))
+        elif e.dxftype() == 'ARC':
+            x, y = xy(e.dxf.center)
+            coords = ((x - bx, y - by), e.dxf.radius,
+                      e.dxf.start_angle, e.dxf.end_angle)
+            source.append(('ga', (coords, GEOMCOLOR)))
+    return tuple(source)
+
+
+def expand_arrays(drawlist):
+    """Yield the {type: attribs} dicts of drawlist, with each array
+    replaced by the items of its copies, one at a time."""
+
+    for ent_dict in drawlist:
+        if 'ar' in ent_dict:
+            ar = entities.AR(ent_dict['ar'])
+            for t, attribs in ar.expand():
+                yield {t: attribs}
+        else:
+            yield ent_dict
+
+
+def add_item(layout, ent_dict):
+    """Add a construction line or geometry item to dxf layout."""
+
+    if 'cl' in ent_dict:
+        coords, color = ent_dict['cl']
+        pnt, vctr = coef_to_pnt_n_vctr(coords)
+        layout.add_xline(pnt, vctr)
+    if 'gl' in ent_dict:
+        (p0, p1), color = ent_dict['gl']
+        layout.add_line(p0, p1)
+    if 'pl' in ent_dict:
+        (points, bulges, closed), color = ent_dict['pl']
+        it = iter(points)
+        xyb = [(x, y, bulges[k] if bulges else 0.0)
+               for k, (x, y) in enumerate(zip(it, it))]
+        layout.add_lwpolyline(xyb, format='xyb', close=closed)
+    if 'gc' in ent_dict:
+        (center, radius), color = ent_dict['gc']
+        layout.add_circle(center, radius)
+    if 'ga' in ent_dict:
+        (center, radius, start, end), color = ent_dict['ga']
+        layout.add_arc(center, radius, start, end)
+
+
 def native2dxf(drawlist, dxf_filename):
     """Generate .dxf file format from native CADvas drawing."""
     
     # Create a new DXF R2010 drawing
     dwg = ezdxf.new('R2010')  # Official DXF version name: 'AC1024'
     msp = dwg.modelspace()  # Create new model space
-    # Add new entities to the model space
+    # Define blocks before the references to them
     for ent_dict in drawlist:
-        if 'cl' in ent_dict:
-            coords, color = ent_dict['cl']
-            pnt, vctr = coef_to_pnt_n_vctr(coords)
-            msp.add_xline(pnt, vctr)
-        if 'gl' in ent_dict:
-            (p0, p1), color = ent_dict['gl']
-            msp.add_line(p0, p1)
-        if 'gc' in ent_dict:
-            (center, radius), color = ent_dict['gc']
-            msp.add_circle(center, radius)
-        if 'ga' in ent_dict:
-            (center, radius, start, end), color = ent_dict['ga']
-            msp.add_arc(center, radius, start, end)
+        if 'bd' in ent_dict:
+            (name, source), color = ent_dict['bd']
+            block = dwg.blocks.new(name=name)
+            for t, attribs in source:
+                add_item(block, {t: attribs})
+    # Add new entities to the model space
+    for ent_dict in expand_arrays(drawlist):
+        add_item(msp, ent_dict)
+        if 'bi' in ent_dict:
+            (name, p, sx, sy, angle), color = ent_dict['bi']
+            msp.add_blockref(name, p, dxfattribs={'xscale': sx,
+                                                  'yscale': sy,
+                                                  'rotation': angle})
         if 'tx' in ent_dict:
             (coords, text, style, size, color) = ent_dict['tx']
             dxfattribs = dict((('align_point', coords),
@@ -10,6 +10,13 @@ DA Dimension Angular
 DR Dimension Radial
 """
 
+import bisect
+import functools
+import itertools
+import math
+
+ARC_SEGMENTS = 64   # chords in a full circle of a block's tessellation
+BLOCK_CACHE = 256   # block tessellations kept
 
 class CL:
     """Construction Line object initialized with a tuple of attributes.
@@ -195,6 +202,614 @@ class DL:
     def get_attribs(self):
         return (self.coords, self.color)
 
+class AR:
+    """Array object initialized with a tuple of attributes.
+
+    attribs = (coords, color)
+    coords = (source, layout)
+    source = ((type, attribs), ...) of the gl, gc, ga & pl items arrayed
+    layout = ('rect', rows, cols, dx, dy) or ('polar', count, angle, pc)
+
+    A polar array turns each copy by angle (degrees, CCW) about pc from
+    the one before. Only the source and the layout are stored; copies
+    are made by expand() when they are needed.
+    """
+
+    def __init__(self, attribs):
+        self.coords, self.color = attribs
+        self.type = 'ar'
+        self.show = True
+
+    def __hash__(self):
+        return hash(self.get_attribs())
+
+    def __eq__(self, other):
+        return (self.__class__ == other.__class__ and
+                self.coords == other.coords and
+                self.color == other.color)
+
+    def __repr__(self):
+        source, layout = self.coords
+        return "{} object of {} item(s) by {}".format(self.type, len(source),
+                                                     layout)
+
+    def get_attribs(self):
+        return (self.coords, self.color)
+
+    def count(self):
+        """Return the number of copies (the source being the first)."""
+        layout = self.coords[1]
+        if layout[0] == 'rect':
+            return layout[1] * layout[2]
+        return layout[1]
+
+    def bounds(self):
+        """Return (xmin, ymin, xmax, ymax) of the source."""
+        boxes = [_item_box(t, attribs[0]) for t, attribs in self.coords[0]]
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    def extent(self):
+        """Return (xmin, ymin, xmax, ymax) of all the copies."""
+        xmin, ymin, xmax, ymax = self.bounds()
+        layout = self.coords[1]
+        if layout[0] == 'rect':
+            kind, rows, cols, dx, dy = layout
+            xs = (0, (cols - 1)*dx)
+            ys = (0, (rows - 1)*dy)
+            return (xmin + min(xs), ymin + min(ys),
+                    xmax + max(xs), ymax + max(ys))
+        boxes = [_item_box(t, attribs[0]) for t, attribs in self.expand()]
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    def visible(self, box):
+        """Return the numbers of the copies that may show in box
+        (xmin, ymin, xmax, ymax), without looking at the others."""
+        xmin, ymin, xmax, ymax = self.bounds()
+        layout = self.coords[1]
+        if layout[0] == 'rect':
+            kind, rows, cols, dx, dy = layout
+            cs = _steps(cols, dx, xmin, xmax, box[0], box[2])
+            rs = _steps(rows, dy, ymin, ymax, box[1], box[3])
+            return [r*cols + c for r in rs for c in cs]
+        kind, count, angle, (px, py) = layout
+        # a copy is in the box if its turned bounding circle is
+        xc, yc = (xmin + xmax) / 2, (ymin + ymax) / 2
+        rad = math.hypot(xmax - xmin, ymax - ymin) / 2
+        found = []
+        for k in range(count):
+            a = math.radians(k * angle)
+            x = px + (xc - px)*math.cos(a) - (yc - py)*math.sin(a)
+            y = py + (xc - px)*math.sin(a) + (yc - py)*math.cos(a)
+            if (box[0] - rad <= x <= box[2] + rad and
+                    box[1] - rad <= y <= box[3] + rad):
+                found.append(k)
+        return found
+
+    def expand(self, which=None):
+        """Yield (type, attribs) of each item of the copies numbered in
+        which (default: all of them)."""
+        source, layout = self.coords
+        if which is None:
+            which = range(self.count())
+        for k in which:
+            if layout[0] == 'rect':
+                kind, rows, cols, dx, dy = layout
+                r, c = divmod(k, cols)
+                for t, attribs in source:
+                    yield t, _moved(t, attribs, c*dx, r*dy)
+            else:
+                kind, count, angle, pc = layout
+                for t, attribs in source:
+                    yield t, _turned(t, attribs, k*angle, pc)
+
+
+class PL:
+    """Polyline object initialized with a tuple of attributes.
+
+    attribs = (coords, color)
+    coords = (points, bulges, closed)
+    points = (x0, y0, x1, y1, ...) the vertices, as one flat tuple
+    bulges = (b0, b1, ...) one per vertex, or () if all segments are
+    straight. The segment from vertex k to the next is an arc if bk is
+    not 0: bk = tan(included angle / 4), > 0 for CCW (as in dxf).
+    closed = True if a segment joins the last vertex back to the first
+    """
+
+    def __init__(self, attribs):
+        self.coords, self.color = attribs
+        self.type = 'pl'
+        self.show = True
+        self._chord_ends = None     # built by segment_of_chord
+        self._chord_grid = None     # built by nearest_chord
+
+    def __hash__(self):
+        return hash(self.get_attribs())
+
+    def __eq__(self, other):
+        return (self.__class__ == other.__class__ and
+                self.coords == other.coords and
+                self.color == other.color)
+
+    def __repr__(self):
+        points, bulges, closed = self.coords
+        return "{} object of {} vertices{}".format(
+            self.type, len(points) // 2, ', closed' if closed else '')
+
+    def get_attribs(self):
+        return (self.coords, self.color)
+
+    def vertices(self):
+        """Return the vertices [(x, y), ...]."""
+        points = self.coords[0]
+        it = iter(points)
+        return list(zip(it, it))
+
+    def segments(self):
+        """Yield (p0, p1, bulge) of each segment."""
+        points, bulges, closed = self.coords
+        verts = self.vertices()
+        n = len(verts) if closed else len(verts) - 1
+        for k in range(max(0, n)):
+            b = bulges[k] if bulges else 0.0
+            yield verts[k], verts[(k + 1) % len(verts)], b
+
+    def path(self, segments=ARC_SEGMENTS):
+        """Return the polyline as a flat tuple of coords (x0, y0, ...),
+        each arc being split into chords (segments per full circle)."""
+        points, bulges, closed = self.coords
+        if not any(bulges):
+            return points + points[:2] if closed else points
+        path = list(points[:2])
+        for p0, p1, b in self.segments():
+            if b:
+                pc, r, a0, ext = _bulge_sweep(p0, p1, b)
+                n = _chord_count(ext, segments)
+                for k in range(1, n):
+                    a = math.radians(a0 + ext*k/n)
+                    path.extend((pc[0] + r*math.cos(a),
+                                 pc[1] + r*math.sin(a)))
+            path.extend(p1)
+        return tuple(path)
+
+    def segment_of_chord(self, k):
+        """Return the index of the segment holding chord k (from point k to
+        point k+1) of path()."""
+        if self._chord_ends is None:   # chords of segments up to each
+            ends = []
+            for p0, p1, b in self.segments():
+                n = _chord_count(_bulge_sweep(p0, p1, b)[3]) if b else 1
+                ends.append((ends[-1] if ends else 0) + n)
+            self._chord_ends = ends
+        return min(bisect.bisect_right(self._chord_ends, k),
+                   len(self._chord_ends) - 1)
+
+    def snap_points(self):
+        """Return the vertices and the midpoints of the segments."""
+        pts = self.vertices()
+        for p0, p1, b in self.segments():
+            pts.append(_segment_midpoint(p0, p1, b))
+        return pts
+
+    def segment_snap_points(self, k):
+        """Return the end points and the midpoint of segment k."""
+        p0, p1, b = next(itertools.islice(self.segments(), k, None))
+        return (p0, p1, _segment_midpoint(p0, p1, b))
+
+    def _grid(self):
+        """Return (path, size, cells): path() and a uniform grid of square
+        cells of side size, {(i, j): [k, ...]} listing the chords k whose
+        bounding boxes reach into each cell. Built on first use."""
+        if self._chord_grid is None:
+            path = self.path()
+            xs, ys = path[0::2], path[1::2]
+            n = len(xs) - 1
+            # about as many cells as chords, over the polyline's extent
+            size = (max(max(xs) - min(xs), max(ys) - min(ys)) /
+                    math.sqrt(max(n, 1))) or 1.0
+            cells = {}
+            for k in range(n):
+                x0, x1 = sorted((xs[k], xs[k+1]))
+                y0, y1 = sorted((ys[k], ys[k+1]))
+                for i in range(math.floor(x0 / size),
+                               math.floor(x1 / size) + 1):
+                    for j in range(math.floor(y0 / size),
+                                   math.floor(y1 / size) + 1):
+                        cells.setdefault((i, j), []).append(k)
+            self._chord_grid = (path, size, cells)
+        return self._chord_grid
+
+    def chord(self, k):
+        """Return the end points of chord k (point k to k+1) of path()."""
+        path = self._grid()[0]
+        return (path[2*k], path[2*k+1]), (path[2*k+2], path[2*k+3])
+
+    def nearest_chord(self, p, r):
+        """Return the index of the chord of path() passing nearest to point
+        p, of those within the square of half side r about p, or None.
+        Only the chords listed in the grid cells the square covers are
+        looked at."""
+        path, size, cells = self._grid()
+        x, y = p
+        i0, i1 = math.floor((x - r) / size), math.floor((x + r) / size)
+        j0, j1 = math.floor((y - r) / size), math.floor((y + r) / size)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(cells):
+            found = [ks for (i, j), ks in cells.items()
+                     if i0 <= i <= i1 and j0 <= j <= j1]
+        else:
+            found = [cells[i, j] for i in range(i0, i1 + 1)
+                     for j in range(j0, j1 + 1) if (i, j) in cells]
+        best = None
+        dmin = 2 * r * r    # to the square's corners
+        for k in set(itertools.chain.from_iterable(found)):
+            x0, y0, x1, y1 = path[2*k:2*k+4]
+            dx, dy = x1 - x0, y1 - y0
+            ll = dx*dx + dy*dy
+            t = ((x - x0)*dx + (y - y0)*dy) / ll if ll else 0.0
+            t = min(1.0, max(0.0, t))
+            d = (x0 + t*dx - x)**2 + (y0 + t*dy - y)**2
+            if d <= dmin:
+                dmin = d
+                best = k
+        return best
+
+    def nearest_segment(self, p, r):
+        """Return the index of the segment passing nearest to point p,
+        within about r of it, or None."""
+        k = self.nearest_chord(p, r)
+        return None if k is None else self.segment_of_chord(k)
+
+    def _bulge_list(self):
+        points, bulges, closed = self.coords
+        return list(bulges) if bulges else [0.0] * (len(points) // 2)
+
+    def split(self, k, p):
+        """Return the polylines left by breaking segment k at point p (put
+        on the segment): two if open (fewer if p is an end), one starting
+        and ending at p if closed."""
+        points, bulges, closed = self.coords
+        verts = self.vertices()
+        bul = self._bulge_list()
+        p0, p1, b = next(itertools.islice(self.segments(), k, None))
+        if b:
+            pc, r, a0, ext = _bulge_sweep(p0, p1, b)
+            a = math.atan2(p[1] - pc[1], p[0] - pc[0])
+            p = (pc[0] + r*math.cos(a), pc[1] + r*math.sin(a))
+            if ext > 0:     # from p0 round to p, the way the arc runs
+                sweep = (math.degrees(a) - a0) % 360
+            else:
+                sweep = -((a0 - math.degrees(a)) % 360)
+            b0 = math.tan(math.radians(sweep) / 4)
+            b1 = math.tan(math.radians(ext - sweep) / 4)
+        else:
+            b0 = b1 = 0.0
+        if closed:
+            n = len(verts)
+            order = [(k + 1 + m) % n for m in range(n)]
+            pieces = [([p] + [verts[m] for m in order] + [p],
+                       [b1] + [bul[m] for m in order[:-1]] + [b0, 0.0])]
+        else:
+            pieces = [(verts[:k+1] + [p], bul[:k] + [b0, 0.0]),
+                      ([p] + verts[k+1:], [b1] + bul[k+1:])]
+        found = []
+        for pts, bs in pieces:
+            pl = _pl_from(pts, bs, False, self.color)
+            if pl:
+                found.append(pl)
+        return found
+
+    def round_corner(self, k, tp1, tp2):
+        """Return the polyline with vertex k replaced by tangent points tp1
+        (on the segment before it) and tp2 (after it), joined by an arc
+        turning as the corner did; None if k is not a corner of two
+        straight segments."""
+        points, bulges, closed = self.coords
+        verts = self.vertices()
+        bul = self._bulge_list()
+        n = len(verts)
+        if not closed and not 0 < k < n - 1:
+            return None
+        if bul[k - 1] or bul[k]:
+            return None
+        (x0, y0), (x1, y1), (x2, y2) = verts[k - 1], verts[k], verts[(k+1) % n]
+        turn = math.atan2((x1 - x0)*(y2 - y1) - (y1 - y0)*(x2 - x1),
+                          (x1 - x0)*(x2 - x1) + (y1 - y0)*(y2 - y1))
+        return _pl_from(verts[:k] + [tp1, tp2] + verts[k+1:],
+                        bul[:k] + [math.tan(turn / 4)] + bul[k:],
+                        closed, self.color)
+
+    def remove_vertex(self, k):
+        """Return the polyline with vertex k dropped, its two straight
+        segments joined into one; None if they are not straight or too
+        few vertices would be left."""
+        points, bulges, closed = self.coords
+        verts = self.vertices()
+        bul = self._bulge_list()
+        n = len(verts)
+        if not closed and not 0 < k < n - 1:
+            return None
+        if bul[k - 1] or bul[k] or n - 1 < (3 if closed else 2):
+            return None
+        return _pl_from(verts[:k] + verts[k+1:], bul[:k] + bul[k+1:],
+                        closed, self.color)
+
+    def expand(self):
+        """Return the (type, attribs) of the gl & ga items making up the
+        polyline, one per segment."""
+        items = []
+        for p0, p1, b in self.segments():
+            if b:
+                items.append(('ga', (bulge_arc(p0, p1, b), self.color)))
+            else:
+                items.append(('gl', ((p0, p1), self.color)))
+        return items
+
+    def length(self):
+        total = 0.0
+        for p0, p1, b in self.segments():
+            chord = math.hypot(p1[0] - p0[0], p1[1] - p0[1])
+            if b:
+                angle = 4 * math.atan(abs(b))
+                total += chord * angle / (2 * math.sin(angle / 2))
+            else:
+                total += chord
+        return total
+
+
+def _pl_from(verts, bulges, closed, color):
+    """Return a PL of vertices verts [(x, y), ...] and one bulge per vertex,
+    with zero length segments dropped; None if fewer than 2 vertices."""
+    pts = []
+    bs = []
+    for p, b in zip(verts, bulges):
+        if pts and math.hypot(p[0] - pts[-1][0], p[1] - pts[-1][1]) < 1e-9:
+            bs[-1] = b
+            continue
+        pts.append(tuple(p))
+        bs.append(b)
+    if closed and len(pts) > 1 and \
+            math.hypot(pts[0][0] - pts[-1][0], pts[0][1] - pts[-1][1]) < 1e-9:
+        pts.pop()
+        bs.pop()
+    if len(pts) < 2:
+        return None
+    return PL(((tuple(c for p in pts for c in p),
+                tuple(bs) if any(bs) else (), closed), color))
+
+
+def _bulge_sweep(p0, p1, b):
+    """Return (pc, r, a0, ext) of the arc from p0 to p1 with bulge b,
+    swept from angle a0 by ext degrees (< 0 if CW)."""
+    pc, r, a0, a1 = bulge_arc(p0, p1, b)
+    ext = (a1 - a0) % 360 or 360.0
+    if b < 0:   # the arc runs CW, from a1 back to a0
+        a0, ext = a1, -ext
+    return pc, r, a0, ext
+
+
+def _chord_count(ext, segments=ARC_SEGMENTS):
+    """Return the number of chords of an arc of ext degrees, as in path."""
+    return max(2, math.ceil(segments * abs(ext) / 360))
+
+
+def _segment_midpoint(p0, p1, b):
+    """Return the midpoint of the segment from p0 to p1 with bulge b."""
+    mx, my = (p0[0] + p1[0]) / 2, (p0[1] + p1[1]) / 2
+    # the arc's midpoint lies off the chord by the sagitta
+    s = -b * math.hypot(p1[0] - p0[0], p1[1] - p0[1]) / 2
+    length = math.hypot(p1[0] - p0[0], p1[1] - p0[1]) or 1.0
+    return (mx - s*(p1[1] - p0[1])/length, my + s*(p1[0] - p0[0])/length)
+
+
+def bulge_arc(p0, p1, b):
+    """Return (pc, r, a0, a1) of the arc from p0 to p1 with bulge b, as the
+    coords of a GA (CCW from a0 to a1, so from p1 to p0 if b < 0)."""
+    (x0, y0), (x1, y1) = p0, p1
+    dx, dy = x1 - x0, y1 - y0
+    # the center lies left of the chord (for b > 0), off its midpoint
+    f = (1 - b*b) / (4 * b)
+    xc = (x0 + x1) / 2 - f*dy
+    yc = (y0 + y1) / 2 + f*dx
+    r = math.hypot(x0 - xc, y0 - yc)
+    a0 = math.degrees(math.atan2(y0 - yc, x0 - xc)) % 360
+    a1 = math.degrees(math.atan2(y1 - yc, x1 - xc)) % 360
+    if b < 0:
+        a0, a1 = a1, a0
+    return ((xc, yc), r, a0, a1)
+
+
+class BD:
+    """Block Definition object initialized with a tuple of attributes.
+
+    attribs = (coords, color)
+    coords = (name, source)
+    source = ((type, attribs), ...) of the gl, gc, ga & pl items of the
+    block, with the block's base point at the origin.
+
+    A block definition draws nothing itself; it is drawn wherever a block
+    reference (BI) names it.
+    """
+
+    def __init__(self, attribs):
+        self.coords, self.color = attribs
+        self.type = 'bd'
+        self.show = True
+
+    def __hash__(self):
+        return hash(self.get_attribs())
+
+    def __eq__(self, other):
+        return (self.__class__ == other.__class__ and
+                self.coords == other.coords and
+                self.color == other.color)
+
+    def __repr__(self):
+        name, source = self.coords
+        return "{} object {} of {} item(s)".format(self.type, name,
+                                                  len(source))
+
+    def get_attribs(self):
+        return (self.coords, self.color)
+
+
+class BI:
+    """Block Insert (reference) object initialized with a tuple of attributes.
+
+    attribs = (coords, color)
+    coords = (name, p, sx, sy, angle)
+
+    The block named is scaled by sx, sy about its base point, turned by
+    angle (degrees, CCW) and placed with its base point at p.
+    """
+
+    def __init__(self, attribs):
+        self.coords, self.color = attribs
+        self.type = 'bi'
+        self.show = True
+
+    def __hash__(self):
+        return hash(self.get_attribs())
+
+    def __eq__(self, other):
+        return (self.__class__ == other.__class__ and
+                self.coords == other.coords and
+                self.color == other.color)
+
+    def __repr__(self):
+        return "{} object with coordinates {}".format(self.type, self.coords)
+
+    def get_attribs(self):
+        return (self.coords, self.color)
+
+    def affine(self):
+        """Return (a, b, c, d, e, f) taking block coords x, y to
+        (a*x + b*y + e, c*x + d*y + f)."""
+        name, (px, py), sx, sy, angle = self.coords
+        cos = math.cos(math.radians(angle))
+        sin = math.sin(math.radians(angle))
+        return (sx*cos, -sy*sin, sx*sin, sy*cos, px, py)
+
+    def expand(self, source):
+        """Return the (type, attribs) of the items of block source as
+        placed by this reference, or None if they can't be drawn as gl,
+        gc, ga & pl items (the scale being unequal or negative)."""
+        name, p, sx, sy, angle = self.coords
+        if sx != sy or sx <= 0:
+            return None
+        items = []
+        for t, (coords, color) in source:
+            if t == 'gl':
+                coords = tuple(_scaled(q, sx) for q in coords)
+            elif t == 'pl':
+                points, bulges, closed = coords
+                coords = (tuple(c*sx for c in points), bulges, closed)
+            else:
+                coords = (_scaled(coords[0], sx), coords[1]*sx) + \
+                    tuple(coords[2:])
+            items.append((t, _moved(t, _turned(t, (coords, self.color),
+                                               angle, (0, 0)), *p)))
+        return items
+
+
+@functools.lru_cache(maxsize=BLOCK_CACHE)
+def block_paths(source):
+    """Return the items of block source as a tuple of paths, each a flat
+    tuple of coords (x0, y0, x1, y1, ...), arcs and circles being split
+    into chords. The result is cached, so every reference to a block
+    shares the one tessellation."""
+    paths = []
+    for t, (coords, color) in source:
+        if t == 'gl':
+            (x0, y0), (x1, y1) = coords
+            paths.append((x0, y0, x1, y1))
+            continue
+        if t == 'pl':
+            paths.append(PL((coords, color)).path())
+            continue
+        if t == 'gc':
+            (x, y), r = coords
+            a0, ext = 0.0, 360.0
+        else:
+            (x, y), r, a0, a1 = coords
+            ext = (a1 - a0) % 360 or 360.0
+        n = max(2, math.ceil(ARC_SEGMENTS * ext / 360))
+        path = []
+        for k in range(n + 1):
+            a = math.radians(a0 + ext*k/n)
+            path.extend((x + r*math.cos(a), y + r*math.sin(a)))
+        paths.append(tuple(path))
+    return tuple(paths)
+
+
+def _scaled(p, s):
+    return (p[0]*s, p[1]*s)
+
+
+def _item_box(t, coords):
+    """Return the box (xmin, ymin, xmax, ymax) of a gl, gc, ga or pl item
+    (the whole circle of an arc)."""
+    if t == 'gl':
+        (x0, y0), (x1, y1) = coords
+        return (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+    if t == 'pl':
+        path = PL((coords, None)).path()
+        return (min(path[0::2]), min(path[1::2]),
+                max(path[0::2]), max(path[1::2]))
+    (x, y), r = coords[:2]
+    return (x - r, y - r, x + r, y + r)
+
+
+def _steps(n, pitch, lo, hi, box_lo, box_hi):
+    """Return the range of k < n for which [lo, hi] moved by k*pitch
+    overlaps [box_lo, box_hi]."""
+    if not pitch:
+        return range(n) if lo <= box_hi and hi >= box_lo else range(0)
+    k0 = (box_lo - hi) / pitch
+    k1 = (box_hi - lo) / pitch
+    if pitch < 0:
+        k0, k1 = k1, k0
+    return range(max(0, math.ceil(k0)), min(n, math.floor(k1) + 1))
+
+
+def _moved(t, attribs, dx, dy):
+    """Return attribs of a gl, gc, ga or pl item moved by dx, dy."""
+    coords, color = attribs
+    if t == 'gl':
+        (x0, y0), (x1, y1) = coords
+        return (((x0 + dx, y0 + dy), (x1 + dx, y1 + dy)), color)
+    if t == 'pl':
+        points, bulges, closed = coords
+        it = iter(points)
+        points = tuple(c for x, y in zip(it, it) for c in (x + dx, y + dy))
+        return ((points, bulges, closed), color)
+    (x, y), rest = coords[0], coords[1:]
+    return (((x + dx, y + dy),) + tuple(rest), color)
+
+
+def _turned(t, attribs, angle, pc):
+    """Return attribs of a gl, gc, ga or pl item turned by angle about
+    pc."""
+    coords, color = attribs
+    a = math.radians(angle)
+    cos, sin = math.cos(a), math.sin(a)
+    px, py = pc
+
+    def turn(p):
+        x, y = p[0] - px, p[1] - py
+        return (px + x*cos - y*sin, py + x*sin + y*cos)
+    if t == 'gl':
+        return ((turn(coords[0]), turn(coords[1])), color)
+    if t == 'gc':
+        return ((turn(coords[0]), coords[1]), color)
+    if t == 'pl':
+        points, bulges, closed = coords
+        it = iter(points)
+        points = tuple(c for p in zip(it, it) for c in turn(p))
+        return ((points, bulges, closed), color)
+    pc_, r, a0, a1 = coords
+    return ((turn(pc_), r, (a0 + angle) % 360, (a1 + angle) % 360), color)
+
 if __name__ == "__main__":
     attribs = ((50,50), "this is some text", 'Verdana', 10, 'cyan',)
 
@@ -340,3 +340,23 @@ def rotate_pt(pt, ang, ctr):
     v = y * math.cos(A) + x * math.sin(A)
     return add_pt((u, v), ctr)
 
+
+
+def nearest_segment(coords, x, y):
+    """Return (x0, y0, x1, y1) of the segment of path coords (flat, as
+    [x0, y0, x1, y1, ...]) passing nearest to point x, y."""
+    if len(coords) <= 4:
+        return tuple(coords[:4])
+    best = None
+    dmin = None
+    for k in range(0, len(coords) - 2, 2):
+        x0, y0, x1, y1 = coords[k:k+4]
+        dx, dy = x1 - x0, y1 - y0
+        ll = dx*dx + dy*dy
+        t = ((x - x0)*dx + (y - y0)*dy) / ll if ll else 0.0
+        t = min(1.0, max(0.0, t))
+        d = (x0 + t*dx - x)**2 + (y0 + t*dy - y)**2
+        if dmin is None or d < dmin:
+            dmin = d
+            best = (x0, y0, x1, y1)
+    return best
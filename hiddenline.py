@@ -0,0 +1,208 @@
+"""Hidden-line removal for the 3D view.
+
+Works on projected vertices: a flat buffer of x, y (in the projection
+plane) and depth z per vertex, larger z being nearer the viewer, as the
+view-space vertices of the (orthographic) 3D view are.
+
+Each edge is tested only against the faces whose screen bounding boxes
+share a cell of a uniform grid with it. A face hides the part of an edge
+that lies inside its outline (found by clipping the edge to the face,
+which is assumed convex, as the faces of boxes and extrusions are) and
+behind its plane. The hidden intervals of an edge are merged and the
+rest of the edge is visible.
+"""
+
+import math
+
+EPS = 1e-9
+T_EPS = 1e-7    # spans of an edge closer than this (as fraction) are joined
+
+
+def hidden_lines(part, xyz, faces=None):
+    """Return (visible, hidden) segments of the edges of Mesh part.
+
+    faces lists the faces that can hide edges (default: all of them).
+    The segments are flat lists [x0, y0, x1, y1, ...] in the projection
+    plane."""
+    if faces is None:
+        faces = range(part.face_count())
+    grid = FaceGrid(part, xyz, faces)
+    visible = []
+    hidden = []
+    edges = part.edges
+    for k in range(0, len(edges), 2):
+        i, j = edges[k], edges[k+1]
+        x0, y0, z0 = xyz[3*i], xyz[3*i+1], xyz[3*i+2]
+        x1, y1, z1 = xyz[3*j], xyz[3*j+1], xyz[3*j+2]
+        spans = []
+        for f in grid.candidates(x0, y0, x1, y1):
+            verts = grid.face_verts[f]
+            if i in verts and j in verts:
+                continue    # a face can't hide its own sides
+            span = grid.hidden_span(f, x0, y0, z0, x1, y1, z1)
+            if span:
+                spans.append(span)
+        t = 0.0
+        for t0, t1 in merge(spans):
+            if t0 - t > T_EPS:
+                segment(visible, x0, y0, x1, y1, t, t0)
+            segment(hidden, x0, y0, x1, y1, t0, t1)
+            t = t1
+        if 1.0 - t > T_EPS:
+            segment(visible, x0, y0, x1, y1, t, 1.0)
+    return visible, hidden
+
+
+def segment(out, x0, y0, x1, y1, ta, tb):
+    dx = x1 - x0
+    dy = y1 - y0
+    out.extend((x0 + ta*dx, y0 + ta*dy, x0 + tb*dx, y0 + tb*dy))
+
+
+def merge(spans):
+    """Return the union of parameter intervals [(t0, t1), ...], sorted."""
+    merged = []
+    for t0, t1 in sorted(spans):
+        if merged and t0 - merged[-1][1] <= T_EPS:
+            if t1 > merged[-1][1]:
+                merged[-1][1] = t1
+        else:
+            merged.append([t0, t1])
+    return merged
+
+
+class FaceGrid:
+    """Uniform grid over the screen bounding boxes of the faces."""
+
+    def __init__(self, part, xyz, faces):
+        self.xyz = xyz
+        self.outline = {}       # {face: [(x, y), ...]} counterclockwise
+        self.plane = {}         # {face: (a, b, c)} with z = a*x + b*y + c
+        self.face_verts = {}    # {face: set of vertex indices}
+        boxes = []
+        start = part.face_start
+        index = part.face_index
+        for f in faces:
+            face = index[start[f]:start[f+1]]
+            plane = face_plane(xyz, face)
+            if plane is None:
+                continue    # seen edge on, hides nothing
+            pts = [(xyz[3*i], xyz[3*i+1]) for i in face]
+            if signed_area(pts) < 0:
+                pts.reverse()
+            self.outline[f] = pts
+            self.plane[f] = plane
+            self.face_verts[f] = set(face)
+            xs = [p[0] for p in pts]
+            ys = [p[1] for p in pts]
+            boxes.append((f, min(xs), min(ys), max(xs), max(ys)))
+        self.cells = {}
+        if not boxes:
+            self.size = 1.0
+            return
+        xmin = min(b[1] for b in boxes)
+        ymin = min(b[2] for b in boxes)
+        xmax = max(b[3] for b in boxes)
+        ymax = max(b[4] for b in boxes)
+        n = max(1, int(math.sqrt(len(boxes))))   # about one face per cell
+        self.size = max(xmax - xmin, ymax - ymin, EPS) / n
+        for f, x0, y0, x1, y1 in boxes:
+            for cell in self.cover(x0, y0, x1, y1):
+                self.cells.setdefault(cell, []).append(f)
+
+    def cover(self, x0, y0, x1, y1):
+        s = self.size
+        for i in range(int(math.floor(min(x0, x1)/s)),
+                       int(math.floor(max(x0, x1)/s)) + 1):
+            for j in range(int(math.floor(min(y0, y1)/s)),
+                           int(math.floor(max(y0, y1)/s)) + 1):
+                yield (i, j)
+
+    def candidates(self, x0, y0, x1, y1):
+        """Return the faces that may overlap the segment on screen."""
+        found = set()
+        cells = self.cells
+        for cell in self.cover(x0, y0, x1, y1):
+            found.update(cells.get(cell, ()))
+        return found
+
+    def hidden_span(self, f, x0, y0, z0, x1, y1, z1):
+        """Return the (t0, t1) part of the edge hidden by face f, if any."""
+        span = clip(self.outline[f], x0, y0, x1, y1)
+        if not span:
+            return None
+        t0, t1 = span
+        tm = (t0 + t1) / 2
+        x = x0 + tm*(x1 - x0)
+        y = y0 + tm*(y1 - y0)
+        a, b, c = self.plane[f]
+        if a*x + b*y + c > z0 + tm*(z1 - z0) + 1e-6:
+            return span     # face is nearer the viewer there
+        return None
+
+
+def face_plane(xyz, face):
+    """Return (a, b, c) such that z = a*x + b*y + c on the face's plane,
+    or None if the face is seen edge on."""
+    nx = ny = nz = 0.0
+    cx = cy = cz = 0.0
+    for k, i in enumerate(face):
+        j = face[k-len(face)+1]
+        x0, y0, z0 = xyz[3*i], xyz[3*i+1], xyz[3*i+2]
+        x1, y1, z1 = xyz[3*j], xyz[3*j+1], xyz[3*j+2]
+        nx += (y0 - y1) * (z0 + z1)
+        ny += (z0 - z1) * (x0 + x1)
+        nz += (x0 - x1) * (y0 + y1)
+        cx += x0
+        cy += y0
+        cz += z0
+    if abs(nz) <= EPS * (abs(nx) + abs(ny) + abs(nz)) or nz == 0:
+        return None
+    n = len(face)
+    cx, cy, cz = cx/n, cy/n, cz/n
+    a = -nx / nz
+    b = -ny / nz
+    return (a, b, cz - a*cx - b*cy)
+
+
+def signed_area(pts):
+    area = 0.0
+    for k, (x0, y0) in enumerate(pts):
+        x1, y1 = pts[k-len(pts)+1]
+        area += x0*y1 - x1*y0
+    return area / 2
+
+
+def clip(pts, x0, y0, x1, y1):
+    """Clip segment p0-p1 to the convex CCW polygon pts (Cyrus-Beck).
+
+    Return the (t0, t1) inside it, or None. The segment must be inside
+    by more than EPS, so an edge merely touching a face's outline is not
+    hidden by it."""
+    dx = x1 - x0
+    dy = y1 - y0
+    t0 = 0.0
+    t1 = 1.0
+    for k, (ax, ay) in enumerate(pts):
+        bx, by = pts[k-len(pts)+1]
+        # inside is to the left of a->b: cross(b-a, p-a) > 0
+        ex = bx - ax
+        ey = by - ay
+        num = ex*(y0 - ay) - ey*(x0 - ax)
+        den = ex*dy - ey*dx
+        scale = math.hypot(ex, ey) * 1e-7
+        if abs(den) < EPS:
+            if num <= scale:
+                return None     # parallel to this side, and outside
+            continue
+        t = -num / den
+        if den > 0:
+            if t > t0:
+                t0 = t          # entering
+        elif t < t1:
+            t1 = t              # leaving
+        if t0 >= t1:
+            return None
+    if t1 - t0 <= T_EPS:
+        return None
+    return (t0, t1)
@@ -0,0 +1,153 @@
+"""Bounded undo / redo history for PyurCad.
+
+Each undo step is a delta {'+': set_of_entities, '-': set_of_entities}.
+The most recent steps are kept as live entity objects. Older steps are
+packed into (type, attribs) tuples, pickled and zlib compressed. Once the
+compressed steps exceed the memory budget, the oldest of them are spilled
+to a temporary file and read back only when the user undoes that far.
+"""
+
+import pickle
+import tempfile
+import zlib
+import entities
+
+ENTITY_CLASSES = {'cl': entities.CL,
+                  'cc': entities.CC,
+                  'gl': entities.GL,
+                  'pl': entities.PL,
+                  'gc': entities.GC,
+                  'ga': entities.GA,
+                  'tx': entities.TX,
+                  'dl': entities.DL,
+                  'ar': entities.AR,
+                  'bd': entities.BD,
+                  'bi': entities.BI}
+
+
+def pack_delta(delta):
+    """Return delta with its entity objects reduced to (type, attribs)."""
+    return {k: [(e.type, e.get_attribs()) for e in v]
+            for k, v in delta.items()}
+
+
+def unpack_delta(packed):
+    """Rebuild a delta of entity objects from a packed delta."""
+    return {k: {ENTITY_CLASSES[t](attribs) for t, attribs in v}
+            for k, v in packed.items()}
+
+
+class UndoHistory:
+    """Stack of undo deltas with a bounded memory footprint.
+
+    hot     number of recent deltas kept as live entity objects
+    budget  bytes of compressed deltas kept in memory before spilling
+    depth   maximum number of deltas retained (None = unlimited)
+
+    Only append, pop, clear, len and truth testing are supported, which
+    is all the undo / redo machinery needs."""
+
+    def __init__(self, hot=20, budget=4*2**20, depth=None):
+        self.hot = hot
+        self.budget = budget
+        self.depth = depth
+        # oldest first: spilled items, then compressed items, then live ones
+        self._items = []    # delta | bytes | (offset, size)
+        self._nspilled = 0
+        self._ncompressed = 0
+        self._zip_bytes = 0
+        self._disk_bytes = 0
+        self._file = None   # temporary spill file, created on first spill
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __repr__(self):
+        return "UndoHistory({})".format(self.stats())
+
+    def append(self, delta):
+        self._items.append(delta)
+        if self.depth is not None and len(self._items) > self.depth:
+            self._drop_oldest()
+        self._enforce()
+
+    def pop(self):
+        item = self._items.pop()
+        if len(self._items) >= self._nspilled + self._ncompressed:
+            return item
+        if self._ncompressed:
+            self._ncompressed -= 1
+            self._zip_bytes -= len(item)
+            data = item
+        else:
+            self._nspilled -= 1
+            data = self._page_in(*item)
+        return unpack_delta(pickle.loads(zlib.decompress(data)))
+
+    def clear(self):
+        self._items.clear()
+        self._nspilled = self._ncompressed = 0
+        self._zip_bytes = 0
+        self._truncate(0)
+
+    def stats(self):
+        """Return a dict describing how the history is stored."""
+        n = len(self._items)
+        return {'steps': n,
+                'live': n - self._nspilled - self._ncompressed,
+                'compressed': self._ncompressed,
+                'spilled': self._nspilled,
+                'compressed_bytes': self._zip_bytes,
+                'disk_bytes': self._disk_bytes}
+
+    def _enforce(self):
+        """Compress deltas older than self.hot; spill past self.budget."""
+        items = self._items
+        i = self._nspilled + self._ncompressed
+        while i < len(items) - self.hot:
+            data = zlib.compress(pickle.dumps(pack_delta(items[i]), 4))
+            items[i] = data
+            self._zip_bytes += len(data)
+            self._ncompressed += 1
+            i += 1
+        while self._zip_bytes > self.budget and self._ncompressed:
+            i = self._nspilled
+            data = items[i]
+            items[i] = self._spill(data)
+            self._zip_bytes -= len(data)
+            self._ncompressed -= 1
+            self._nspilled += 1
+
+    def _spill(self, data):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix='pyurcad-undo-')
+        offset = self._disk_bytes
+        self._file.seek(offset)
+        self._file.write(data)
+        self._disk_bytes += len(data)
+        return (offset, len(data))
+
+    def _page_in(self, offset, size):
+        self._file.seek(offset)
+        data = self._file.read(size)
+        # spilled items form a stack in the file, so this one is last
+        self._truncate(offset if self._nspilled else 0)
+        return data
+
+    def _truncate(self, offset):
+        self._disk_bytes = offset
+        if self._file is not None:
+            self._file.truncate(offset)
+
+    def _drop_oldest(self):
+        item = self._items.pop(0)
+        if self._nspilled:
+            self._nspilled -= 1
+            if not self._nspilled:
+                self._truncate(0)
+        elif self._ncompressed:
+            self._ncompressed -= 1
+            self._zip_bytes -= len(item)
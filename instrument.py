@@ -0,0 +1,133 @@
+"""Opt-in timing of PyurCad's hot paths.
+
+install() wraps named methods of an object with timing wrappers stored as
+instance attributes; uninstall() removes them again, so when timing is off
+the methods are called exactly as before, at no cost. Each wrapped method
+keeps a rolling window of recent durations from which p50, p95 and max
+are reported.
+
+Others (the input recorder of replay.py) wrap the same methods, so all
+wrappers go through add_wrapper() / remove_wrappers(), which stack them
+in layers: removing one owner's layer leaves the others in place.
+"""
+
+import collections
+import functools
+import json
+import time
+
+WINDOW = 1000   # number of recent calls kept per method
+
+# {(obj id, name): (attribute before wrapping, [(owner, wrap), ...])}
+_layers = {}
+
+
+def add_wrapper(obj, name, owner, wrap):
+    """Replace obj.<name> by wrap(obj.<name>), on top of any wrappers of
+    other owners, until remove_wrappers(obj, owner)."""
+    key = (id(obj), name)
+    if key not in _layers:
+        _layers[key] = (obj.__dict__.get(name), [])
+    layers = _layers[key][1]
+    if any(o is owner for o, w in layers):
+        return
+    layers.append((owner, wrap))
+    setattr(obj, name, wrap(getattr(obj, name)))
+
+
+def remove_wrappers(obj, owner):
+    """Remove the wrappers owner added to obj, rewrapping what remains of
+    the other owners' layers in their original order."""
+    for key in [k for k in _layers if k[0] == id(obj)]:
+        previous, layers = _layers[key]
+        if not any(o is owner for o, w in layers):
+            continue
+        layers[:] = [(o, w) for o, w in layers if o is not owner]
+        name = key[1]
+        if previous is None:
+            delattr(obj, name)
+        else:
+            setattr(obj, name, previous)
+        for o, wrap in layers:
+            setattr(obj, name, wrap(getattr(obj, name)))
+        if not layers:
+            del _layers[key]
+
+
+def percentile(sorted_values, f):
+    """Return the value at fraction f (0..1) of a sorted list."""
+    if not sorted_values:
+        return 0.0
+    i = min(int(f * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[i]
+
+
+def summarize(durations):
+    """Return dict of count, p50, p95 and max (in ms) of durations (s)."""
+    values = sorted(durations)
+    return {'count': len(values),
+            'p50': percentile(values, .5) * 1000,
+            'p95': percentile(values, .95) * 1000,
+            'max': (values[-1] if values else 0.0) * 1000}
+
+
+class Timings:
+    """Rolling per-name timing histories."""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.samples = {}   # {name: deque of durations in seconds}
+        self.calls = collections.Counter()
+
+    def add(self, name, seconds):
+        if name not in self.samples:
+            self.samples[name] = collections.deque(maxlen=self.window)
+        self.samples[name].append(seconds)
+        self.calls[name] += 1
+
+    def wrap(self, name, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - t0)
+        return timed
+
+    def install(self, obj, names):
+        """Time calls to obj.<name> for each name until uninstall()."""
+        for name in names:
+            add_wrapper(obj, name, self, functools.partial(self.wrap, name))
+
+    def uninstall(self, obj):
+        remove_wrappers(obj, self)
+
+    def clear(self):
+        self.samples.clear()
+        self.calls.clear()
+
+    def report(self):
+        """Return {name: summary} for every timed name."""
+        report = {}
+        for name, durations in sorted(self.samples.items()):
+            report[name] = summarize(durations)
+            report[name]['calls'] = self.calls[name]
+        return report
+
+    def format_report(self):
+        lines = ['%-16s %7s %9s %9s %9s' % ('', 'calls', 'p50 ms',
+                                            'p95 ms', 'max ms')]
+        for name, r in self.report().items():
+            lines.append('%-16s %7d %9.2f %9.2f %9.2f' % (
+                name, r['calls'], r['p50'], r['p95'], r['max']))
+        return '\n'.join(lines)
+
+    def dump(self, file):
+        """Write the report, plus the raw recent samples, as JSON."""
+        data = {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'report': self.report(),
+                'samples_ms': {name: [d * 1000 for d in durations]
+                               for name, durations in self.samples.items()}}
+        with open(file, 'w') as f:
+            json.dump(data, f, indent=1)
@@ -0,0 +1,141 @@
+"""Append-only operation journal kept next to a .pkl drawing.
+
+Every committed undo delta is appended to <drawing>.pkl.journal as it
+happens, so a save only has to append a 'saved' marker and sync the file,
+and a crash loses nothing. The journal begins with the size and mtime of
+the base file it applies to; rewriting the base file (compaction) starts
+a new journal. Records are length-prefixed and checksummed, so a record
+torn by a crash is detected and ignored.
+"""
+
+import os
+import pickle
+import struct
+import zlib
+import history
+
+HEADER = struct.Struct('<II')   # payload length, crc32 of payload
+
+
+def journal_path(drawing):
+    return drawing + '.journal'
+
+
+def base_stamp(drawing):
+    """Return (size, mtime_ns) identifying the current base file."""
+    st = os.stat(drawing)
+    return (st.st_size, st.st_mtime_ns)
+
+
+def read_records(path):
+    """Return a list of (record, offset just past it) for the good records."""
+    records = []
+    offset = 0
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return records
+    with f:
+        while True:
+            head = f.read(HEADER.size)
+            if len(head) < HEADER.size:
+                break
+            size, crc = HEADER.unpack(head)
+            payload = f.read(size)
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                break
+            offset += HEADER.size + size
+            records.append((pickle.loads(payload), offset))
+    return records
+
+
+def recover(drawing):
+    """Return (saved, unsaved) lists of packed deltas for drawing.
+
+    saved deltas were committed by a journaled save and belong to the
+    drawing; unsaved ones were recorded after the last save (for example
+    before a crash). A journal written against a different version of
+    the base file is ignored."""
+    records = [r for r, _ in read_records(journal_path(drawing))]
+    if not records or records[0] != ('base', base_stamp(drawing)):
+        return [], []
+    saved = []
+    pending = []
+    for record in records[1:]:
+        if record[0] == 'delta':
+            pending.append(record[1])
+        elif record[0] == 'saved':
+            saved.extend(pending)
+            pending = []
+    return saved, pending
+
+
+def apply_delta(drawlist, packed):
+    """Apply a packed delta to a drawlist of {type: attribs} dicts."""
+    minus = {(t, attribs) for t, attribs in packed['-']}
+    if minus:
+        drawlist[:] = [d for d in drawlist
+                       if next(iter(d.items())) not in minus]
+    for t, attribs in packed['+']:
+        drawlist.append({t: attribs})
+
+
+class Journal:
+    """Journal for one drawing file, open for appending."""
+
+    def __init__(self, drawing, reset=False):
+        self.drawing = drawing
+        self.path = journal_path(drawing)
+        self.count = 0      # number of deltas in the journal
+        records = read_records(self.path)
+        stamp = ('base', base_stamp(drawing))
+        if reset or not records or records[0][0] != stamp:
+            self.f = open(self.path, 'wb')
+            self._write(stamp)
+            self.sync()
+        else:
+            saved_end = 0
+            deltas = 0
+            for record, end in records:
+                if record[0] == 'delta':
+                    deltas += 1
+                else:   # 'base' or 'saved'
+                    saved_end = end
+                    self.count = deltas
+            self.f = open(self.path, 'r+b')
+            self.f.truncate(saved_end)   # drop unsaved and torn records
+            self.f.seek(saved_end)
+        self.saved_end = self.f.tell()
+        self.saved_count = self.count
+
+    def _write(self, record):
+        payload = pickle.dumps(record, 4)
+        self.f.write(HEADER.pack(len(payload), zlib.crc32(payload)))
+        self.f.write(payload)
+
+    def append(self, delta):
+        """Record an undo delta (of entity objects) as it is committed."""
+        self._write(('delta', history.pack_delta(delta)))
+        self.f.flush()
+        self.count += 1
+
+    def mark_saved(self):
+        """Make every delta recorded so far part of the saved drawing."""
+        self._write(('saved',))
+        self.sync()
+        self.saved_end = self.f.tell()
+        self.saved_count = self.count
+
+    def discard_unsaved(self):
+        """Forget deltas recorded since the last save."""
+        self.f.truncate(self.saved_end)
+        self.f.seek(self.saved_end)
+        self.sync()
+        self.count = self.saved_count
+
+    def sync(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
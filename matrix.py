@@ -1,4 +1,10 @@
 import math
+from array import array
+
+try:
+	import numpy
+except ImportError:	# the batch functions fall back to pure Python
+	numpy = None
 
 
 class Vector3D:
@@ -84,7 +90,7 @@ class Matrix:
 			raise Exception('*** Matrix: error, getitem((row, col)), row, col problem! ***')
 		self.rows = rows
 		self.cols = cols
-		self.m = [[0.0]*rows for x in range(cols)]
+		self.m = [[0.0]*cols for x in range(rows)]
 
 		#If quadratic matrix then create identity one
 		if self.isQuadratic() and createidentity:
@@ -214,6 +220,8 @@ class Matrix:
 				for j in range(self.cols):
 					r.m[i][j] = self.m[i][j]*right
 			return r
+		elif isinstance(right, Transform4):
+			return Transform4.from_matrix(self)*right
 		else:
 			raise Exception('*** Matrix: error, matrix multiply with not matrix, vector or int or float! ***')
 
@@ -239,18 +247,28 @@ class Matrix:
 #isSymetric(): A=Atransposed
 #isNormal(): Atransposed*A = A*Atransposed
 
+	def lu(self):
+		''' Return the LU decomposition of the matrix, which can solve()
+		for any number of right-hand sides without factoring again. '''
+		return LU(self)
+
 	def det(self):#Only for quadratic matrices
 		if not self.isQuadratic():
 			raise Exception('*** Matrix: error, determinant of non-quadratic matrix! ***')
 		if self.rows == 2:
 			return self.m[0][0]*self.m[1][1]-self.m[0][1]*self.m[1][0]
 
-		return self.expandByMinorsOnRow(0)
+		return LU(self).det()
+
+	def solve(self, b):
+		''' Return x such that self*x = b. b is a list of numbers (x is then
+		a list) or a Matrix of right-hand side columns (x is a Matrix). '''
+		return LU(self).solve(b)
 
-	def expandByMinorsOnRow(self, row):#used by det()
+	def expandByMinorsOnRow(self, row):#cofactor expansion, O(n!)
 		assert(row < self.rows)
 		d = 0
-		for col in xrange(self.cols):
+		for col in range(self.cols):
 			d += (-1)**(row+col)*self.m[row][col]*self.minor(row, col).det()
 
 		return d
@@ -258,7 +276,7 @@ class Matrix:
 	def expandByMinorsOnCol(self, col):#used by det()
 		assert(col < self.cols)
 		d = 0
-		for row in xrange(self.rows):
+		for row in range(self.rows):
 			d += (-1)**(row+col)*self.m[row][col]*self.minor(row, col).det()
 
 		return d
@@ -275,9 +293,9 @@ class Matrix:
 		#Loop through the matrix, skipping over the row and column specified
 		#by i and j
 		minor_row = minor_col = 0
-		for self_row in xrange(self.rows):
+		for self_row in range(self.rows):
 			if not self_row == i: #skip row i
-				for self_col in xrange(self.cols):
+				for self_col in range(self.cols):
 					if not self_col == j: #Skip column j
 						mat.m[minor_row][minor_col] = self.m[self_row][self_col]
 						minor_col += 1
@@ -287,47 +305,429 @@ class Matrix:
 
 		return mat
 
-	def invert(self): 
-		if not self.isQuadratic():
-			raise Exception('*** Matrix: error, determinant of non-quadratic matrix! ***')
+	def invert(self):
+		return LU(self).inverse()
+
+
+class LU:
+	''' LU decomposition with partial pivoting of a quadratic Matrix A:
+	P*A = L*U, L unit lower triangular and U upper triangular, both kept
+	in one n*n list of rows (lu) and P as the row order (perm).
+
+	Factoring costs O(n^3) once; each solve() then costs O(n^2). Picking
+	the largest pivot in each column keeps the elimination stable. '''
+
+	EPS = 1e-12	# pivots this small, relative to the largest element, count as 0
+
+	def __init__(self, mat):
+		if not mat.isQuadratic():
+			raise Exception('*** LU: error, decomposition of non-quadratic matrix! ***')
+		n = mat.rows
+		a = [list(row) for row in mat.m]
+		perm = list(range(n))
+		sign = 1.0
+		tiny = LU.EPS*max(math.fabs(x) for row in a for x in row)
+		singular = False
+		for k in range(n):
+			# Partial pivoting: bring up the row with the largest |a[i][k]|
+			p = max(range(k, n), key=lambda i: math.fabs(a[i][k]))
+			if p != k:
+				a[k], a[p] = a[p], a[k]
+				perm[k], perm[p] = perm[p], perm[k]
+				sign = -sign
+			pivot = a[k][k]
+			if math.fabs(pivot) <= tiny:
+				singular = True
+				continue
+			rowk = a[k]
+			for i in range(k+1, n):
+				rowi = a[i]
+				f = rowi[k]/pivot
+				if f:
+					rowi[k] = f
+					for j in range(k+1, n):
+						rowi[j] -= f*rowk[j]
+				else:
+					rowi[k] = 0.0
+		self.n = n
+		self.lu = a
+		self.perm = perm
+		self.sign = sign
+		self.singular = singular
+
+	def det(self):
+		if self.singular:
+			return 0.0
+		d = self.sign
+		for k in range(self.n):
+			d *= self.lu[k][k]
+		return d
+
+	def solve(self, b):
+		''' Return x such that A*x = b, as for Matrix.solve(). '''
+		if self.singular:
+			raise Exception('*** LU: error, singular matrix! ***')
+		if isinstance(b, Matrix):
+			if b.rows != self.n:
+				raise Exception('*** LU: error, solve() with incompatible matrix! ***')
+			x = Matrix(b.rows, b.cols, False)
+			for j in range(b.cols):
+				col = self._solve([b.m[i][j] for i in range(b.rows)])
+				for i in range(b.rows):
+					x.m[i][j] = col[i]
+			return x
+		if len(b) != self.n:
+			raise Exception('*** LU: error, solve() with incompatible vector! ***')
+		return self._solve(b)
+
+	def _solve(self, b):
+		n = self.n
+		a = self.lu
+		# Forward substitution with L (unit diagonal), rows in pivot order
+		y = [float(b[p]) for p in self.perm]
+		for i in range(n):
+			row = a[i]
+			s = y[i]
+			for j in range(i):
+				s -= row[j]*y[j]
+			y[i] = s
+		# Back substitution with U
+		for i in range(n-1, -1, -1):
+			row = a[i]
+			s = y[i]
+			for j in range(i+1, n):
+				s -= row[j]*y[j]
+			y[i] = s/row[i]
+		return y
+
+	def inverse(self):
+		''' Return the inverse of A as a Matrix. '''
+		if self.singular:
+			raise Exception('*** LU: error, singular matrix! ***')
+		n = self.n
+		mat = Matrix(n, n, False)
+		for j in range(n):
+			e = [0.0]*n
+			e[j] = 1.0
+			col = self._solve(e)
+			for i in range(n):
+				mat.m[i][j] = col[i]
+		return mat
+
+
+class Transform4:
+	''' Immutable 4x4 transform stored as a flat, row-major 16-tuple.
+
+	A fast counterpart of a 4*4 Matrix for the 3D view: compose, inverse
+	and point transform are unrolled. Element (row, col) is m[4*row+col],
+	the same element as Matrix.m[row][col]. '''
+
+	__slots__ = ('m',)
+
+	def __init__(self, m=None):
+		if m is None:
+			m = IDENTITY4
+		elif len(m) != 16:
+			raise Exception('*** Transform4: error, needs 16 elements! ***')
+		self.m = tuple(m)
+
+	@classmethod
+	def from_matrix(cls, mat):
+		if not (mat.rows == mat.cols == 4):
+			raise Exception('*** Transform4: error, from_matrix() needs a 4*4 Matrix! ***')
+		return cls([mat.m[i][j] for i in range(4) for j in range(4)])
+
+	def to_matrix(self):
+		r = Matrix(4, 4, False)
+		for i in range(4):
+			r.m[i] = list(self.m[4*i:4*i+4])
+		return r
+
+	@classmethod
+	def translation(cls, x, y, z):
+		return cls((1.0, 0.0, 0.0, x,
+					0.0, 1.0, 0.0, y,
+					0.0, 0.0, 1.0, z,
+					0.0, 0.0, 0.0, 1.0))
+
+	@classmethod
+	def scaling(cls, x, y, z):
+		return cls((x, 0.0, 0.0, 0.0,
+					0.0, y, 0.0, 0.0,
+					0.0, 0.0, z, 0.0,
+					0.0, 0.0, 0.0, 1.0))
+
+	@classmethod
+	def rotx(cls, deg):
+		c = math.cos(math.radians(deg))
+		s = math.sin(math.radians(deg))
+		return cls((1.0, 0.0, 0.0, 0.0,
+					0.0, c, -s, 0.0,
+					0.0, s, c, 0.0,
+					0.0, 0.0, 0.0, 1.0))
+
+	@classmethod
+	def roty(cls, deg):
+		c = math.cos(math.radians(deg))
+		s = math.sin(math.radians(deg))
+		return cls((c, 0.0, s, 0.0,
+					0.0, 1.0, 0.0, 0.0,
+					-s, 0.0, c, 0.0,
+					0.0, 0.0, 0.0, 1.0))
+
+	@classmethod
+	def rotz(cls, deg):
+		c = math.cos(math.radians(deg))
+		s = math.sin(math.radians(deg))
+		return cls((c, -s, 0.0, 0.0,
+					s, c, 0.0, 0.0,
+					0.0, 0.0, 1.0, 0.0,
+					0.0, 0.0, 0.0, 1.0))
+
+	def __getitem__(self, location):
+		row, col = location
+		return self.m[4*row+col]
+
+	def __eq__(self, other):
+		return isinstance(other, Transform4) and self.m == other.m
+
+	def __hash__(self):
+		return hash(self.m)
+
+	def __str__(self):
+		s = ''
+		for i in range(4):
+			s += '%s\n' % list(self.m[4*i:4*i+4])
+		return s
+
+	def __mul__(self, right):
+		if isinstance(right, Transform4):
+			a00, a01, a02, a03, a10, a11, a12, a13, a20, a21, a22, a23, a30, a31, a32, a33 = self.m
+			b00, b01, b02, b03, b10, b11, b12, b13, b20, b21, b22, b23, b30, b31, b32, b33 = right.m
+			return Transform4((a00*b00+a01*b10+a02*b20+a03*b30,
+				a00*b01+a01*b11+a02*b21+a03*b31,
+				a00*b02+a01*b12+a02*b22+a03*b32,
+				a00*b03+a01*b13+a02*b23+a03*b33,
+				a10*b00+a11*b10+a12*b20+a13*b30,
+				a10*b01+a11*b11+a12*b21+a13*b31,
+				a10*b02+a11*b12+a12*b22+a13*b32,
+				a10*b03+a11*b13+a12*b23+a13*b33,
+				a20*b00+a21*b10+a22*b20+a23*b30,
+				a20*b01+a21*b11+a22*b21+a23*b31,
+				a20*b02+a21*b12+a22*b22+a23*b32,
+				a20*b03+a21*b13+a22*b23+a23*b33,
+				a30*b00+a31*b10+a32*b20+a33*b30,
+				a30*b01+a31*b11+a32*b21+a33*b31,
+				a30*b02+a31*b12+a32*b22+a33*b32,
+				a30*b03+a31*b13+a32*b23+a33*b33))
+		elif isinstance(right, Vector3D):
+			x, y, z = self.transform_point(right.x, right.y, right.z)
+			return Vector3D(x, y, z)
+		elif isinstance(right, Matrix):
+			return self*Transform4.from_matrix(right)
+		else:
+			raise Exception('*** Transform4: error, multiply with not Transform4, Matrix or vector! ***')
+
+	def transform_point(self, x, y, z):
+		''' Return transformed (x, y, z). Like Matrix*Vector3D, the result
+		is divided by w unless w is 0 or 1. '''
+		m = self.m
+		rx = m[0]*x+m[1]*y+m[2]*z+m[3]
+		ry = m[4]*x+m[5]*y+m[6]*z+m[7]
+		rz = m[8]*x+m[9]*y+m[10]*z+m[11]
+		w = m[12]*x+m[13]*y+m[14]*z+m[15]
+		if (w != 1 and w != 0):
+			return (rx/w, ry/w, rz/w)
+		return (rx, ry, rz)
+
+	def inverse(self):
+		a00, a01, a02, a03, a10, a11, a12, a13, a20, a21, a22, a23, a30, a31, a32, a33 = self.m
+		s0 = a00*a11-a10*a01
+		s1 = a00*a12-a10*a02
+		s2 = a00*a13-a10*a03
+		s3 = a01*a12-a11*a02
+		s4 = a01*a13-a11*a03
+		s5 = a02*a13-a12*a03
+		c5 = a22*a33-a32*a23
+		c4 = a21*a33-a31*a23
+		c3 = a21*a32-a31*a22
+		c2 = a20*a33-a30*a23
+		c1 = a20*a32-a30*a22
+		c0 = a20*a31-a30*a21
+		det = s0*c5-s1*c4+s2*c3+s3*c2-s4*c1+s5*c0
+		if det == 0:
+			raise Exception('*** Transform4: error, inverse of singular transform! ***')
+		d = 1.0/det
+		return Transform4((
+			(a11*c5-a12*c4+a13*c3)*d, (-a01*c5+a02*c4-a03*c3)*d,
+			(a31*s5-a32*s4+a33*s3)*d, (-a21*s5+a22*s4-a23*s3)*d,
+			(-a10*c5+a12*c2-a13*c1)*d, (a00*c5-a02*c2+a03*c1)*d,
+			(-a30*s5+a32*s2-a33*s1)*d, (a20*s5-a22*s2+a23*s1)*d,
+			(a10*c4-a11*c2+a13*c0)*d, (-a00*c4+a01*c2-a03*c0)*d,
+			(a30*s4-a31*s2+a33*s0)*d, (-a20*s4+a21*s2-a23*s0)*d,
+			(-a10*c3+a11*c1-a12*c0)*d, (a00*c3-a01*c1+a02*c0)*d,
+			(-a30*s3+a31*s1-a32*s0)*d, (a20*s3-a21*s1+a22*s0)*d))
+
+
+IDENTITY4 = (1.0, 0.0, 0.0, 0.0,
+			 0.0, 1.0, 0.0, 0.0,
+			 0.0, 0.0, 1.0, 0.0,
+			 0.0, 0.0, 0.0, 1.0)
+
+
+class Quaternion:
+	''' Unit quaternion w + xi + yj + zk for orienting the 3D view.
+
+	Rotations compose by multiplying (q1*q2 turns by q2, then by q1)
+	without gimbal lock, and to_transform() gives the rotation matrix
+	from 4 numbers with no trig. Angles are in degrees, as in Transform4. '''
+
+	__slots__ = ('w', 'x', 'y', 'z')
+
+	def __init__(self, w=1.0, x=0.0, y=0.0, z=0.0):
+		self.w = w
+		self.x = x
+		self.y = y
+		self.z = z
+
+	def __str__(self):
+		return '(%f, %f, %f, %f)' % (self.w, self.x, self.y, self.z)
+
+	@classmethod
+	def from_axis_angle(cls, axis, deg):
+		''' Rotation by deg about axis (x, y, z), which needn't be unit. '''
+		x, y, z = axis
+		mag = math.sqrt(x*x+y*y+z*z)
+		if not mag:
+			raise Exception('*** Quaternion: error, rotation about zero axis! ***')
+		s = math.sin(math.radians(deg)/2)/mag
+		return cls(math.cos(math.radians(deg)/2), x*s, y*s, z*s)
+
+	@classmethod
+	def from_euler(cls, ax, ay, az):
+		''' Same rotation as Transform4.rotx(ax)*roty(ay)*rotz(az). '''
+		return (cls.from_axis_angle((1.0, 0.0, 0.0), ax)
+				* cls.from_axis_angle((0.0, 1.0, 0.0), ay)
+				* cls.from_axis_angle((0.0, 0.0, 1.0), az))
+
+	def to_euler(self):
+		''' Return (ax, ay, az) such that rotx(ax)*roty(ay)*rotz(az) is
+		this rotation, each in [0, 360). ay is taken in [-90, 90] (mod
+		360) and az as 0 where only ax + az is defined (ay = +/-90). '''
+		m = self.to_transform().m
+		cy = math.hypot(m[6], m[10])	# cos(ay), >= 0
+		ay = math.atan2(m[2], cy)
+		if cy > 1e-12:
+			ax = math.atan2(-m[6], m[10])
+			az = math.atan2(-m[1], m[0])
+		else:	# gimbal lock
+			ax = math.atan2(m[9], m[5])
+			az = 0.0
+		# (a tiny negative angle % 360 rounds to 360.0; the second % fixes it)
+		return tuple(math.degrees(a) % 360.0 % 360.0 for a in (ax, ay, az))
+
+	def __mul__(self, q):
+		if isinstance(q, Quaternion):
+			return Quaternion(
+				self.w*q.w-self.x*q.x-self.y*q.y-self.z*q.z,
+				self.w*q.x+self.x*q.w+self.y*q.z-self.z*q.y,
+				self.w*q.y-self.x*q.z+self.y*q.w+self.z*q.x,
+				self.w*q.z+self.x*q.y-self.y*q.x+self.z*q.w)
 		else:
-			N = self.cols
-			mat = Matrix(N, N)
-			mo = self.copy()
-			for column in range(N):
-				# Swap row in case our pivot point is not working
-				if (mo.m[column][column] == 0):
-					big = column
-					for row in range(N):
-						if (math.fabs(mo.m[row][column]) > math.fabs(mo.m[big][column])):
-							big = row
-					# Print this is a singular matrix, return identity ?
-					if (big == column):
-						print("Singular matrix\n") #To stderr
-					# Swap rows                               
-					else: 
-						for j in range(N):
-							mo.m[column][j], mo.m[big][j] = mo.m[big][j], mo.m[column][j]
-							mat.m[column][j], mat.m[big][j] = mat.m[big][j], mat.m[column][j] 
-
-				#Set each row in the column to 0  
-				for row in range(N):
-					if (row != column):
-						coeff = mo.m[row][column]/mo.m[column][column]
-						if (coeff != 0):
-							for j in range(N):
-								mo.m[row][j] -= coeff*mo.m[column][j]
-								mat.m[row][j] -= coeff*mat.m[column][j]
-
-							#Set the element to 0 for safety
-							mo.m[row][column] = 0
-
-			# Set each element of the diagonal to 1
-			for row in range(N):
-				for column in range(N):
-					mat.m[row][column] /= mo.m[row][row]
-
-			return mat
+			raise Exception('*** Quaternion: error, multiplication with not quaternion! ***')
+
+	def normalized(self):
+		''' Return the quaternion scaled to unit length, undoing the drift
+		of many multiplications. '''
+		mag = math.sqrt(self.w*self.w+self.x*self.x+self.y*self.y+self.z*self.z)
+		if not mag:
+			raise Exception('*** Quaternion: error, normalizing zero quaternion! ***')
+		return Quaternion(self.w/mag, self.x/mag, self.y/mag, self.z/mag)
+
+	def to_transform(self):
+		''' Return the rotation as a Transform4. '''
+		w, x, y, z = self.w, self.x, self.y, self.z
+		xx, yy, zz = x*x, y*y, z*z
+		xy, xz, yz = x*y, x*z, y*z
+		wx, wy, wz = w*x, w*y, w*z
+		return Transform4((1.0-2*(yy+zz), 2*(xy-wz), 2*(xz+wy), 0.0,
+						   2*(xy+wz), 1.0-2*(xx+zz), 2*(yz-wx), 0.0,
+						   2*(xz-wy), 2*(yz+wx), 1.0-2*(xx+yy), 0.0,
+						   0.0, 0.0, 0.0, 1.0))
+
+
+def transform_points(T, xyz):
+	''' Transform a flat buffer of points [x0, y0, z0, x1, ...] by
+	Transform4 T in one pass; return the results as a flat array('d').
+	Points are divided by w unless w is 0 or 1, as with T*Vector3D. '''
+	if numpy is not None:
+		return array('d', _transform_numpy(T, xyz).ravel())
+	return array('d', _transform_python(T, xyz))
+
+
+def project_points(mvp, xyz, viewport):
+	''' Transform a flat buffer of points by the model-view-projection
+	Transform4 mvp and map the projected x, y to canvas coordinates.
+
+	viewport is (sx, tx, sy, ty): canvas x = sx*x+tx, canvas y = sy*y+ty.
+	Return a flat list [cx0, cy0, cx1, cy1, ...], as canvas.coords() and
+	create_line() take them. '''
+	sx, tx, sy, ty = viewport
+	if numpy is not None:
+		p = _transform_numpy(mvp, xyz)
+		c = numpy.empty((len(p), 2))
+		c[:, 0] = p[:, 0]*sx+tx
+		c[:, 1] = p[:, 1]*sy+ty
+		return c.ravel().tolist()
+	m = mvp.m
+	a00, a01, a02, a03, a10, a11, a12, a13 = m[:8]
+	a30, a31, a32, a33 = m[12:]
+	coords = []
+	append = coords.append
+	it = iter(xyz)
+	for x, y, z in zip(it, it, it):
+		px = a00*x+a01*y+a02*z+a03
+		py = a10*x+a11*y+a12*z+a13
+		w = a30*x+a31*y+a32*z+a33
+		if (w != 1 and w != 0):
+			px /= w
+			py /= w
+		append(px*sx+tx)
+		append(py*sy+ty)
+	return coords
+
+
+def _transform_python(T, xyz):
+	a00, a01, a02, a03, a10, a11, a12, a13, \
+		a20, a21, a22, a23, a30, a31, a32, a33 = T.m
+	out = []
+	append = out.append
+	it = iter(xyz)
+	for x, y, z in zip(it, it, it):
+		rx = a00*x+a01*y+a02*z+a03
+		ry = a10*x+a11*y+a12*z+a13
+		rz = a20*x+a21*y+a22*z+a23
+		w = a30*x+a31*y+a32*z+a33
+		if (w != 1 and w != 0):
+			rx /= w
+			ry /= w
+			rz /= w
+		append(rx)
+		append(ry)
+		append(rz)
+	return out
+
+
+def _transform_numpy(T, xyz):
+	''' Return an n*3 numpy array of the transformed points. '''
+	pts = numpy.asarray(xyz, dtype=float).reshape(-1, 3)
+	m = numpy.array(T.m).reshape(4, 4)
+	r = pts @ m[:3, :3].T + m[:3, 3]
+	w = pts @ m[3, :3] + m[3, 3]
+	divide = (w != 1) & (w != 0)
+	if divide.any():
+		r[divide] /= w[divide, None]
+	return r
 
 
 if __name__ == "__main__":
@@ -0,0 +1,370 @@
+"""Indexed meshes for the 3D view.
+
+A Mesh keeps each vertex once, in a flat array('d') of x, y, z, so that a
+frame transforms every vertex exactly once however many edges and faces
+use it. Faces are lists of vertex indices stored end to end (face_index),
+with face_start[f] giving where face f begins (face_start has one more
+entry than there are faces). Edges are a flat array('i') of index pairs,
+as display3d.DisplayList takes them.
+
+Surfaces of revolution are cached by (profile, axis, steps), so zooming
+back to a resolution already tessellated costs nothing.
+"""
+
+from array import array
+import functools
+import math
+import matrix
+
+
+class Mesh:
+    """Vertices, faces, edges and face normals of one part."""
+
+    def __init__(self, vertices, face_start=None, face_index=None,
+                 edges=None):
+        self.vertices = array('d', vertices)
+        self.face_start = array('i', face_start or [0])
+        self.face_index = array('i', face_index or [])
+        if edges is None:
+            edges = face_edges(self.face_start, self.face_index)
+        self.edges = array('i', edges)
+        self.normals = face_normals(self.vertices, self.face_start,
+                                    self.face_index)
+        self.closed = is_closed(self.face_start, self.face_index)
+
+    def __repr__(self):
+        return '<Mesh: %d vertices, %d edges, %d faces>' % (
+            self.vertex_count(), self.edge_count(), self.face_count())
+
+    def vertex_count(self):
+        return len(self.vertices) // 3
+
+    def edge_count(self):
+        return len(self.edges) // 2
+
+    def face_count(self):
+        return len(self.face_start) - 1
+
+    def face(self, f):
+        """Return the vertex indices of face f."""
+        return self.face_index[self.face_start[f]:self.face_start[f+1]]
+
+    def normal(self, f):
+        """Return the unit normal (x, y, z) of face f."""
+        return tuple(self.normals[3*f:3*f+3])
+
+    def bounds(self):
+        """Return (xmin, ymin, zmin, xmax, ymax, zmax) of the vertices."""
+        v = self.vertices
+        if not v:
+            return (0.0,) * 6
+        xs, ys, zs = v[0::3], v[1::3], v[2::3]
+        return (min(xs), min(ys), min(zs), max(xs), max(ys), max(zs))
+
+    def transform(self, T):
+        """Move the vertices in place by Transform4 T (a rigid motion or
+        scaling). Faces and edges are kept, so a bvh.BVH over the mesh
+        only needs refit()."""
+        self.vertices = matrix.transform_points(T, self.vertices)
+        self.normals = face_normals(self.vertices, self.face_start,
+                                    self.face_index)
+
+
+def face_edges(face_start, face_index):
+    """Return flat edge pairs for the sides of the faces, each edge once."""
+    seen = set()
+    edges = []
+    for f in range(len(face_start) - 1):
+        face = face_index[face_start[f]:face_start[f+1]]
+        for k, i in enumerate(face):
+            j = face[k-len(face)+1]     # next vertex, wrapping to the first
+            key = (i, j) if i < j else (j, i)
+            if key not in seen:
+                seen.add(key)
+                edges.extend(key)
+    return edges
+
+
+def is_closed(face_start, face_index):
+    """Return True if the faces enclose a volume: every side of every
+    face is shared by exactly two faces. Only then can faces turned away
+    from the viewer be skipped."""
+    count = {}
+    for f in range(len(face_start) - 1):
+        face = face_index[face_start[f]:face_start[f+1]]
+        for k, i in enumerate(face):
+            j = face[k-len(face)+1]
+            key = (i, j) if i < j else (j, i)
+            count[key] = count.get(key, 0) + 1
+    return bool(count) and all(n == 2 for n in count.values())
+
+
+def face_normals(vertices, face_start, face_index):
+    """Return flat unit normals of the faces, found by Newell's method,
+    which is correct for any planar (and robust for nearly planar)
+    polygon. Faces are counterclockwise seen from outside."""
+    normals = array('d')
+    v = vertices
+    for f in range(len(face_start) - 1):
+        face = face_index[face_start[f]:face_start[f+1]]
+        nx = ny = nz = 0.0
+        for k, i in enumerate(face):
+            j = face[k-len(face)+1]
+            x0, y0, z0 = v[3*i], v[3*i+1], v[3*i+2]
+            x1, y1, z1 = v[3*j], v[3*j+1], v[3*j+2]
+            nx += (y0 - y1) * (z0 + z1)
+            ny += (z0 - z1) * (x0 + x1)
+            nz += (x0 - x1) * (y0 + y1)
+        length = math.sqrt(nx*nx + ny*ny + nz*nz)
+        if length:
+            nx, ny, nz = nx/length, ny/length, nz/length
+        normals.extend((nx, ny, nz))
+    return normals
+
+
+class MeshBuilder:
+    """Collects vertices, faces and edges and builds a Mesh.
+
+    Vertices added with the same coordinates are stored only once."""
+
+    def __init__(self):
+        self.vertices = array('d')
+        self.vertex_map = {}    # {(x, y, z): index}
+        self.face_start = [0]
+        self.face_index = []
+        self.loose_edges = []   # edges not belonging to any face
+
+    def add_vertex(self, x, y, z):
+        """Return the index of vertex (x, y, z), adding it if new."""
+        key = (x, y, z)
+        i = self.vertex_map.get(key)
+        if i is None:
+            i = self.vertex_map[key] = len(self.vertices) // 3
+            self.vertices.extend(key)
+        return i
+
+    def add_face(self, points):
+        """Add a face through points [(x, y, z), ...]. Return its index."""
+        self.face_index.extend(self.add_vertex(*p) for p in points)
+        self.face_start.append(len(self.face_index))
+        return len(self.face_start) - 2
+
+    def add_edge(self, p1, p2):
+        self.loose_edges.extend((self.add_vertex(*p1), self.add_vertex(*p2)))
+
+    def build(self):
+        edges = face_edges(self.face_start, self.face_index)
+        edges.extend(self.loose_edges)
+        return Mesh(self.vertices, self.face_start, self.face_index, edges)
+
+
+def box(x0, y0, z0, x1, y1, z1):
+    """Return a Mesh of the box with opposite corners (x0, y0, z0) and
+    (x1, y1, z1)."""
+    mb = MeshBuilder()
+    mb.add_face([(x0, y0, z0), (x0, y1, z0), (x1, y1, z0), (x1, y0, z0)])
+    mb.add_face([(x0, y0, z1), (x1, y0, z1), (x1, y1, z1), (x0, y1, z1)])
+    mb.add_face([(x0, y0, z0), (x1, y0, z0), (x1, y0, z1), (x0, y0, z1)])
+    mb.add_face([(x1, y0, z0), (x1, y1, z0), (x1, y1, z1), (x1, y0, z1)])
+    mb.add_face([(x1, y1, z0), (x0, y1, z0), (x0, y1, z1), (x1, y1, z1)])
+    mb.add_face([(x0, y1, z0), (x0, y0, z0), (x0, y0, z1), (x0, y1, z1)])
+    return mb.build()
+
+
+def arc_points(pc, r, a0, a1, tol):
+    """Return points [(x, y), ...] along the arc (pc, r, a0, a1) (angles
+    in degrees, CCW from a0 to a1, as in GA entities) such that no chord
+    strays more than tol from the arc. a0 == a1 gives a full circle."""
+    ext = a1 - a0
+    if ext <= 0:
+        ext += 360
+    n = arc_segments(r, ext, tol)
+    x, y = pc
+    step = math.radians(ext) / n
+    start = math.radians(a0)
+    points = [(x + r*math.cos(start + k*step), y + r*math.sin(start + k*step))
+              for k in range(n)]
+    if ext == 360:
+        points.append(points[0])    # close exactly, so the ends are shared
+    else:
+        points.append((x + r*math.cos(math.radians(a1)),
+                       y + r*math.sin(math.radians(a1))))
+    return points
+
+
+def arc_segments(r, ext, tol):
+    """Return the number of chords needed for an arc of radius r and
+    extent ext degrees to stay within tol of the true arc."""
+    if tol <= 0 or tol >= r:
+        return max(1, int(math.ceil(ext / 90)))
+    max_step = 2 * math.degrees(math.acos(1 - tol/r))
+    return max(1, int(math.ceil(ext / max_step)))
+
+
+def extrude(profiles, height, z0=0.0):
+    """Return a Mesh of the walls swept by profiles moving up height.
+
+    profiles is a list of polylines [(x, y), ...] lying at z0. Each
+    segment of a polyline becomes one four-sided face. Polylines sharing
+    end points share vertices, so the corners of a wall layout are
+    transformed only once."""
+    z1 = z0 + height
+    mb = MeshBuilder()
+    for points in profiles:
+        for (xa, ya), (xb, yb) in zip(points, points[1:]):
+            mb.add_face([(xa, ya, z0), (xb, yb, z0), (xb, yb, z1),
+                         (xa, ya, z1)])
+    return mb.build()
+
+
+REVOLVE_STEPS = (8, 1024)   # fewest & most angular steps in a revolution
+REVOLVE_CACHE = 32          # revolved meshes kept
+
+
+def revolve_steps(radius, tol):
+    """Return the angular steps for a revolution of radius to stay within
+    tol of the true surface, rounded up to a power of 2 so that small
+    changes of zoom give the same (cached) tessellation."""
+    n = arc_segments(radius, 360, tol)
+    lo, hi = REVOLVE_STEPS
+    return min(hi, max(lo, 1 << (n - 1).bit_length()))
+
+
+def profile_radius(profile, axis):
+    """Return the largest distance of profile from axis (a, b, c)."""
+    a, b, c = axis
+    norm = math.hypot(a, b)
+    radius = 0.0
+    for kind, coords in profile:
+        if kind == 'gl':
+            pts, r = coords, 0.0
+        else:   # 'ga'
+            pts, r = coords[:1], coords[1]
+        for x, y in pts:
+            radius = max(radius, abs(a*x + b*y + c) / norm + r)
+    return radius
+
+
+@functools.lru_cache(maxsize=REVOLVE_CACHE)
+def revolve(profile, axis, steps):
+    """Return a Mesh of the surface swept by profile in a full turn about
+    the line axis, in steps equal steps.
+
+    profile is a tuple of ('gl', (p1, p2)) and ('ga', (pc, r, a0, a1))
+    items in the XY plane, axis the coefficients (a, b, c) of the line
+    ax + by + c = 0 in that plane. Arcs are split as finely as the turn.
+    The mesh is shared by later calls with the same arguments, so it must
+    not be changed."""
+    a, b, c = axis
+    norm = math.hypot(a, b)
+    nx, ny = a / norm, b / norm     # in-plane normal of the axis
+    ux, uy = -ny, nx                # direction of the axis
+    ox, oy = -c / norm * nx, -c / norm * ny     # axis point nearest 0, 0
+    turn = [(math.cos(2*math.pi*k/steps), math.sin(2*math.pi*k/steps))
+            for k in range(steps)]
+    turn.append(turn[0])    # close exactly, so the seam is shared
+
+    def ring(x, y):
+        """Return the points of x, y turned about the axis."""
+        s = (x - ox)*ux + (y - oy)*uy   # along the axis
+        r = (x - ox)*nx + (y - oy)*ny   # (signed) from the axis
+        px, py = ox + s*ux, oy + s*uy
+        if abs(r) < 1e-9:
+            return [(px, py, 0.0)] * (steps + 1)
+        return [(px + r*co*nx, py + r*co*ny, r*si) for co, si in turn]
+
+    mb = MeshBuilder()
+    for kind, coords in profile:
+        if kind == 'gl':
+            points = list(coords)
+        else:
+            r = coords[1]
+            points = arc_points(*coords, r * (1 - math.cos(math.pi/steps)))
+        rings = [ring(x, y) for x, y in points]
+        for ra, rb in zip(rings, rings[1:]):
+            for k in range(steps):
+                face = []
+                for p in (ra[k], rb[k], rb[k+1], ra[k+1]):
+                    i = mb.add_vertex(*p)
+                    if not face or (i != face[-1] and i != face[0]):
+                        face.append(i)
+                if len(face) >= 3:
+                    mb.face_index.extend(face)
+                    mb.face_start.append(len(mb.face_index))
+    part = mb.build()
+    if part.closed:
+        # profile segments may run either way: wind the faces alike
+        part = orient_outward(part)
+    return part
+
+
+def orient_outward(part):
+    """Return closed Mesh part with its faces wound alike across every
+    shared edge, and each connected piece's faces facing out. If that
+    can't be done (a one-sided surface), return part marked not closed."""
+    start = part.face_start
+    index = part.face_index
+    faces = [list(index[start[f]:start[f+1]]) for f in range(len(start) - 1)]
+    by_edge = {}    # {(i, j) i < j: [face, face]}
+    for f, face in enumerate(faces):
+        for k, i in enumerate(face):
+            j = face[k-len(face)+1]
+            by_edge.setdefault((i, j) if i < j else (j, i), []).append(f)
+    flip = [None] * len(faces)  # whether to reverse each face
+    pieces = []
+    for seed in range(len(faces)):
+        if flip[seed] is not None:
+            continue
+        flip[seed] = False
+        piece = [seed]
+        stack = [seed]
+        while stack:
+            f = stack.pop()
+            face = faces[f][::-1] if flip[f] else faces[f]
+            for k, i in enumerate(face):
+                j = face[k-len(face)+1]     # f runs i -> j, so g must not
+                for g in by_edge[(i, j) if i < j else (j, i)]:
+                    if g == f:
+                        continue
+                    gface = faces[g]
+                    n = gface.index(i)
+                    same = gface[n-len(gface)+1] == j   # g runs i -> j too
+                    if flip[g] is None:
+                        flip[g] = same
+                        piece.append(g)
+                        stack.append(g)
+                    elif same != flip[g]:
+                        part.closed = False
+                        return part
+        pieces.append(piece)
+    # a piece facing in encloses negative volume: turn it outward
+    for piece in pieces:
+        if _volume(part.vertices, (faces[f][::-1] if flip[f] else faces[f]
+                                   for f in piece)) < 0:
+            for f in piece:
+                flip[f] = not flip[f]
+    return Mesh(part.vertices, start,
+                [i for f, face in enumerate(faces)
+                 for i in (face[::-1] if flip[f] else face)], part.edges)
+
+
+def _volume(v, faces):
+    """Return the signed volume enclosed by faces (vertex index lists)
+    over the flat vertex coords v."""
+    volume = 0.0
+    for face in faces:
+        a = face[0]
+        ax, ay, az = v[3*a], v[3*a+1], v[3*a+2]
+        for b, c in zip(face[1:], face[2:]):
+            bx, by, bz = v[3*b], v[3*b+1], v[3*b+2]
+            cx, cy, cz = v[3*c], v[3*c+1], v[3*c+2]
+            volume += (ax*(by*cz - bz*cy) - ay*(bx*cz - bz*cx)
+                       + az*(bx*cy - by*cx))
+    return volume / 6
+
+
+def signed_volume(part):
+    """Return the volume enclosed by the faces of closed Mesh part,
+    negative if they are clockwise seen from outside."""
+    return _volume(part.vertices,
+                   (part.face(f) for f in range(part.face_count())))
@@ -4,19 +4,35 @@ libraries that come with it. It is a rewrite of cadvas without the use of
 Python MegaWidgets.
 """
 
+from array import array
+import copy
 import math
 import os
 import pickle
 import pprint
+import time
 import tkinter as tk
 from tkinter import filedialog
 from tkinter import messagebox
+import autosave
+import bvh
+import camera
+import display3d
 import entities
 import geometryhelpers as gh
+import hiddenline
+import history
+import instrument
+import journal
 import tkrpncalc
 import txtdialog
+from versioned import VersionedDict
 from zooming import Zooming
 import matrix
+import mesh
+import replay
+import stl
+import topology
 
 GEOMCOLOR = 'white'     # color of geometry entities
 CONSTRCOLOR = 'magenta'  # color of construction entities
@@ -24,6 +40,14 @@ TEXTCOLOR = 'white'     # color of text entities
 DIMCOLOR = 'red'        # color of dimension entities
 RUBBERCOLOR = 'yellow'  # color of (temporary) rubber elements
 TOOLBARCOLS = 2         # number of columns of toolbar buttons
+HISTORY_HOT = 20        # number of recent undo steps kept uncompressed
+HISTORY_BUDGET = 4*2**20  # bytes of compressed undo history kept in memory
+JOURNAL_COMPACT = 500   # journaled changes before Save rewrites the .pkl
+AUTOSAVE_INTERVAL = 60000  # ms between checks for changes to autosave
+AUTOSAVE_CHANGES = 1    # committed changes needed to trigger an autosave
+TESS_TOL = 0.5          # max distance (pixels) of arc chords from the arc
+HLR_DELAY = 150         # ms the 3D view must be still before hiding lines
+FRAME_MS = 16           # ms per 3D frame (one display refresh at 60 Hz)
 
 class PyurCad(tk.Tk):
 
@@ -54,13 +78,14 @@ class PyurCad(tk.Tk):
                                'join': "Join 2 Lines",
                                'fillet': "Fillet 2 Adjacent Lines",
                                'translate': "Translate Geometry (&/or Text)",
-                               'rotate': "Rotate Geometry"}
+                               'rotate': "Rotate Geometry",
+                               'array': "Array Geometry (Rectangular or Polar)"}
 
     tool_bar_functions = ('noop', 'hvcl', 'hcl', 'vcl', 'cl2p', 'acl', 'clrefang',
                           'abcl', 'lbcl', 'parcl', 'perpcl', 'cltan1', 'cltan2',
                           'ccirc', 'cc3p', 'cccirc', 'line', 'poly', 'rect',
                           'circ', 'arcc2p', 'arc3p', 'slot', 'split', 'join',
-                          'fillet', 'translate', 'rotate')
+                          'fillet', 'translate', 'rotate', 'array')
 
     selected_tool_bar_function = tool_bar_functions[0]
 
@@ -75,17 +100,21 @@ class PyurCad(tk.Tk):
     op_stack = []
     text_entry_enable = 0
     text = ''
-    curr = {}           # all entities in curr dwg {k=handle: v=entity}
-    prev = {}
+    curr = VersionedDict()  # all entities in curr dwg {k=handle: v=entity}
+    prev = 0            # version of curr when last delta was saved
     allow_list = 0      # enable/disable item selection in list mode
     sel_mode = ''       # selection mode for screen picks
     float_stack = []    # float values (unitless)
     pt_stack = []       # points, in ECS (mm) units
     obj_stack = []      # canvas items picked from the screen
+    pick_pts = []       # ECS points at which items were picked
     sel_box_crnr = None  # first corner of selection box, if any
-    undo_stack = []     # list of dicts of sets of entities
-    redo_stack = []     # data popped off undo_stack
+    undo_stack = history.UndoHistory(HISTORY_HOT, HISTORY_BUDGET)  # deltas
+    redo_stack = history.UndoHistory(HISTORY_HOT, HISTORY_BUDGET)  # popped
     filename = None     # name of file currently loaded (or saved as)
+    journal = None      # journal.Journal of changes to filename (.pkl only)
+    merged = False      # True if curr holds more than filename + journal
+    autosaver = None    # autosave.AutoSaver (worker thread)
     dimgap = 10         # extension line gap (in canvas units)
     textsize = 10       # default text size
     textstyle = 'Calibri'   # default text style
@@ -93,6 +122,9 @@ class PyurCad(tk.Tk):
     CONSTR_DASH = 2     # dash size for construction lines & circles
     modified_text_object = None
     cl_list = []        # list of all cline coords (so they don't get lost)
+    topology = None     # topology.TopologyIndex of the ends of curr's items
+    array_seq = 0       # number of array group ID tags handed out
+    block_seq = 0       # number of block reference group ID tags handed out
     shift_key_advice = ' (Use SHIFT key to select center of element)'
     unit_dict = {'mm': 1.0,
                  'inches': 25.4,
@@ -102,6 +134,13 @@ class PyurCad(tk.Tk):
     calculator = None   # reference to a Toplevel window
     txtdialog = None    # reference to a Toplevel window
     popup = None
+    timings = None      # instrument.Timings, while hot paths are timed
+    timing_hud = None   # reference to a Toplevel window
+    recorder = None     # replay.Recorder, while input is being recorded
+    timed_methods = ('dispatch', 'mouse_move', 'find_catch_pt',
+                     'regen_pan', 'regen_all_cl', 'regen_all_dims',
+                     'regen_all_text', 'regen_all_arrays',
+                     'load', 'save', 'save_delta')
     msg = "Left-Click a tool button to start.  Middle-Click on screen to end."
 
     # =======================================================================
@@ -117,6 +156,13 @@ class PyurCad(tk.Tk):
         x, y = self.canvas.canvas2world(pt[0], pt[1])
         return (x, -y)
 
+    def viewport(self):
+        """Return (sx, tx, sy, ty) mapping ECS x, y to CCS, as ep2cp does:
+        cx = sx*x + tx, cy = sy*y + ty."""
+        off = self.canvas.off
+        scl = self.canvas.scl
+        return (scl[0], off[0]*scl[0], -scl[1], off[1]*scl[1])
+
     # =======================================================================
     # File, View, Units and Measure commands
     # =======================================================================
@@ -162,7 +208,15 @@ class PyurCad(tk.Tk):
         openfile = self.filename
         if openfile:
             outfile = os.path.abspath(openfile)
-            self.save(outfile)
+            if (self.journal and self.journal.drawing == outfile and
+                    not self.merged and
+                    self.journal.count < JOURNAL_COMPACT):
+                # changes are already in the journal; just mark them saved
+                self.save_delta()
+                self.journal.mark_saved()
+                self.discard_autosave(outfile)
+            else:
+                self.save(outfile)  # also compacts the journal
         else:
             self.fileSaveas()
 
@@ -185,8 +239,36 @@ class PyurCad(tk.Tk):
             outfile = os.path.abspath(openfile)
             self.save(outfile)
 
+    def fileImportSTL(self):
+        ftypes = [('STL file', '*.stl'),
+                  ('All files', '*')]
+        openfile = filedialog.askopenfilename(filetypes=ftypes,
+                                              defaultextension='.stl')
+        if openfile:
+            try:
+                part = stl.read_stl(os.path.abspath(openfile))
+            except (OSError, ValueError) as e:
+                messagebox.showerror('Import STL', str(e))
+                return
+            xmin, ymin, zmin, xmax, ymax, zmax = part.bounds()
+            self.launch_3d(part, ((xmin+xmax)/2, (ymin+ymax)/2, (zmin+zmax)/2))
+            self.update_message_bar('%d triangles imported. MMB to rotate.'
+                                    % part.face_count())
+
+    def fileExportSTL(self):
+        if not self.mesh3d:
+            self.update_message_bar('No 3D part to export')
+            return
+        ftypes = [('STL file', '*.stl'),
+                  ('All files', '*')]
+        openfile = filedialog.asksaveasfilename(filetypes=ftypes,
+                                                defaultextension='.stl')
+        if openfile:
+            stl.write_stl(self.mesh3d, os.path.abspath(openfile))
+
     def save(self, file):
 
+        self.save_delta()   # so the journal agrees with what gets saved
         drawlist = []
         for entity in self.curr.values():
             drawlist.append({entity.type: entity.get_attribs()})
@@ -196,9 +278,18 @@ class PyurCad(tk.Tk):
             import dxf
             dxf.native2dxf(drawlist, file)
         elif fext == '.pkl':
-            with open(file, 'wb') as f:
+            if autosave.is_autosave(file):
+                print("Autosave files are only for recovery. "
+                      "Save under another name.")
+                return
+            tmpfile = file + '.tmp'
+            with open(tmpfile, 'wb') as f:
                 pickle.dump(drawlist, f)
+            os.replace(tmpfile, file)
+            self.discard_autosave(file)
             self.filename = file
+            self.merged = False
+            self.open_journal(file, reset=True)
         elif not fext:
             print("Please type entire filename, including extension.")
         else:
@@ -211,15 +302,46 @@ class PyurCad(tk.Tk):
         drawing entity, {key=entity_type: val=entity_attribs} """
 
         fext = os.path.splitext(file)[-1]
+        unsaved = []
+        journaled = False
         if fext == '.dxf':
             import dxf
             drawlist = dxf.dxf2native(file)
         elif fext == '.pkl':
-            with open(file, 'rb') as f:
-                drawlist = pickle.load(f)
-            self.filename = file
+            if not self.ask_save_changes():
+                return
+            # what is already drawn is in neither file nor journal
+            self.merged = bool(self.curr)
+            self.close_journal()
+            # an autosave is only a copy to recover from, never a drawing
+            journaled = not autosave.is_autosave(file)
+            source = file
+            newer = autosave.newer_autosave(file) if journaled else None
+            if newer and messagebox.askyesno(
+                    "Recover", "An autosave of this drawing newer than the "
+                    "file was found. Open the autosave instead?"):
+                source = newer
+                self.merged = True  # it is in neither file nor journal
+            drawlist = []
+            with open(source, 'rb') as f:
+                # autosave files hold a series of pickled lists
+                while f.peek(1):
+                    drawlist.extend(pickle.load(f))
+            if source == file and journaled:
+                saved, unsaved = journal.recover(file)
+                for packed in saved:
+                    journal.apply_delta(drawlist, packed)
+                if unsaved and messagebox.askyesno(
+                        "Recover", "%d unsaved change(s) to this drawing "
+                        "were found. Recover them?" % len(unsaved)):
+                    for packed in unsaved:
+                        journal.apply_delta(drawlist, packed)
+                else:
+                    unsaved = []
+            self.filename = file if journaled else None
         else:
             print("Load files of type {fext} not supported.")
+        self.rename_clashing_blocks(drawlist)
         for ent_dict in drawlist:
             if 'cl' in ent_dict:
                 attribs = ent_dict['cl']
@@ -233,6 +355,10 @@ class PyurCad(tk.Tk):
                 attribs = ent_dict['gl']
                 e = entities.GL(attribs)
                 self.gline_gen(e)
+            elif 'pl' in ent_dict:
+                attribs = ent_dict['pl']
+                e = entities.PL(attribs)
+                self.pline_gen(e)
             elif 'gc' in ent_dict:
                 attribs = ent_dict['gc']
                 e = entities.GC(attribs)
@@ -245,6 +371,18 @@ class PyurCad(tk.Tk):
                 attribs = ent_dict['dl']
                 e = entities.DL(attribs)
                 self.dim_gen(e)
+            elif 'ar' in ent_dict:
+                attribs = ent_dict['ar']
+                e = entities.AR(attribs)
+                self.array_gen(e)
+            elif 'bd' in ent_dict:
+                attribs = ent_dict['bd']
+                e = entities.BD(attribs)
+                self.block_def_gen(e)
+            elif 'bi' in ent_dict:
+                attribs = ent_dict['bi']
+                e = entities.BI(attribs)
+                self.insert_gen(e)
             elif 'tx' in ent_dict:
                 attribs = ent_dict['tx']
                 print(attribs)
@@ -252,12 +390,73 @@ class PyurCad(tk.Tk):
                 self.text_gen(e)
         self.view_fit()
         self.save_delta()  # undo/redo thing
+        if journaled:
+            self.open_journal(file)
+            for packed in unsaved:  # still unsaved, so journal them again
+                self.journal.append(history.unpack_delta(packed))
+
+    def open_journal(self, file, reset=False):
+        """Start journaling changes to .pkl file."""
+
+        self.close_journal()
+        self.journal = journal.Journal(file, reset=reset)
+
+    def ask_save_changes(self):
+        """Offer to save the open drawing's unsaved changes before its
+        journal is closed. Return False if the user cancels."""
+
+        if not self.journal or (self.journal.count == self.journal.saved_count
+                                and not self.merged):
+            return True
+        answer = messagebox.askyesnocancel(
+            "Save", "Save changes to %s?" % os.path.basename(self.filename))
+        if answer is None:
+            return False
+        if answer:
+            self.fileSave()
+        return True
+
+    def close_journal(self):
+        """Stop journaling, forgetting changes that were never saved."""
+
+        if self.journal:
+            self.journal.discard_unsaved()
+            self.journal.close()
+            self.journal = None
+
+    def autosave(self):
+        """Hand a snapshot of the drawing to the autosaver if it changed.
+
+        Only a shallow copy of the entity list is made here, on the Tk
+        thread; pickling and writing happen on the autosaver's thread."""
+
+        if self.autosaver.changes >= AUTOSAVE_CHANGES:
+            path = autosave.autosave_path(self.filename)
+            self.autosaver.submit(path, list(self.curr.values()))
+        self.after(AUTOSAVE_INTERVAL, self.autosave)
+
+    def discard_autosave(self, file):
+        """Remove the autosaves made redundant by saving to file."""
+
+        if self.autosaver:
+            self.autosaver.discard(autosave.autosave_path(file))
+            self.autosaver.discard(autosave.autosave_path(None))
 
     def close(self):
         self.quit()
 
     def view_fit(self):
-        bbox = self.canvas.bbox('g', 'd', 't')
+        bbox = self.canvas.bbox('g', 'd', 't', 'b')
+        for e in self.curr.values():
+            if e.type == 'ar':  # only the copies in view are drawn
+                xmin, ymin, xmax, ymax = e.extent()
+                x0, y0 = self.ep2cp((xmin, ymax))
+                x1, y1 = self.ep2cp((xmax, ymin))
+                if bbox:
+                    bbox = (min(bbox[0], x0), min(bbox[1], y0),
+                            max(bbox[2], x1), max(bbox[3], y1))
+                else:
+                    bbox = (x0, y0, x1, y1)
         if bbox:
             xsize, ysize = bbox[2]-bbox[0], bbox[3]-bbox[1]
             xc, yc = (bbox[2]+bbox[0])/2, (bbox[3]+bbox[1])/2
@@ -276,6 +475,12 @@ class PyurCad(tk.Tk):
         self.regen_all_cl()
         self.regen_all_dims()
         self.regen_all_text()
+        self.regen_all_arrays()
+
+    def regen_pan(self, event=None):
+        """Regenerate what hangs off the edge of the canvas, after a pan."""
+        self.regen_all_cl()
+        self.regen_all_arrays()
 
     def set_units(self, units):
         if units in self.unit_dict.keys():
@@ -327,6 +532,8 @@ class PyurCad(tk.Tk):
                     if elem.type == 'gl':
                         p1, p2 = elem.coords
                         length = gh.p2p_dist(p1, p2) / self.unitscale
+                    elif elem.type == 'pl':
+                        length = elem.length() / self.unitscale
                     elif elem.type == 'gc':
                         length = math.pi*2*elem.coords[1]/self.unitscale
                     elif elem.type == 'cc':
@@ -339,6 +546,60 @@ class PyurCad(tk.Tk):
                         self.launch_calc()
                         self.calculator.putx(length)
 
+    def select_chain(self, obj=None):
+        """Highlight the chain of lines, arcs & polylines meeting end to
+        end through a picked one."""
+
+        self.set_sel_mode('items')
+        if not self.obj_stack:
+            self.update_message_bar('Pick a line, arc or polyline')
+        else:
+            for handle in self.obj_stack.pop():
+                handles, closed = self.topology.chain(handle)
+                if handles:
+                    self.unmark()
+                    self.mark(handles)
+                    self.update_message_bar(
+                        '%s chain of %d item(s)'
+                        % ('Closed' if closed else 'Open', len(handles)))
+                    return
+            self.update_message_bar('Pick a line, arc or polyline')
+
+    def closed_profiles(self):
+        """Highlight the closed chains of geometry (and closed polylines &
+        circles)."""
+
+        self.end()
+        loops = self.topology.loops()
+        self.mark([h for loop in loops for h in loop])
+        self.update_message_bar('%d closed profile(s)' % len(loops))
+
+    def dangling_ends(self):
+        """Mark the ends of lines, arcs & polylines meeting no other."""
+
+        self.end()
+        ends = self.topology.dangling()
+        ps = self.catch_pnt_size
+        for handle, p in ends:
+            x, y = self.ep2cp(p)
+            self.canvas.create_rectangle(x-ps, y-ps, x+ps, y+ps,
+                                         outline='red', tags=('r', 'mark'))
+        self.update_message_bar('%d dangling end(s)' % len(ends))
+
+    def mark(self, handles):
+        """Highlight canvas items handles until the operation ends."""
+
+        for handle in handles:
+            self.canvas.addtag_withtag('mark', handle)
+            self.canvas.itemconfigure(handle, width=3)
+
+    def unmark(self):
+        """Remove highlights and markers made by mark() & dangling_ends()."""
+
+        self.canvas.delete('r&&mark')   # markers
+        self.canvas.itemconfigure('mark', width=1)
+        self.canvas.dtag('mark')
+
     def launch_calc(self):
         if not self.calculator:
             self.calculator = tkrpncalc.Calculator(self)
@@ -350,6 +611,9 @@ class PyurCad(tk.Tk):
 
     def close_window(self):
         if messagebox.askokcancel("Quit", "Do you really want to quit?"):
+            self.close_journal()
+            if self.autosaver:  # nothing would find an untitled autosave
+                self.autosaver.discard(autosave.autosave_path(None))
             self.destroy()
 
     def on_about_menu_clicked(self, event=None):
@@ -365,7 +629,8 @@ class PyurCad(tk.Tk):
         self.end()
 
     def show_prev(self):
-        pprint.pprint(self.prev)
+        print('prev = version', self.prev, 'of curr')
+        pprint.pprint(self.curr.diff(self.prev))
         self.end()
 
     def show_undo(self):
@@ -376,6 +641,11 @@ class PyurCad(tk.Tk):
         pprint.pprint(self.redo_stack)
         self.end()
 
+    def show_history_stats(self):
+        print('undo:', self.undo_stack.stats())
+        print('redo:', self.redo_stack.stats())
+        self.end()
+
     def show_zoomscale(self):
         zoom_scale = self.canvas.scl.x
         print(zoom_scale)
@@ -389,6 +659,95 @@ class PyurCad(tk.Tk):
         pprint.pprint(dir(self))
         self.end()
 
+    def toggle_timing(self):
+        """Start or stop timing the methods named in self.timed_methods."""
+
+        if self.timing_on.get():
+            if not self.timings:
+                self.timings = instrument.Timings()
+            self.timings.install(self, self.timed_methods)
+        elif self.timings:
+            self.timings.uninstall(self)
+        # bindings hold the bound methods they were given, so rebind them
+        replay.rebind(self)
+
+    def launch_timing_hud(self):
+        """Show a window with rolling p50 / p95 / max of timed methods."""
+
+        if not self.timing_on.get():
+            self.timing_on.set(True)
+            self.toggle_timing()
+        if not self.timing_hud:
+            self.timing_hud = tk.Toplevel(self)
+            self.timing_hud.title('Timings')
+            self.timing_hud.transient(self)
+            self.timing_hud.protocol("WM_DELETE_WINDOW", self.quit_timing_hud)
+            label = tk.Label(self.timing_hud, font=('Courier', 9),
+                             justify='left', anchor='nw')
+            label.pack(fill='both', expand=1)
+            tk.Button(self.timing_hud, text='Reset',
+                      command=self.timings.clear).pack(side='left')
+            tk.Button(self.timing_hud, text='Export JSON',
+                      command=self.export_timings).pack(side='left')
+            self.timing_hud.label = label
+            self.timing_hud.geometry('+800+400')
+            self.refresh_timing_hud()
+
+    def refresh_timing_hud(self):
+        if self.timing_hud:
+            self.timing_hud.label.configure(text=self.timings.format_report())
+            self.after(500, self.refresh_timing_hud)
+
+    def quit_timing_hud(self):
+        if self.timing_hud:
+            self.timing_hud.destroy()
+            self.timing_hud = None
+
+    def export_timings(self):
+        if not self.timings:
+            print("Timing is not enabled.")
+            return
+        ftypes = [('JSON file', '*.json'),
+                  ('All files', '*')]
+        openfile = filedialog.asksaveasfilename(filetypes=ftypes,
+                                                defaultextension='.json')
+        if openfile:
+            self.timings.dump(os.path.abspath(openfile))
+
+    def start_recording(self):
+        """Record input reaching the event handlers to a file."""
+
+        if self.recorder:
+            print("Already recording to", self.recorder.path)
+            return
+        ftypes = [('Input recording', '*.rec'),
+                  ('All files', '*')]
+        openfile = filedialog.asksaveasfilename(filetypes=ftypes,
+                                                defaultextension='.rec')
+        if openfile:
+            self.recorder = replay.Recorder(self, os.path.abspath(openfile))
+            self.recorder.start()
+            self.update_message_bar('Recording input to %s' % openfile)
+
+    def stop_recording(self):
+        if self.recorder:
+            self.recorder.stop()
+            print("Recorded %d events to %s" % (self.recorder.count,
+                                                self.recorder.path))
+            self.recorder = None
+            self.update_message_bar(self.msg)
+
+    def replay_recording(self):
+        """Replay a recording as fast as possible & print handler latency."""
+
+        ftypes = [('Input recording', '*.rec'),
+                  ('All files', '*')]
+        openfile = filedialog.askopenfilename(filetypes=ftypes,
+                                              defaultextension='.rec')
+        if openfile:
+            timings = replay.replay(self, os.path.abspath(openfile))
+            print(timings.format_report())
+
     def draw_line(self):
         self.current_item = self.canvas.create_line(
             self.start_x, self.start_y, self.end_x, self.end_y,
@@ -877,7 +1236,8 @@ class PyurCad(tk.Tk):
     # geometry line parameters are stored in GL objects.
     # geometry lines are finite length segments between 2 pts: p1, p2
     # lines are defined by coordinates:         (p1, p2)
-    #
+    # polylines (PL objects) are chains of segments, straight or arcs,
+    # defined by coordinates:   (points, bulges, closed)
     # =======================================================================
 
     def line_draw(self, coords, color, arrow=None, tag='g'):
@@ -901,6 +1261,34 @@ class PyurCad(tk.Tk):
         tkid = self.line_draw(coords, color)
         self.curr[tkid] = gl
 
+    def path_draw(self, path, color, tag='g', affine=(1, 0, 0, 1, 0, 0)):
+        """Create and display a path (flat ECS coords x0, y0, x1, y1, ...)
+        as one line item, after mapping it by affine (a, b, c, d, e, f):
+        x, y -> a*x + b*y + e, c*x + d*y + f. Return ID."""
+
+        # compose affine with the ECS to canvas map, to map each point once
+        ox, oy = self.ep2cp((0, 0))
+        ux, uy = self.ep2cp((1, 0))
+        vx, vy = self.ep2cp((0, 1))
+        ux, uy, vx, vy = ux - ox, uy - oy, vx - ox, vy - oy
+        a, b, c, d, e, f = affine
+        a, b, c, d, e, f = (ux*a + vx*c, ux*b + vx*d, uy*a + vy*c,
+                            uy*b + vy*d, ox + ux*e + vx*f, oy + uy*e + vy*f)
+        xy = []
+        it = iter(path)
+        for x, y in zip(it, it):
+            xy.append(a*x + b*y + e)
+            xy.append(c*x + d*y + f)
+        return self.canvas.create_line(xy, fill=color, tags=tag)
+
+    def pline_gen(self, pl):
+        """Create polyline from pl object. Store {ID: obj} in self.curr.
+        Return ID."""
+
+        tkid = self.path_draw(pl.path(), pl.color)
+        self.curr[tkid] = pl
+        return tkid
+
     def line(self, p1=None):
         '''Create line segment between 2 points. Enable 'rubber line' mode'''
 
@@ -943,21 +1331,43 @@ class PyurCad(tk.Tk):
             self.update_message_bar('Specify end point of line')
 
     def poly(self, p1=None):
-        '''Create chain of line segments, enabling 'rubber line' mode.'''
+        '''Create polyline, enabling 'rubber line' mode.
+
+        The polyline is one PL object, replaced by a longer one as each
+        point is added. Picking the start point again closes it.'''
 
         if not self.pt_stack:
-            self.poly_start_pt = None
+            self.poly_pts = []      # vertices so far
+            self.poly_handle = None     # ID of polyline so far
             message = 'Pick start point or enter coords'
             message += self.shift_key_advice
             self.update_message_bar(message)
         elif len(self.pt_stack) > 1:
-            lastpt = self.pt_stack[-1]
-            self.line()     # This will pop 2 points off stack
-            if not gh.same_pt_p(self.poly_start_pt, lastpt):
-                self.pt_stack.append(lastpt)
+            lastpt = self.pt_stack.pop()
+            if not self.poly_pts:
+                self.poly_pts = [self.pt_stack[-1]]
+            closed = (len(self.poly_pts) > 2 and
+                      gh.same_pt_p(self.poly_pts[0], lastpt))
+            if not closed:
+                self.poly_pts.append(lastpt)
+            if self.poly_handle:
+                self.canvas.delete(self.poly_handle)
+                del self.curr[self.poly_handle]
+            points = tuple(c for p in self.poly_pts for c in p)
+            self.poly_handle = self.pline_gen(
+                entities.PL(((points, (), closed), GEOMCOLOR)))
+            self.pt_stack = [lastpt]
+            if closed:
+                self.pt_stack = []
+                self.poly_pts = []
+                self.poly_handle = None
+                if self.rubber:
+                    self.canvas.delete(self.rubber)
+                    self.rubber = None
+                if self.rtext:
+                    self.canvas.delete(self.rtext)
+                    self.rtext = None
         elif self.pt_stack and p1:
-            if not self.poly_start_pt:
-                self.poly_start_pt = self.pt_stack[-1]
             self.line(p1)   # This will generate rubber line
             self.update_message_bar('Pick next point or enter coords')
 
@@ -987,12 +1397,10 @@ class PyurCad(tk.Tk):
             b = (x2, y1)
             c = (x2, y2)
             d = (x1, y2)
-            sides = ((a, b), (b, c), (c, d), (d, a))
-            for p in sides:
-                coords = (p[0], p[1])
-                attribs = (coords, GEOMCOLOR)
-                e = entities.GL(attribs)
-                self.gline_gen(e)
+            coords = (a + b + c + d, (), True)
+            attribs = (coords, GEOMCOLOR)
+            e = entities.PL(attribs)
+            self.pline_gen(e)
             if self.rubber:
                 self.canvas.delete(self.rubber)
                 self.rubber = None
@@ -1212,21 +1620,16 @@ class PyurCad(tk.Tk):
             baseline = gh.cnvrt_2pts_to_coef(p1, p2)
             crossline1 = gh.perp_line(baseline, p1)
             crossline2 = gh.perp_line(baseline, p2)
-            circ1 = (p1, w/2)
-            circ2 = (p2, w/2)
-            p1e = gh.extendline(p2, p1, w/2)
             paraline1, paraline2 = gh.para_lines(baseline, w/2)
             p1a = gh.intersection(paraline1, crossline1)
             p1b = gh.intersection(paraline2, crossline1)
-            self.pt_stack.extend([p1a, p1b, p1e])
-            self.arc3p()
             p2e = gh.extendline(p1, p2, w/2)
             p2a = gh.intersection(paraline1, crossline2)
             p2b = gh.intersection(paraline2, crossline2)
-            self.pt_stack.extend([p2a, p2b, p2e])
-            self.arc3p()
-            self.gline_gen(entities.GL(((p1a, p2a), GEOMCOLOR)))
-            self.gline_gen(entities.GL(((p1b, p2b), GEOMCOLOR)))
+            # the ends are half circles, bulging out through p1e & p2e
+            bulge = 1.0 if gh.pt_on_RHS_p(p2e, p2a, p2b) else -1.0
+            coords = (p1a + p2a + p2b + p1b, (0.0, bulge, 0.0, bulge), True)
+            self.pline_gen(entities.PL((coords, GEOMCOLOR)))
 
     # =======================================================================
     # Modify geometry
@@ -1237,7 +1640,7 @@ class PyurCad(tk.Tk):
 
         if not self.obj_stack:
             self.set_sel_mode('items')
-            self.update_message_bar('Pick straight line to split')
+            self.update_message_bar('Pick straight line or polyline to split')
         elif self.obj_stack and not self.pt_stack:
             self.set_sel_mode('pnt')
             message = 'Pick point for split'
@@ -1257,6 +1660,18 @@ class PyurCad(tk.Tk):
                     self.canvas.delete(line)
                     self.gline_gen(entities.GL(((p0, p1), GEOMCOLOR)))
                     self.gline_gen(entities.GL(((p0, p2), GEOMCOLOR)))
+                elif entity.type == 'pl':
+                    p0 = self.pt_stack.pop()
+                    k = entity.nearest_segment(
+                        p0, self.canvas.c2w_dx(self.catch_radius))
+                    if k is None:
+                        self.update_message_bar('Pick point on the polyline')
+                        return
+                    del self.curr[item]
+                    self.canvas.delete(item)
+                    for pl in entity.split(k, p0):
+                        self.pline_gen(pl)
+                    break
 
     def join(self, p1=None):
         """Join 2 adjacent line segments into 1. """
@@ -1269,16 +1684,23 @@ class PyurCad(tk.Tk):
         elif len(self.obj_stack) == 2:
             item2 = self.obj_stack.pop()[0]
             item1 = self.obj_stack.pop()[0]
+            pl = self.curr.get(item1)
+            if pl is not None and pl.type == 'pl' and item1 == item2:
+                self.join_pl_segments(item1, *self.pick_pts[-2:])
+                return
+            for item in (item1, item2):
+                e = self.curr.get(item)
+                if e is not None and e.type == 'pl':
+                    self.update_message_bar(
+                        'To join a polyline to other items, explode it first '
+                        '(Modify menu)')
+                    return
             for item in (item1, item2):
-                if not (self.canvas.type(item) == 'line' and
-                        'g' in self.canvas.gettags(item)):
+                e = self.curr.get(item)
+                if e is None or e.type != 'gl':
                     print('Incorrect types of items picked for join')
                     return
-            gl1 = self.curr[item1]
-            gl2 = self.curr[item2]
-            coords1, clr = gl1.get_attribs()
-            coords2, clr = gl2.get_attribs()
-            pts = gh.find_common_pt(coords1, coords2)
+            pts = self.topology.common_pt(item1, item2)
             if pts:
                 cp, ep1, ep2 = pts
             else:
@@ -1289,6 +1711,32 @@ class PyurCad(tk.Tk):
                 self.canvas.delete(item)
             self.gline_gen(entities.GL(((ep1, ep2), GEOMCOLOR)))
 
+    def join_pl_segments(self, item, p1, p2):
+        """Join the 2 adjacent straight segments of polyline item picked at
+        p1 & p2 into 1, dropping the vertex they share."""
+
+        pl = self.curr[item]
+        r = self.canvas.c2w_dx(self.catch_radius)
+        k1 = pl.nearest_segment(p1, r)
+        k2 = pl.nearest_segment(p2, r)
+        n = len(pl.vertices())
+        if k1 is None or k2 is None:
+            vertex = None
+        elif k2 == k1 + 1 or (pl.coords[2] and k2 == (k1 + 1) % n):
+            vertex = k2
+        elif k1 == k2 + 1 or (pl.coords[2] and k1 == (k2 + 1) % n):
+            vertex = k1
+        else:
+            vertex = None
+        joined = pl.remove_vertex(vertex) if vertex is not None else None
+        if joined is None:
+            self.update_message_bar(
+                'Pick 2 adjacent straight segments of the polyline to join')
+            return
+        del self.curr[item]
+        self.canvas.delete(item)
+        self.pline_gen(joined)
+
     def fillet(self, p1=None):
         """Create a fillet of radius r at the common corner of 2 lines."""
 
@@ -1303,14 +1751,15 @@ class PyurCad(tk.Tk):
             found = self.obj_stack.pop()
             items = []
             for item in found:
-                if self.canvas.type(item) == 'line' and \
-                   'g' in self.canvas.gettags(item):
+                e = self.curr.get(item)
+                if e is not None and e.type == 'gl':
                     items.append(item)
-            if len(items) == 2:
-                line1coords, color = self.curr[items[0]].get_attribs()
-                line2coords, color = self.curr[items[1]].get_attribs()
-                pts = gh.find_common_pt(line1coords,
-                                     line2coords)
+            plines = [item for item in found
+                      if item in self.curr and self.curr[item].type == 'pl']
+            if len(items) != 2 and plines:
+                self.fillet_pl_corner(plines[0], self.pick_pts[-1], rw)
+            elif len(items) == 2:
+                pts = self.topology.common_pt(items[0], items[1])
                 if pts:
                     # common pt, other end pt1, other end pt2
                     cp, ep1, ep2 = pts
@@ -1334,6 +1783,37 @@ class PyurCad(tk.Tk):
                 self.pt_stack = [ctr, tp1, tp2]
                 self.arcc2p()
 
+    def fillet_pl_corner(self, item, p, rw):
+        """Fillet, with radius rw, the corner of polyline item nearest to
+        point p picked on it."""
+
+        pl = self.curr[item]
+        k = pl.nearest_segment(p, self.canvas.c2w_dx(self.catch_radius))
+        if k is None:
+            self.update_message_bar('Pick corner of the polyline to fillet')
+            return
+        verts = pl.vertices()
+        n = len(verts)
+        # the end of the picked segment nearest the pick
+        if gh.p2p_dist(p, verts[(k + 1) % n]) < gh.p2p_dist(p, verts[k]):
+            k = (k + 1) % n
+        cp, ep1, ep2 = verts[k], verts[k - 1], verts[(k + 1) % n]
+        rounded = None
+        if pl.coords[2] or 0 < k < n - 1:
+            ctr, tp1, tp2 = gh.find_fillet_pts(rw, cp, ep1, ep2)
+            if (gh.p2p_dist(cp, tp1) > gh.p2p_dist(cp, ep1) or
+                    gh.p2p_dist(cp, tp2) > gh.p2p_dist(cp, ep2)):
+                self.update_message_bar('Fillet radius too big for corner')
+                return
+            rounded = pl.round_corner(k, tp1, tp2)
+        if rounded is None:
+            self.update_message_bar(
+                'Pick corner between 2 straight segments of the polyline')
+            return
+        del self.curr[item]
+        self.canvas.delete(item)
+        self.pline_gen(rounded)
+
     def translate(self, p=None):
         """Move (or copy) selected geometry &/or text by two points.
 
@@ -1376,6 +1856,13 @@ class PyurCad(tk.Tk):
                                 gh.add_pt(pnts[1], dp))
                         gl = entities.GL((pnts, GEOMCOLOR))
                         self.gline_gen(gl)
+                elif item.type == 'pl':
+                    (pnts, bulges, closed), _ = item.get_attribs()
+                    for x in range(repeat):
+                        pnts = tuple(c for p in zip(pnts[0::2], pnts[1::2])
+                                     for c in gh.add_pt(p, dp))
+                        pl = entities.PL(((pnts, bulges, closed), GEOMCOLOR))
+                        self.pline_gen(pl)
                 elif item.type == 'gc':
                     pnts, _ = item.get_attribs()
                     for x in range(repeat):
@@ -1440,6 +1927,13 @@ class PyurCad(tk.Tk):
                                 gh.rotate_pt(pnts[1], A, ctr))
                         gl = entities.GL((pnts, GEOMCOLOR))
                         self.gline_gen(gl)
+                elif item.type == 'pl':
+                    (pnts, bulges, closed), _ = item.get_attribs()
+                    for x in range(self.repeat):
+                        pnts = tuple(c for p in zip(pnts[0::2], pnts[1::2])
+                                     for c in gh.rotate_pt(p, A, ctr))
+                        pl = entities.PL(((pnts, bulges, closed), GEOMCOLOR))
+                        self.pline_gen(pl)
                 elif item.type == 'gc':
                     pnts, _ = item.get_attribs()
                     for x in range(self.repeat):
@@ -1460,6 +1954,308 @@ class PyurCad(tk.Tk):
                     self.canvas.delete(handle)
                     del self.curr[handle]
 
+    def array(self, p=None):
+        """Array selected geometry items in rows & columns, or about a
+        center point. The copies are kept as one array entity."""
+
+        if not self.obj_stack:
+            self.set_sel_mode('items')
+            self.allow_list = 1
+            self.update_message_bar('Select geometry item(s) to array')
+        elif not self.pt_stack and not self.float_stack:
+            self.set_sel_mode('pnt')
+            self.allow_list = 0
+            self.update_message_bar(
+                'Enter number of rows, or pick center of polar array')
+        elif self.pt_stack:     # polar
+            if len(self.float_stack) == 0:
+                self.update_message_bar('Enter number of items')
+            elif len(self.float_stack) == 1:
+                if self.not_a_count('items'):
+                    return
+                self.update_message_bar(
+                    'Enter angle between items in degrees (+ is CCW)')
+            else:
+                angle = self.float_stack.pop()
+                count = int(self.float_stack.pop())
+                pc = self.pt_stack.pop()
+                self.array_finish(('polar', count, angle, tuple(pc)))
+        else:                   # rectangular
+            if len(self.float_stack) == 1:
+                if self.not_a_count('rows'):
+                    return
+                self.update_message_bar('Enter number of columns')
+            elif len(self.float_stack) == 2:
+                if self.not_a_count('columns'):
+                    return
+                self.update_message_bar('Enter column spacing (+ is right)')
+            elif len(self.float_stack) == 3:
+                self.update_message_bar('Enter row spacing (+ is up)')
+            else:
+                dy = self.float_stack.pop()*self.unitscale
+                dx = self.float_stack.pop()*self.unitscale
+                cols = int(self.float_stack.pop())
+                rows = int(self.float_stack.pop())
+                self.array_finish(('rect', rows, cols, dx, dy))
+
+    def not_a_count(self, what):
+        """If the number last entered is not a whole number > 0, drop it,
+        ask again for the number of what and return True."""
+
+        n = self.float_stack[-1]
+        if n > 0 and n == int(n):
+            return False
+        self.float_stack.pop()
+        self.update_message_bar(
+            'Number of %s must be a whole number > 0. Enter number of %s'
+            % (what, what))
+        return True
+
+    def array_finish(self, layout):
+        """Replace the selected items by an array of them, by layout."""
+
+        handles = self.obj_stack.pop()
+        source = []
+        for handle in handles:
+            e = self.curr.get(handle)
+            if e is not None and e.type in ('gl', 'pl', 'gc', 'ga'):
+                source.append((e.type, e.get_attribs()))
+                self.canvas.delete(handle)
+                del self.curr[handle]
+        if source and min(layout[1:3] if layout[0] == 'rect'
+                          else layout[1:2]) > 0:
+            self.array_gen(entities.AR(((tuple(source), layout),
+                                        GEOMCOLOR)))
+        else:
+            for t, attribs in source:   # nothing to array: put them back
+                self.add_draw(history.ENTITY_CLASSES[t](attribs))
+            self.update_message_bar('Nothing to array')
+        self.end()
+
+    def array_draw(self, ar, agid):
+        """Draw the copies of array ar that are in view, tagged with the
+        array group ID tag agid. Others are drawn when a pan or zoom
+        brings them into view, so a big array costs only what is seen."""
+
+        w, h = self.canvas.winfo_width(), self.canvas.winfo_height()
+        x0, y1 = self.cp2ep((0, 0))
+        x1, y0 = self.cp2ep((w, h))
+        tag = ('a', agid)
+        for t, attribs in ar.expand(ar.visible((x0, y0, x1, y1))):
+            coords, color = attribs
+            if t == 'gl':
+                self.line_draw(coords, color, tag=tag)
+            elif t == 'pl':
+                self.path_draw(entities.PL(attribs).path(), color, tag)
+            elif t == 'gc':
+                self.circ_draw(coords, color, tag=tag)
+            else:
+                pc, rad, a0, a1 = coords
+                ext = a1-a0
+                if ext < 0:
+                    ext += 360
+                x, y = self.ep2cp(pc)
+                r = self.canvas.w2c_dx(rad)
+                self.canvas.create_arc(x-r, y-r, x+r, y+r, start=a0,
+                                       extent=ext, style='arc',
+                                       outline=color, tags=tag)
+
+    def array_gen(self, ar):
+        """Generate array from AR object and save to self.curr."""
+
+        self.array_seq += 1
+        agid = 'a%d' % self.array_seq  # unique array group ID tag
+        self.array_draw(ar, agid)
+        self.curr[agid] = ar
+
+    def regen_all_arrays(self, event=None):
+        """Redraw arrays after pan or zoom, to show the copies now in
+        view. The entities (and their keys) stay as they are."""
+
+        for agid, ar in self.curr.items():
+            if ar.type == 'ar':
+                self.canvas.delete(agid)
+                self.array_draw(ar, agid)
+
+    # =======================================================================
+    # Blocks
+    # A block definition (bd) holds a group of geometry items once, keyed
+    # in self.curr by 'bd:' + its name. Each block reference (bi) is keyed
+    # by a group ID tag and drawn from the block's cached tessellation.
+    # =======================================================================
+
+    def make_block(self, p=None):
+        """Replace selected geometry items by a new block and a reference
+        to it at a picked base point."""
+
+        if not self.obj_stack:
+            self.set_sel_mode('items')
+            self.allow_list = 1
+            self.update_message_bar('Select geometry item(s) for block')
+        elif not self.pt_stack:
+            self.set_sel_mode('pnt')
+            self.allow_list = 0
+            self.update_message_bar('Pick base point of block')
+        else:
+            bx, by = self.pt_stack.pop()
+            handles = self.obj_stack.pop()
+            source = []
+            for handle in handles:
+                e = self.curr.get(handle)
+                if e is not None and e.type in ('gl', 'pl', 'gc', 'ga'):
+                    coords, color = e.get_attribs()
+                    if e.type == 'gl':
+                        coords = tuple(gh.sub_pt(q, (bx, by)) for q in coords)
+                    elif e.type == 'pl':
+                        pnts, bulges, closed = coords
+                        pnts = tuple(c for p in zip(pnts[0::2], pnts[1::2])
+                                     for c in gh.sub_pt(p, (bx, by)))
+                        coords = (pnts, bulges, closed)
+                    else:
+                        coords = (gh.sub_pt(coords[0], (bx, by)),) + \
+                            tuple(coords[1:])
+                    source.append((e.type, (coords, color)))
+                    self.canvas.delete(handle)
+                    del self.curr[handle]
+            if source:
+                n = 1
+                while 'bd:B%d' % n in self.curr:
+                    n += 1
+                name = 'B%d' % n
+                self.block_def_gen(entities.BD(((name, tuple(source)),
+                                                GEOMCOLOR)))
+                self.insert_gen(entities.BI(((name, (bx, by), 1.0, 1.0, 0.0),
+                                             GEOMCOLOR)))
+                self.update_message_bar('Made block %s' % name)
+            self.end()
+
+    def insert_block(self, p=None):
+        """Place copies of a picked block reference at picked points.
+
+        Enter an angle (degrees) to turn the copies placed after it."""
+
+        if not self.obj_stack:
+            self.set_sel_mode('items')
+            self.update_message_bar('Select block to insert')
+        else:
+            bi = self.picked_insert(self.obj_stack[-1])
+            if bi is None:
+                self.obj_stack.pop()
+                self.update_message_bar('Select block to insert')
+                return
+            self.set_sel_mode('pnt')
+            if self.pt_stack:
+                name, p0, sx, sy, angle = bi.coords
+                if self.float_stack:
+                    angle = self.float_stack[-1]
+                self.insert_gen(entities.BI(
+                    ((name, tuple(self.pt_stack.pop()), sx, sy, angle),
+                     bi.color)))
+                self.save_delta()
+            self.update_message_bar(
+                'Pick insertion point of %s, or enter angle' % bi.coords[0])
+
+    def explode(self, p=None):
+        """Replace selected block references by the geometry items of
+        their blocks, and polylines by their lines and arcs."""
+
+        self.set_sel_mode('items')
+        self.allow_list = 1
+        self.update_message_bar('Select block(s) or polyline(s) to explode')
+        if self.obj_stack:
+            handles = self.obj_stack.pop()
+            for handle in handles:
+                e = self.curr.get(handle)
+                if e is not None and e.type == 'pl':
+                    self.canvas.delete(handle)
+                    del self.curr[handle]
+                    for t, attribs in e.expand():
+                        self.add_draw(history.ENTITY_CLASSES[t](attribs))
+            gids = {self.canvas.gettags(h)[1] for h in handles
+                    if 'b' in self.canvas.gettags(h)}
+            for gid in gids:
+                bi = self.curr.get(gid)
+                bd = self.curr.get('bd:' + bi.coords[0]) if bi else None
+                if bd is None:
+                    continue
+                items = bi.expand(bd.coords[1])
+                if items is None:
+                    self.update_message_bar(
+                        "Can't explode a block scaled unequally")
+                    continue
+                self.canvas.delete(gid)
+                del self.curr[gid]
+                for t, attribs in items:
+                    self.add_draw(history.ENTITY_CLASSES[t](attribs))
+
+    def picked_insert(self, handles):
+        """Return the block reference drawn by one of canvas items
+        handles, or None."""
+
+        for handle in handles:
+            tags = self.canvas.gettags(handle)
+            if 'b' in tags and tags[1] in self.curr:
+                return self.curr[tags[1]]
+        return None
+
+    def block_draw(self, bi, bgid):
+        """Draw block reference bi, tagged with group ID tag bgid, as a
+        line item per path of its block's tessellation."""
+
+        bd = self.curr.get('bd:' + bi.coords[0])
+        if bd is None:  # drawn when its block is added
+            return
+        affine = bi.affine()
+        for path in entities.block_paths(bd.coords[1]):
+            self.path_draw(path, bi.color, ('b', bgid), affine)
+
+    def insert_gen(self, bi):
+        """Generate block reference from BI object and save to self.curr."""
+
+        self.block_seq += 1
+        bgid = 'b%d' % self.block_seq  # unique block group ID tag
+        self.block_draw(bi, bgid)
+        self.curr[bgid] = bi
+
+    def rename_clashing_blocks(self, drawlist):
+        """Rename the blocks defined in drawlist (about to be loaded) whose
+        names are taken by different blocks of the drawing, and the block
+        references in drawlist to them. A block defined alike in both keeps
+        its name and is shared."""
+
+        names = {d['bd'][0][0] for d in drawlist if 'bd' in d}
+        renamed = {}
+        for ent_dict in drawlist:
+            if 'bd' in ent_dict:
+                (name, source), color = ent_dict['bd']
+                bd = self.curr.get('bd:' + name)
+                if bd is None or bd.coords[1] == source:
+                    continue
+                n = 1
+                while ('bd:%s-%d' % (name, n) in self.curr or
+                       '%s-%d' % (name, n) in names):
+                    n += 1
+                renamed[name] = '%s-%d' % (name, n)
+                names.add(renamed[name])
+                ent_dict['bd'] = ((renamed[name], source), color)
+        if renamed:
+            for ent_dict in drawlist:
+                if 'bi' in ent_dict and ent_dict['bi'][0][0] in renamed:
+                    (name, p, sx, sy, angle), color = ent_dict['bi']
+                    ent_dict['bi'] = ((renamed[name], p, sx, sy, angle),
+                                      color)
+
+    def block_def_gen(self, bd):
+        """Save block definition BD to self.curr, drawing any references
+        to it that were added before it."""
+
+        name = bd.coords[0]
+        self.curr['bd:' + name] = bd
+        for bgid, bi in self.curr.items():
+            if bi.type == 'bi' and bi.coords[0] == name:
+                self.canvas.delete(bgid)
+                self.block_draw(bi, bgid)
+
     # =======================================================================
     # Dimensions
     # linear dimensions have coords:    (p1, p2, p3, d)
@@ -1787,12 +2583,11 @@ class PyurCad(tk.Tk):
                     del self.curr[item]
                     self.canvas.delete(item)
                 else:
-                    if 'd' in tags:
-                        dgid = tags[1]
-                        dim_items = self.canvas.find_withtag(dgid)
-                        for each in dim_items:
-                            self.canvas.delete(each)
-                        del self.curr[dgid]
+                    if 'd' in tags or 'a' in tags or 'b' in tags:
+                        gid = tags[1]   # dimension, array or block group ID
+                        if gid in self.curr:
+                            self.canvas.delete(gid)
+                            del self.curr[gid]
 
     def del_all_c(self):
         '''Delete All construction.'''
@@ -1807,17 +2602,25 @@ class PyurCad(tk.Tk):
     def del_all_g(self):
         '''Delete all geometry.'''
 
-        delete = [k for k, v in self.curr.items() if v.type == 'gl']
+        delete = [k for k, v in self.curr.items() if v.type in ('gl', 'pl')]
         for k in delete:
             del self.curr[k]
         delete = [k for k, v in self.curr.items() if v.type == 'gc']
         for k in delete:
             del self.curr[k]
         delete = [k for k, v in self.curr.items() if v.type == 'ga']
+        for k in delete:
+            del self.curr[k]
+        delete = [k for k, v in self.curr.items() if v.type == 'ar']
+        for k in delete:
+            del self.curr[k]
+        delete = [k for k, v in self.curr.items() if v.type in ('bi', 'bd')]
         for k in delete:
             del self.curr[k]
         for item in self.canvas.find_withtag('g'):
             self.canvas.delete(item)
+        self.canvas.delete('a')
+        self.canvas.delete('b')
 
     def del_all_d(self):
         '''Delete all dimensions.'''
@@ -1841,6 +2644,7 @@ class PyurCad(tk.Tk):
         '''Delete all.'''
 
         self.curr.clear()
+        self.clear_3d()
         self.canvas.delete(tk.ALL)
         self.cl_list = []
 
@@ -1857,9 +2661,13 @@ class PyurCad(tk.Tk):
     'cl'    construction line
     'cc'    construction circle
     'gl'    geometry line
+    'pl'    polyline
     'gc'    geometry circle
     'ga'    geometry arc
     'dl'    linear dimension
+    'ar'    array of geometry
+    'bd'    block definition
+    'bi'    block reference (insert)
     'tx'    text
 
     Information about all the entities currently in the drawing is kept in a
@@ -1867,12 +2675,14 @@ class PyurCad(tk.Tk):
     encapsulating each entity and whose keys are the canvas generated handles
     associated with each entity.
     In order to implement undo and redo, it is neccesary to detect whenever
-    there is a change in self.curr. To do this, a copy of self.curr (named
-    self.prev) is maintained. Whenever a CAD operation ends, the save_delta()
-    method is called. This method first compares self.curr with self.prev to
-    see if they are equal. If not, a set containing the values in self.curr is
-    compared with a set containing the values in self.prev. The difference is
-    loaded onto the undo_stack. The curr config is then copied to self.prev.
+    there is a change in self.curr. To do this, self.curr is a VersionedDict
+    which logs its changes, and self.prev holds the version number of the
+    last snapshot taken of it. Whenever a CAD operation ends, the save_delta()
+    method is called. This method first checks whether self.curr has changed
+    since self.prev. If so, the values added and removed since then (compared
+    by value, as sets) are loaded onto the undo_stack. A new snapshot of curr
+    is then saved to self.prev. Taking a snapshot costs nothing and the diff
+    costs only as much as the number of changes, whatever the drawing size.
                              __________
                             |  Change  |
                             |_detected_|
@@ -1891,7 +2701,7 @@ class PyurCad(tk.Tk):
 
     1. difference detected between curr and prev.
     2. diff (delta) pushed onto undo_stack.
-    3. copy of curr saved to prev.
+    3. snapshot of curr saved to prev.
 
 
     The undo & redo buttons work as shown in the diagram below.
@@ -1910,7 +2720,7 @@ class PyurCad(tk.Tk):
     1. undo_data is popped off the undo_stack.
     2. undo data is pushed onto the redo_stack.
     3. curr is updated with undo_data.
-    4. copy of curr is save to prev.
+    4. snapshot of curr is saved to prev.
 
 
      ____________ 1       3  __________      2     ______________
@@ -1927,7 +2737,7 @@ class PyurCad(tk.Tk):
     1. redo_data is popped off the redo_stack.
     2. redo data is pushed onto the undo_stack.
     3. curr is updated with redo_data.
-    4. copy of curr is saved to prev.
+    4. snapshot of curr is saved to prev.
 
     Typically, after clicking undo / redo buttons one or more times,
     the user will resume running CAD operations that create, modify or
@@ -1939,17 +2749,17 @@ class PyurCad(tk.Tk):
     def save_delta(self):
         """After a drawing change, save deltas on undo stack."""
 
-        if self.curr.values() != self.prev.values():
-            plus = set(self.curr.values()) - set(self.prev.values())
-            minus = set(self.prev.values()) - set(self.curr.values())
+        if self.curr.changed(self.prev):
+            plus, minus = self.curr.diff(self.prev)
             if plus or minus:  # Only save if something changed
                 delta = {'+': plus, '-': minus}
                 self.undo_stack.append(delta)
-                self.prev = self.curr.copy()
+                self.record_delta(delta)
                 self.clear_redo()
+            self.prev = self.curr.snapshot()
 
     def undo(self, event=None):
-        """Pop data off undo, push onto redo, update curr, copy to prev."""
+        """Pop data off undo, push onto redo, update curr, snapshot to prev."""
 
         self.end()
         if self.undo_stack:
@@ -1959,12 +2769,13 @@ class PyurCad(tk.Tk):
                 self.rem_draw(item)
             for item in undo_data['-']:
                 self.add_draw(item)
-            self.prev = self.curr.copy()
+            self.prev = self.curr.snapshot()
+            self.record_delta({'+': undo_data['-'], '-': undo_data['+']})
         else:
             print("No Undo steps available.")
 
     def redo(self, event=None):
-        """Pop data off redo, push onto undo, update curr, copy to prev."""
+        """Pop data off redo, push onto undo, update curr, snapshot to prev."""
 
         self.end()
         if self.redo_stack:
@@ -1974,10 +2785,19 @@ class PyurCad(tk.Tk):
                 self.add_draw(item)
             for item in redo_data['-']:
                 self.rem_draw(item)
-            self.prev = self.curr.copy()
+            self.prev = self.curr.snapshot()
+            self.record_delta(redo_data)
         else:
             print("No Redo steps available.")
 
+    def record_delta(self, delta):
+        """Pass a committed change on to the journal and the autosaver."""
+
+        if self.journal:
+            self.journal.append(delta)
+        if self.autosaver:
+            self.autosaver.changes += 1
+
     def add_draw(self, entity):
         """Add entity to current drawing."""
 
@@ -1987,12 +2807,20 @@ class PyurCad(tk.Tk):
             self.ccirc_gen(entity)
         elif entity.type == 'gl':
             self.gline_gen(entity)
+        elif entity.type == 'pl':
+            self.pline_gen(entity)
         elif entity.type == 'gc':
             self.gcirc_gen(entity)
         elif entity.type == 'ga':
             self.garc_gen(entity)
         elif entity.type == 'dl':
             self.dim_gen(entity)
+        elif entity.type == 'ar':
+            self.array_gen(entity)
+        elif entity.type == 'bd':
+            self.block_def_gen(entity)
+        elif entity.type == 'bi':
+            self.insert_gen(entity)
         elif entity.type == 'tx':
             self.text_gen(entity)
 
@@ -2004,7 +2832,8 @@ class PyurCad(tk.Tk):
             if v == entity:
                 if entity.type == 'cl':
                     self.cl_list.remove(entity.coords)
-                self.canvas.delete(k)
+                if entity.type != 'bd':     # keyed by name, not drawn
+                    self.canvas.delete(k)
                 del self.curr[k]
 
     def clear_redo(self):
@@ -2109,10 +2938,12 @@ class PyurCad(tk.Tk):
         self.sel_box_crnr = None
         self.canvas.delete(self.sel_boxID)
         self.sel_boxID = None
+        self.unmark()
         self.text = ''
         self.pt_stack = []
         self.float_stack = []
         self.obj_stack = []
+        self.pick_pts = []
         self.text_entry_enable = 0
         self.set_sel_mode('')
         self.allow_list = 0
@@ -2200,6 +3031,7 @@ class PyurCad(tk.Tk):
                 self.sel_boxID = None
             if self.sel_mode == 'items':
                 self.obj_stack.append(items)
+                self.pick_pts.append(self.cp2ep((x, y)))
             elif self.sel_mode == 'list':
                 if not self.obj_stack:
                     self.obj_stack.append([])
@@ -2305,6 +3137,31 @@ class PyurCad(tk.Tk):
             func = 'self.%s()' % self.op
             eval(func)
 
+    def pl_chord(self, item, x, y):
+        """If canvas item draws a polyline, return (x0, y0, x1, y1), the
+        canvas coords of its chord passing nearest to x, y, and the index
+        of the chord in the polyline's path(), else None. Only the chords
+        near x, y are looked at, found in the polyline's grid of them."""
+
+        e = self.curr.get(item)
+        if e is None or e.type != 'pl':
+            return None
+        k = e.nearest_chord(self.cp2ep((x, y)),
+                            self.canvas.c2w_dx(self.catch_radius))
+        if k is None:
+            return None
+        p0, p1 = e.chord(k)
+        return self.ep2cp(p0) + self.ep2cp(p1), k
+
+    def chord_near(self, item, x, y):
+        """Return (x0, y0, x1, y1), the canvas coords of the segment of
+        line item passing nearest to x, y."""
+
+        found = self.pl_chord(item, x, y)
+        if found:
+            return found[0]
+        return gh.nearest_segment(self.canvas.coords(item), x, y)
+
     def find_catch_pt(self, items, x, y):
         cr = self.catch_radius
         if len(items) == 1:
@@ -2345,12 +3202,26 @@ class PyurCad(tk.Tk):
                     if gh.p2p_dist(pt, (x, y)) < cr:
                         return (pt[0], pt[1])
             elif self.canvas.type(item) == 'line':
-                x0, y0, x1, y1 = self.canvas.coords(item)  # end pnts
-                xm, ym = gh.midpoint((x0, y0), (x1, y1))   # mid point
-                pts = ((x0, y0), (x1, y1), (xm, ym))
+                found = self.pl_chord(item, x, y)
+                if found:
+                    # ends & midpoint of the polyline segment of the chord
+                    (x0, y0, x1, y1), k = found
+                    e = self.curr[item]
+                    pts = [self.ep2cp(p) for p in
+                           e.segment_snap_points(e.segment_of_chord(k))]
+                else:
+                    coords = self.canvas.coords(item)
+                    x0, y0, x1, y1 = gh.nearest_segment(coords, x, y)
+                    xm, ym = gh.midpoint((x0, y0), (x1, y1))   # mid point
+                    if len(coords) > 4:   # chords of a block's arc or circle
+                        pts = ((coords[0], coords[1]),
+                               (coords[-2], coords[-1]))
+                    else:
+                        pts = ((x0, y0), (x1, y1), (xm, ym))
                 caught = None
                 for pt in pts:
-                    if 'g' in self.canvas.gettags(item) and \
+                    tags = self.canvas.gettags(item)
+                    if ('g' in tags or 'a' in tags or 'b' in tags) and \
                        gh.pnt_in_box_p((pt[0], pt[1]),
                                     (x-cr, y-cr, x+cr, y+cr)):
                         caught = pt
@@ -2364,8 +3235,8 @@ class PyurCad(tk.Tk):
         if len(items) > 1:  # intersection found
             if self.canvas.type(items[0]) == 'line' and\
                self.canvas.type(items[1]) == 'line':
-                a, b, c, d = self.canvas.coords(items[0])
-                e, f, g, h = self.canvas.coords(items[1])
+                a, b, c, d = self.chord_near(items[0], x, y)
+                e, f, g, h = self.chord_near(items[1], x, y)
                 line1 = gh.cnvrt_2pts_to_coef((a, b), (c, d))
                 line2 = gh.cnvrt_2pts_to_coef((e, f), (g, h))
                 if line1 == line2:  # colinear; toss one and try again
@@ -2394,7 +3265,7 @@ class PyurCad(tk.Tk):
                 items[0], items[1] = items[1], items[0]
             if self.canvas.type(items[0]) == 'line' and\
                self.canvas.type(items[1]) in ('oval', 'arc'):
-                x1, y1, x2, y2 = self.canvas.coords(items[0])
+                x1, y1, x2, y2 = self.chord_near(items[0], x, y)
                 line = gh.cnvrt_2pts_to_coef((x1, y1), (x2, y2))
                 e, f, g, h = self.canvas.coords(items[1])
                 xc, yc = cntr = gh.midpoint((e, f), (g, h))
@@ -2413,8 +3284,10 @@ class PyurCad(tk.Tk):
         self.canvas.bind("<Button-3>", self.rgt_click)
         self.bind("<Key>", self.set_cntr_catch)
         self.bind("<KeyRelease>", self.set_cntr_catch)
-        self.bind("<Control-B1-ButtonRelease>", self.regen_all_cl)
+        self.bind("<Control-B1-ButtonRelease>", self.regen_pan)
         self.bind("<Control-B3-ButtonRelease>", self.regen)
+        self.canvas.bind("<Control-B1-Motion>", self.view3d_moved, add='+')
+        self.canvas.bind("<Control-B3-Motion>", self.view3d_moved, add='+')
         self.bind("<Control-z>", self.undo)
         self.bind("<Control-y>", self.redo)
 
@@ -2426,6 +3299,10 @@ class PyurCad(tk.Tk):
         super().__init__()
         self.create_gui()
         self.title("PYurCAD")
+        self.topology = topology.TopologyIndex()
+        self.topology.attach(self.curr)
+        self.autosaver = autosave.AutoSaver()
+        self.after(AUTOSAVE_INTERVAL, self.autosave)
 
     def create_gui(self):
         self.create_menu()
@@ -2445,6 +3322,10 @@ class PyurCad(tk.Tk):
         self.filemenu.add_command(label="Save as", command=self.fileSaveas)
         self.filemenu.add_command(label="Import DXF", command=self.fileImport)
         self.filemenu.add_command(label="Export DXF", command=self.fileExport)
+        self.filemenu.add_command(label="Import STL",
+                                  command=self.fileImportSTL)
+        self.filemenu.add_command(label="Export STL",
+                                  command=self.fileExportSTL)
         self.filemenu.add_separator()
         self.filemenu.add_command(label="Exit", command=self.on_close_menu_clicked)
         self.menubar.add_cascade(label="File", menu=self.filemenu)
@@ -2472,6 +3353,12 @@ class PyurCad(tk.Tk):
                                   command=lambda k="itemcoords": self.dispatch(k))
         self.measmenu.add_command(label="Item Length",
                                   command=lambda k="itemlength": self.dispatch(k))
+        self.measmenu.add_command(label="Select Chain",
+                                  command=lambda k="select_chain": self.dispatch(k))
+        self.measmenu.add_command(label="Closed Profiles",
+                                  command=self.closed_profiles)
+        self.measmenu.add_command(label="Dangling Ends",
+                                  command=self.dangling_ends)
         self.measmenu.add_command(label="Calculator", command=self.launch_calc)
         self.menubar.add_cascade(label="Measure", menu=self.measmenu)
 
@@ -2500,6 +3387,22 @@ class PyurCad(tk.Tk):
                                   command=self.txt_params)
         self.menubar.add_cascade(label="Text", menu=self.textmenu)
 
+        self.modmenu = tk.Menu(self.menubar, tearoff=1)
+        for k in ('split', 'join', 'fillet', 'translate', 'rotate', 'array'):
+            self.modmenu.add_command(label=self.tool_bar_function_names[k],
+                                     command=lambda k=k: self.dispatch(k))
+        self.modmenu.add_separator()
+        self.modmenu.add_command(label="Explode Block / Polyline",
+                                 command=lambda k="explode": self.dispatch(k))
+        self.menubar.add_cascade(label="Modify", menu=self.modmenu)
+
+        self.blockmenu = tk.Menu(self.menubar, tearoff=1)
+        self.blockmenu.add_command(label="Make Block",
+                                   command=lambda k="make_block": self.dispatch(k))
+        self.blockmenu.add_command(label="Insert Block",
+                                   command=lambda k="insert_block": self.dispatch(k))
+        self.menubar.add_cascade(label="Blocks", menu=self.blockmenu)
+
         self.delmenu = tk.Menu(self.menubar, tearoff=1)
         self.delmenu.add_command(label="Delete Element",
                                  command=lambda k="del_el": self.dispatch(k))
@@ -2518,6 +3421,24 @@ class PyurCad(tk.Tk):
                                    command=lambda k="show_calc": self.dispatch(k))
         self.debugmenu.add_command(label="show dir(self)",
                                    command=lambda k="show_dir_self": self.dispatch(k))
+        self.debugmenu.add_command(label="show Undo/Redo memory",
+                                   command=lambda k="show_history_stats": self.dispatch(k))
+        self.timing_on = tk.BooleanVar()
+        self.timing_on.set(False)
+        self.debugmenu.add_checkbutton(label="Time hot paths",
+                                       onvalue=1, offvalue=0,
+                                       variable=self.timing_on,
+                                       command=self.toggle_timing)
+        self.debugmenu.add_command(label="show Timings",
+                                   command=self.launch_timing_hud)
+        self.debugmenu.add_command(label="export Timings (JSON)",
+                                   command=self.export_timings)
+        self.debugmenu.add_command(label="start Input Recording",
+                                   command=self.start_recording)
+        self.debugmenu.add_command(label="stop Input Recording",
+                                   command=self.stop_recording)
+        self.debugmenu.add_command(label="replay Input Recording",
+                                   command=self.replay_recording)
         self.debugmenu.add_command(label="show self.op",
                                    command=lambda: print(self.op))
         self.debugmenu.add_command(label="draw Workplane",
@@ -2526,6 +3447,41 @@ class PyurCad(tk.Tk):
                                    command=self.launch_demo)
         self.menubar.add_cascade(label="Debug", menu=self.debugmenu)
 
+        self.menu3d = tk.Menu(self.menubar, tearoff=1)
+        self.menu3d.add_command(label="Extrude",
+                                command=lambda k="extrude": self.dispatch(k))
+        self.menu3d.add_command(label="Revolve",
+                                command=lambda k="revolve": self.dispatch(k))
+        self.menu3d.add_command(label="Demo Cube", command=self.launch_demo)
+        self.menu3d.add_command(label="Pick Face / Edge",
+                                command=lambda k="pick3d": self.dispatch(k))
+        self.menu3d.add_command(label="Apply View Rotation",
+                                command=self.apply_rotation_3d)
+        self.menu3d.add_separator()
+        self.render3d = tk.StringVar()
+        self.render3d.set('wire')
+        self.menu3d.add_radiobutton(label="Wireframe", value='wire',
+                                    variable=self.render3d,
+                                    command=self.set_render_mode)
+        self.menu3d.add_radiobutton(label="Filled Faces", value='faces',
+                                    variable=self.render3d,
+                                    command=self.set_render_mode)
+        self.menu3d.add_radiobutton(label="Hidden Lines Removed",
+                                    value='hidden', variable=self.render3d,
+                                    command=self.set_render_mode)
+        self.menu3d.add_radiobutton(label="Hidden Lines Dashed",
+                                    value='dashed', variable=self.render3d,
+                                    command=self.set_render_mode)
+        self.menu3d.add_separator()
+        self.perspective = tk.BooleanVar()
+        self.perspective.set(False)
+        self.menu3d.add_checkbutton(label="Perspective", onvalue=1,
+                                    offvalue=0, variable=self.perspective,
+                                    command=self.set_render_mode)
+        self.menu3d.add_separator()
+        self.menu3d.add_command(label="Clear 3D View", command=self.clear_3d)
+        self.menubar.add_cascade(label="3D", menu=self.menu3d)
+
         self.helpmenu = tk.Menu(self.menubar, tearoff=0)
         self.helpmenu.add_command(label="About", command=self.on_about_menu_clicked)
         self.menubar.add_cascade(label="Help", menu=self.helpmenu)
@@ -2624,27 +3580,36 @@ class PyurCad(tk.Tk):
         MMB controls both X and Y axis rotation.
         Ctrl-MMB controls Z axis rotation.
     """
-    RATE = 3
     SPEED = 1
+    display3d = None    # DisplayList of the 3D view's canvas items
+    faces3d = None      # FaceList of the 3D view's filled faces
+    visible3d = None    # SegmentList of edges left by hidden-line removal
+    hidden3d = None     # SegmentList of hidden edges (dashed)
+    hlr_view = None     # view for which the hidden-line pass was drawn
+    hlr_job = None      # id of the pending (after) hidden-line pass
+    camera = None       # camera.Camera of the perspective 3D view
+    frame_job = None    # id of the pending (after) 3D frame
+    proxy3d = None      # mesh.Mesh drawn instead of mesh3d when too slow
+    proxy_on = False    # True while the proxy stands in for mesh3d
+    proxylist = None    # SegmentList of the proxy's edges
+    mesh3d = None       # mesh.Mesh shown in the 3D view
+    orient = None       # matrix.Quaternion orienting the part in the view
+    orient_ang = None   # ang as of the last sync with orient
+    faces_bvh = None    # bvh.BVH over mesh3d's faces, for picking
+    edges_bvh = None    # bvh.BVH over mesh3d's edges
+    revolve3d = None    # (profile, axis) mesh3d was revolved from, if it was
 
     def launch_demo(self):
-        # simple (half) cube
-        # base square, 200mm x 200mm
-        self.square1 = [
-            matrix.Vector3D(-100, 100, 0),
-            matrix.Vector3D(100, 100, 0),
-            matrix.Vector3D(100, -100, 0),
-            matrix.Vector3D(-100, -100, 0)
-            ]
-        # top square
-        self.square2 = [
-            matrix.Vector3D(-100, 100, 100),
-            matrix.Vector3D(100, 100, 100),
-            matrix.Vector3D(100, -100, 100),
-            matrix.Vector3D(-100, -100, 100)
-            ]
+        # simple (half) cube, 200mm x 200mm x 100mm
+        self.launch_3d(mesh.box(-100, -100, 0, 100, 100, 100))
+
+    def launch_3d(self, part, pivot=(0.0, 0.0, 0.0)):
+        """Show Mesh part in the 3D view, rotating about point pivot."""
+        self.pivot = pivot
 
         self.ang = [0.0, 0.0, 0.0] # phi(x), theta(y), psi(z)
+        self.orient = matrix.Quaternion()   # the same, as dragged
+        self.orient_ang = list(self.ang)
         self.trans = [0.0, 0.0, 0.0] # translation (x, y, z)
         # (e.g. if want to move the Camera to (0, 0, 2),
         # then (0, 0, -2) need to be entered)
@@ -2652,115 +3617,454 @@ class PyurCad(tk.Tk):
         #The matrices (Scale, Shear, Rotate, Translate) apply to the View/Camera
 
         #The Scale Matrix
-        self.Scale = matrix.Matrix(4, 4)
         Scalex = 1.0
         Scaley = 1.0
         Scalez = 1.0
-        self.Scale[(0,0)] = Scalex
-        self.Scale[(1,1)] = Scaley
-        self.Scale[(2,2)] = Scalez
+        self.Scale = matrix.Transform4.scaling(Scalex, Scaley, Scalez)
 
         #The Shear Matrix
-        self.Shearxy = matrix.Matrix(4, 4)
-        self.Shearxy[(0,2)] = 0.0
-        self.Shearxy[(1,2)] = 0.0
-        self.Shearxz = matrix.Matrix(4, 4)
-        self.Shearxz[(0,1)] = 0.0
-        self.Shearxz[(2,1)] = 0.0
-        self.Shearyz = matrix.Matrix(4, 4)
-        self.Shearyz[(1,0)] = 0.0
-        self.Shearyz[(2,0)] = 0.0
-        self.Shear = self.Shearxy*self.Shearxz*self.Shearyz
-
-        #The Rotation Matrices
-        self.Rotx = matrix.Matrix(4,4)
-        self.Roty = matrix.Matrix(4,4)
-        self.Rotz = matrix.Matrix(4,4)
-
-        #The Translation Matrix (will contain xoffset, yoffset, zoffset)
-        self.Tr = matrix.Matrix(4, 4)   
+        Shearxy = (0.0, 0.0)    # x and y sheared by z
+        Shearxz = (0.0, 0.0)    # x and z sheared by y
+        Shearyz = (0.0, 0.0)    # y and z sheared by x
+        self.Shear = (matrix.Transform4((1.0, 0.0, Shearxy[0], 0.0,
+                                         0.0, 1.0, Shearxy[1], 0.0,
+                                         0.0, 0.0, 1.0, 0.0,
+                                         0.0, 0.0, 0.0, 1.0))
+                      * matrix.Transform4((1.0, Shearxz[0], 0.0, 0.0,
+                                           0.0, 1.0, 0.0, 0.0,
+                                           0.0, Shearxz[1], 1.0, 0.0,
+                                           0.0, 0.0, 0.0, 1.0))
+                      * matrix.Transform4((1.0, 0.0, 0.0, 0.0,
+                                           Shearyz[0], 1.0, 0.0, 0.0,
+                                           Shearyz[1], 0.0, 1.0, 0.0,
+                                           0.0, 0.0, 0.0, 1.0)))
 
         #The Projection Matrix
-        self.Proj = matrix.Matrix(4, 4) 
         #2nd version (Simple Projection, no perspective)
-        self.Proj[(2,3)] = -1.0
-        self.Proj[(3,3)] = 0.0
+        self.Proj = matrix.Transform4((1.0, 0.0, 0.0, 0.0,
+                                       0.0, 1.0, 0.0, 0.0,
+                                       0.0, 0.0, 1.0, -1.0,
+                                       0.0, 0.0, 0.0, 0.0))
 
         self.lctrl_pressed = False
 
+        self.clear_3d()
+        self.mesh3d = part
+        self.faces_bvh = bvh.BVH(part, 'faces')
+        self.edges_bvh = bvh.BVH(part, 'edges')
+        self.display3d = display3d.DisplayList(self.canvas, tags='demo',
+                                               fill='red')
+        self.faces3d = display3d.FaceList(self.canvas, tags='demo')
+        self.visible3d = display3d.SegmentList(self.canvas, tags='demo',
+                                               fill='red')
+        self.hidden3d = display3d.SegmentList(self.canvas, tags='demo',
+                                              fill='red', dash=(2, 4))
+        self.camera = camera.Camera()
+        # a bounding box stands in for the part if frames take too long
+        self.proxy3d = mesh.box(*part.bounds())
+        self.proxylist = display3d.SegmentList(self.canvas, tags='demo',
+                                               fill=RUBBERCOLOR)
+        self.proxy_on = False
+
         self.bind("<B2-Motion>", self.dragcallback)
         self.bind("<ButtonRelease-2>", self.releasecallback)
         self.bind("<Key>", self.keycallback)
         self.bind("<KeyRelease>", self.keyreleasecallback)
 
-        self.cnt = self.RATE
-        self.prevmouseX = 0.0
-        self.prevmouseY = 0.0
+        self.prevmouseX = None
+        self.prevmouseY = None
 
         self.update()
 
     def update(self):
-        for item in self.canvas.find_withtag('demo'):
-            self.canvas.delete(item)
+        if not self.mesh3d:
+            return
+        self.canvas.delete('pick3d')    # drawn for the previous view
+        #The Rotation matrix, from the orbit quaternion
+        if self.ang != self.orient_ang:     # ang was set, not dragged
+            self.orient = matrix.Quaternion.from_euler(*self.ang)
+            self.orient_ang = list(self.ang)
+        self.Rot = self.orient.to_transform()
+
+        #The Translation Matrix (contains xoffset, yoffset, zoffset)
+        self.Tr = matrix.Transform4.translation(*self.trans)
 
-        self.Rotx[(1,1)] = math.cos(math.radians(self.ang[0]))
-        self.Rotx[(1,2)] = -math.sin(math.radians(self.ang[0]))
-        self.Rotx[(2,1)] = math.sin(math.radians(self.ang[0]))
-        self.Rotx[(2,2)] = math.cos(math.radians(self.ang[0]))
+        #The Transformation matrix
+        x, y, z = self.pivot
+        self.Tsf = (matrix.Transform4.translation(x, y, z)
+                    * self.Scale*self.Shear*self.Rot*self.Tr
+                    * matrix.Transform4.translation(-x, -y, -z))
+
+        part = self.mesh3d
+        model, proj, vp, eye, near = self.projection3d()
+        if self.proxy_on:
+            self.draw_proxy(model, proj, vp, eye)
+            return
+        self.proxylist.hide()
+        mode = self.render3d.get()
+        if mode == 'faces':
+            # Faces need depth & normals in view space, then projection
+            view = matrix.transform_points(model, part.vertices)
+            c = matrix.project_points(proj, view, vp)
+            self.faces3d.draw(part, view, c, model, eye, near)
+        elif (mode in ('hidden', 'dashed') and
+              self.hlr_view == (model, proj, vp)):
+            pass    # hidden-line drawing of this view is still on screen
+        else:
+            self.draw_wireframe(model, proj, vp, eye)
+            if mode in ('hidden', 'dashed'):
+                # Show the wireframe while the view moves, then hide lines
+                self.hlr_view = None
+                if self.hlr_job:
+                    self.after_cancel(self.hlr_job)
+                self.hlr_job = self.after(HLR_DELAY, self.hidden_line_pass)
+
+    def projection3d(self):
+        """Return (model, proj, vp, eye, near) for the current 3D view.
+
+        model takes the part to view space, proj takes view space to the
+        projection plane (orthographic) or to clip space (perspective),
+        and vp = (sx, tx, sy, ty) maps that plane to the canvas. eye is
+        the view space eye point and near the near plane distance, both
+        None for the orthographic view."""
+        if not self.perspective.get():
+            return self.Tsf, self.Proj, self.viewport(), None, None
+        w = self.canvas.winfo_width()
+        h = self.canvas.winfo_height()
+        left = self.canvas.canvasx(0)
+        top = self.canvas.canvasy(0)
+        # Aim at the middle of the canvas, so Ctrl pan & zoom drive the camera
+        x, y = self.cp2ep((left + w/2, top + h/2))
+        self.camera.focus((x, y, self.pivot[2]), self.canvas.scl[0], h)
+        return (self.camera.view()*self.Tsf, self.camera.projection(w/h),
+                self.camera.viewport(left, top, w, h), (0.0, 0.0, 0.0),
+                self.camera.near)
+
+    def draw_wireframe(self, model, proj, vp, eye):
+        part = self.mesh3d
+        if eye is None:
+            #Transform, project and convert to canvas coords in one pass
+            c = matrix.project_points(proj*model, part.vertices, vp)
+            # Move the lines (they are only created the first time)
+            self.display3d.draw(part.edges, c)
+            self.visible3d.hide()
+        else:
+            # Clip the edges to the near plane before dividing by w
+            hom = camera.clip_points(proj*model, part.vertices)
+            self.visible3d.draw(camera.clip_edges(hom, part.edges, vp))
+            self.display3d.hide()
+        self.hidden3d.hide()
+
+    def draw_proxy(self, model, proj, vp, eye):
+        """Draw the proxy's edges in place of the part, which is hidden."""
+        part = self.proxy3d
+        if eye is None:
+            c = matrix.project_points(proj*model, part.vertices, vp)
+            segments = []
+            for i, j in zip(part.edges[0::2], part.edges[1::2]):
+                segments.extend((c[2*i], c[2*i+1], c[2*j], c[2*j+1]))
+        else:
+            hom = camera.clip_points(proj*model, part.vertices)
+            segments = camera.clip_edges(hom, part.edges, vp)
+        self.proxylist.draw(segments)
+        for drawn in (self.display3d, self.faces3d, self.visible3d,
+                      self.hidden3d):
+            drawn.hide()
+        self.hlr_view = None
+
+    def render_frame(self):
+        """Draw one 3D frame, with all the rotation accumulated since the
+        last one. If the part took longer than a frame to draw, the proxy
+        is drawn instead until the mouse button is released."""
+        self.frame_job = None
+        t0 = time.perf_counter()
+        self.update()
+        if (not self.proxy_on and self.prevmouseX is not None and
+                time.perf_counter() - t0 > FRAME_MS / 1000):
+            self.proxy_on = True
+
+    def schedule_frame(self):
+        """Ask for a frame at the next refresh (frames don't pile up)."""
+        if not self.frame_job:
+            self.frame_job = self.after(FRAME_MS, self.render_frame)
+
+    def hidden_line_pass(self):
+        """Draw the 3D view with hidden lines removed (or dashed)."""
+        self.hlr_job = None
+        part = self.mesh3d
+        if not part or self.render3d.get() not in ('hidden', 'dashed'):
+            return
+        model, proj, vp, eye, near = self.projection3d()
+        view = matrix.transform_points(model, part.vertices)
+        if eye is None:
+            xyz = view
+        elif max(view[2::3]) > -near:
+            return  # the part reaches past the near plane: keep wireframe
+        else:
+            # Lines & planes stay lines & planes in normalized device
+            # coords, so hide lines there, with depth increasing nearer
+            xyz = matrix.transform_points(proj, view)
+            xyz[2::3] = array('d', [-z for z in xyz[2::3]])
+        faces = None
+        if part.closed:     # back faces can't hide what front faces don't
+            faces = [f for depth, shade, f in
+                     display3d.visible_faces(part, view, model, eye, near)]
+        visible, hidden = hiddenline.hidden_lines(part, xyz, faces)
+        sx, tx, sy, ty = vp
+        for segments in (visible, hidden):
+            segments[0::2] = [sx*x+tx for x in segments[0::2]]
+            segments[1::2] = [sy*y+ty for y in segments[1::2]]
+        self.display3d.hide()
+        self.visible3d.draw(visible)
+        if self.render3d.get() == 'dashed':
+            self.hidden3d.draw(hidden)
+        else:
+            self.hidden3d.hide()
+        self.hlr_view = (model, proj, vp)
+
+    def view3d_moved(self, event=None):
+        """Redraw a perspective 3D view as Ctrl pan / zoom move the camera,
+        and a revolved part at the resolution the new zoom needs.
+
+        (An orthographic view is moved with the rest of the canvas.)"""
+        if not self.mesh3d:
+            return
+        if self.revolve3d:
+            part = self.revolved_part()
+            if part is not self.mesh3d:
+                self.replace_part_3d(part)
+                return
+        if self.perspective.get():
+            self.update()
 
-        self.Roty[(0,0)] = math.cos(math.radians(self.ang[1]))
-        self.Roty[(0,2)] = math.sin(math.radians(self.ang[1]))
-        self.Roty[(2,0)] = -math.sin(math.radians(self.ang[1]))
-        self.Roty[(2,2)] = math.cos(math.radians(self.ang[1]))
+    def replace_part_3d(self, part):
+        """Show part in place of mesh3d, keeping the view as it is."""
+        self.mesh3d = part
+        self.faces_bvh = bvh.BVH(part, 'faces')
+        self.edges_bvh = bvh.BVH(part, 'edges')
+        self.proxy3d = mesh.box(*part.bounds())
+        self.hlr_view = None
+        self.update()
 
-        self.Rotz[(0,0)] = math.cos(math.radians(self.ang[2]))
-        self.Rotz[(0,1)] = -math.sin(math.radians(self.ang[2]))
-        self.Rotz[(1,0)] = math.sin(math.radians(self.ang[2]))
-        self.Rotz[(1,1)] = math.cos(math.radians(self.ang[2]))
+    def set_render_mode(self):
+        """Redraw the 3D view after its render mode or projection changed."""
+        if self.mesh3d:
+            for drawn in (self.display3d, self.faces3d, self.visible3d,
+                          self.hidden3d):
+                drawn.clear()
+            self.hlr_view = None
+            self.update()
 
-        #The Rotation matrix
-        self.Rot = self.Rotx*self.Roty*self.Rotz
+    def clear_3d(self):
+        for drawn in (self.display3d, self.faces3d, self.visible3d,
+                      self.hidden3d):
+            if drawn:
+                drawn.clear()
+        if self.proxylist:
+            self.proxylist.clear()
+        for job in (self.hlr_job, self.frame_job):
+            if job:
+                self.after_cancel(job)
+        self.hlr_job = None
+        self.frame_job = None
+        self.hlr_view = None
+        self.canvas.delete('pick3d')
+        self.mesh3d = None
+        self.revolve3d = None
+        self.faces_bvh = None
+        self.edges_bvh = None
+
+    def ray3d(self, cx, cy):
+        """Return (origin, direction) of the ray through canvas point
+        (cx, cy) in the coordinates of the part, so that picking needs no
+        transform of the part or its BVHs."""
+        model, proj, vp, eye, near = self.projection3d()
+        sx, tx, sy, ty = vp
+        x = (cx - tx) / sx
+        y = (cy - ty) / sy
+        if eye is None:
+            # Looking down -z of view space; start above the whole part
+            xmin, ymin, zmin, xmax, ymax, zmax = self.mesh3d.bounds()
+            top = max(model.transform_point(px, py, pz)[2]
+                      for px in (xmin, xmax) for py in (ymin, ymax)
+                      for pz in (zmin, zmax)) + 1.0
+            inv = model.inverse()
+            p0 = inv.transform_point(x, y, top)
+            p1 = inv.transform_point(x, y, top - 1.0)
+        else:
+            # Normalized device coords from the near to the far plane
+            inv = (proj*model).inverse()
+            p0 = inv.transform_point(x, y, -1.0)
+            p1 = inv.transform_point(x, y, 1.0)
+        return p0, (p1[0]-p0[0], p1[1]-p0[1], p1[2]-p0[2])
+
+    def pick3d(self, p=None):
+        """Pick a face or an edge of the part in the 3D view."""
+
+        self.op = 'pick3d'
+        if not self.mesh3d:
+            self.update_message_bar('Nothing in the 3D view to pick')
+            self.end()
+            return
+        if not self.pt_stack:
+            if p is None:   # (else just the mouse moving)
+                self.set_sel_mode('pnt')
+                self.update_message_bar('Pick a face or edge in the 3D view')
+            return
+        cx, cy = self.ep2cp(self.pt_stack.pop())
+        origin, direction = self.ray3d(cx, cy)
+        tol = self.canvas.c2w_dx(self.catch_radius)
+        hit = bvh.pick(self.faces_bvh, self.edges_bvh, origin, direction, tol)
+        self.canvas.delete('pick3d')
+        if not hit:
+            self.update_message_bar('Nothing picked. Pick a face or edge')
+            return
+        kind, k, t = hit
+        part = self.mesh3d
+        model, proj, vp, eye, near = self.projection3d()
+        c = matrix.project_points(proj*model, part.vertices, vp)
+        if kind == 'edge':
+            i, j = part.edges[2*k], part.edges[2*k+1]
+            self.canvas.create_line(c[2*i], c[2*i+1], c[2*j], c[2*j+1],
+                                    fill='yellow', width=3, tags='pick3d')
+            x0, y0, z0 = part.vertices[3*i:3*i+3]
+            x1, y1, z1 = part.vertices[3*j:3*j+3]
+            length = math.sqrt((x1-x0)**2 + (y1-y0)**2 + (z1-z0)**2)
+            self.update_message_bar('Edge %d, length = %s %s' % (
+                k, round(length/self.unitscale, 3), self.units))
+        else:
+            xy = []
+            for i in part.face(k):
+                xy.extend((c[2*i], c[2*i+1]))
+            self.canvas.create_polygon(xy, fill='', outline='yellow',
+                                       width=3, tags='pick3d')
+            self.update_message_bar('Face %d, normal = (%.3f, %.3f, %.3f)'
+                                    % ((k,) + part.normal(k)))
+
+    def apply_rotation_3d(self):
+        """Move the part to where the 3D view has turned it, and reset
+        the view's rotation. The picking BVHs are refit, not rebuilt."""
+        part = self.mesh3d
+        if not part:
+            return
+        if self.revolve3d:
+            # leave the cached tessellation as it is
+            part = copy.copy(part)
+            self.mesh3d = self.faces_bvh.part = self.edges_bvh.part = part
+            self.revolve3d = None
+        x, y, z = self.pivot
+        part.transform(matrix.Transform4.translation(x, y, z) * self.Rot
+                       * matrix.Transform4.translation(-x, -y, -z))
+        self.faces_bvh.refit()
+        self.edges_bvh.refit()
+        self.proxy3d = mesh.box(*part.bounds())
+        self.ang = [0.0, 0.0, 0.0]
+        self.hlr_view = None
+        self.update()
 
-        self.Tr[(0,3)] = self.trans[0]
-        self.Tr[(1,3)] = self.trans[1]
-        self.Tr[(2,3)] = self.trans[2]
+    def geometry_items(self, handles):
+        """Return [(type, coords), ...] of the entities drawn by canvas
+        items handles, with polylines split into their lines and arcs."""
+
+        items = []
+        for handle in handles:
+            entity = self.curr.get(handle)
+            if entity is None:
+                continue
+            if entity.type == 'pl':
+                items.extend((t, attribs[0]) for t, attribs in entity.expand())
+            else:
+                items.append((entity.type, entity.coords))
+        return items
 
-        #The Transformation matrix
-        self.Tsf = self.Scale*self.Shear*self.Rot*self.Tr
-
-        #Cube
-        poly1 = []  # 4 points (corners) of bottom face
-        for point in self.square1:
-            # Apply transform matrix
-            r = self.Tsf*point
-            # Transform the point from 3D to 2D
-            ps = self.Proj*r
-            # Convert point from ECS to Canvas coordinates
-            cx, cy = self.ep2cp((ps.x, ps.y))
-            # Put the screenpoint in the list of transformed vertices
-            poly1.append((int(cx), int(cy)))
-        poly2 = []  # 4 points (corners) of top face
-        for point in self.square2:
-            # Apply transform matrix
-            r = self.Tsf*point
-            # Transform the point from 3D to 2D
-            ps = self.Proj*r
-            # Convert point from ECS to Canvas coordinates
-            cx, cy = self.ep2cp((ps.x, ps.y))
-            # Put the screenpoint in the list of transformed vertices
-            poly2.append((int(cx), int(cy)))
-        # Draw lines
-        for poly in (poly1, poly2):
-            for k in range(4):  # draw edges of top and bot faces
-                try:
-                    self.canvas.create_line(poly[k][0], poly[k][1], poly[k+1][0],
-                                           poly[k+1][1], fill='red', tags='demo')
-                except IndexError:
-                    self.canvas.create_line(poly[k][0], poly[k][1], poly[0][0],
-                                           poly[0][1], fill='red', tags='demo')
-        for i in range(4):  # draw edges from top face to bot face
-            self.canvas.create_line(poly1[i][0], poly1[i][1], poly2[i][0],
-                                           poly2[i][1], fill='red', tags='demo')
+    def extrude(self, obj=None):
+        """Extrude selected geometry lines, arcs & circles into a 3D part."""
+
+        if not self.obj_stack:
+            self.set_sel_mode('items')
+            self.allow_list = 1
+            self.update_message_bar('Select item(s) to extrude')
+        elif not self.float_stack:
+            self.allow_list = 0
+            self.update_message_bar('Enter height of extrusion')
+        else:
+            height = self.float_stack.pop()*self.unitscale
+            handles = self.obj_stack.pop()
+            # tessellate arcs finely enough to look smooth at this zoom
+            tol = self.canvas.c2w_dx(TESS_TOL)
+            profiles = []
+            for t, coords in self.geometry_items(handles):
+                if t == 'gl':
+                    profiles.append(list(coords))
+                elif t == 'ga':
+                    profiles.append(mesh.arc_points(*coords, tol))
+                elif t == 'gc':
+                    pc, r = coords
+                    profiles.append(mesh.arc_points(pc, r, 0, 360, tol))
+            if not profiles:
+                self.update_message_bar('No lines, arcs or circles selected')
+                return
+            part = mesh.extrude(profiles, height)
+            xmin, ymin, zmin, xmax, ymax, zmax = part.bounds()
+            self.launch_3d(part, ((xmin+xmax)/2, (ymin+ymax)/2, (zmin+zmax)/2))
+            self.update_message_bar('%d faces extruded. MMB to rotate.'
+                                    % part.face_count())
+            self.end()
+
+    def revolve(self, obj=None):
+        """Revolve selected geometry lines & arcs about a construction
+        line into a 3D part."""
+
+        if not self.obj_stack:
+            self.set_sel_mode('items')
+            self.allow_list = 1
+            self.update_message_bar('Select line(s) & arc(s) to revolve')
+        elif len(self.obj_stack) == 1:
+            self.set_sel_mode('items')
+            self.allow_list = 0
+            self.update_message_bar('Pick a construction line for the axis')
+        else:
+            picked = self.obj_stack.pop()
+            axis = None
+            for handle in picked:
+                entity = self.curr.get(handle)
+                if entity is not None and entity.type == 'cl':
+                    axis = tuple(entity.coords)
+                    break
+            if axis is None:
+                self.update_message_bar('That is not a construction line. '
+                                        'Pick one for the axis')
+                return
+            handles = self.obj_stack.pop()
+            profile = []
+            for t, coords in self.geometry_items(handles):
+                if t == 'gl':
+                    p1, p2 = coords
+                    profile.append(('gl', (tuple(p1), tuple(p2))))
+                elif t == 'ga':
+                    pc, r, a0, a1 = coords
+                    profile.append(('ga', (tuple(pc), r, a0, a1)))
+            if not profile:
+                self.update_message_bar('No lines or arcs selected')
+                self.end()
+                return
+            revolve3d = (tuple(profile), axis)
+            self.revolve3d = revolve3d
+            part = self.revolved_part()
+            xmin, ymin, zmin, xmax, ymax, zmax = part.bounds()
+            self.launch_3d(part, ((xmin+xmax)/2, (ymin+ymax)/2, (zmin+zmax)/2))
+            self.revolve3d = revolve3d  # (launch_3d cleared it)
+            self.update_message_bar('%d faces revolved. MMB to rotate.'
+                                    % part.face_count())
+            self.end()
+
+    def revolved_part(self):
+        """Return the mesh of revolve3d, with as many angular steps as it
+        needs to look smooth at this zoom (cached by mesh.revolve)."""
+        profile, axis = self.revolve3d
+        steps = mesh.revolve_steps(mesh.profile_radius(profile, axis),
+                                   self.canvas.c2w_dx(TESS_TOL))
+        return mesh.revolve(profile, axis, steps)
 
     def dragcallback(self, event):
         # It's also possible to use the angle calculated from the mousepos-change
@@ -2771,41 +4075,31 @@ class PyurCad(tk.Tk):
 
         # if ang < 0.0:
         #     ang += 360.0
-        self.cnt -= 1
-        if self.cnt == 0:
-            self.cnt = self.RATE
+        if self.prevmouseX is not None:
             diffX = event.x-self.prevmouseX
             diffY = event.y-self.prevmouseY
 
+            # Turn about the screen's axes, whatever the orientation
+            Q = matrix.Quaternion
             if not self.lctrl_pressed:
-                self.ang[0] += diffY*self.SPEED
-                self.ang[1] += diffX*self.SPEED
-
-                if self.ang[0] >= 360.0:
-                    self.ang[0] -= 360.0
-                if self.ang[0] < 0.0:
-                    self.ang[0] += 360.0
-                if self.ang[1] >= 360.0:
-                    self.ang[1] -= 360.0
-                if self.ang[1] < 0.0:
-                    self.ang[1] += 360.0
-
+                turn = (Q.from_axis_angle((1.0, 0.0, 0.0), diffY*self.SPEED)
+                        * Q.from_axis_angle((0.0, 1.0, 0.0), diffX*self.SPEED))
             else:
-                self.ang[2] += diffX*self.SPEED
-                if self.ang[2] >= 360.0:
-                    self.ang[2] -= 360.0
-                if self.ang[2] < 0.0:
-                    self.ang[2] += 360.0
-            print(self.ang[0], self.ang[1], self.ang[2])
-            self.update()
+                turn = Q.from_axis_angle((0.0, 0.0, 1.0), diffX*self.SPEED)
+            self.orient = (turn*self.orient).normalized()
+            self.ang = list(self.orient.to_euler())
+            self.orient_ang = list(self.ang)
+            self.schedule_frame()
 
         self.prevmouseX = event.x
         self.prevmouseY = event.y
 
     def releasecallback(self, event):
-        self.cnt = self.RATE
-        self.prevmouseX = 0.0
-        self.prevmouseY = 0.0
+        self.prevmouseX = None
+        self.prevmouseY = None
+        if self.proxy_on:   # draw the part itself again
+            self.proxy_on = False
+            self.schedule_frame()
 
     def keycallback(self, event):
         # print event.char
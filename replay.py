@@ -0,0 +1,177 @@
+"""Record the input reaching PyurCad's handlers and replay it later.
+
+A Recorder wraps the app's event handlers (and the canvas pan / zoom
+transforms) so that every call is written to a JSON-lines file together
+with its time, canvas coordinates and whatever else the handler reads
+(entry text, shift-key state). The first line of the file holds the
+drawing and view as they were when recording started.
+
+replay() restores that drawing and view in a PyurCad instance, then
+calls the same handlers with the same arguments as fast as possible and
+returns the latency of each handler call, so that a real drafting
+session can be checked against each build:
+    python replay.py session.rec [report.json]
+"""
+
+import functools
+import json
+import sys
+import time
+import history
+import instrument
+from zooming import Pair
+
+APP_HANDLERS = ('lft_click', 'mouse_move', 'keyboard_entry', 'dispatch',
+                'regen', 'regen_pan', 'regen_all_cl')
+CANVAS_HANDLERS = ('move_can', 'scale')
+EVENT_HANDLERS = ('lft_click', 'mouse_move', 'keyboard_entry')
+
+
+class Event:
+    """Stand-in for the Tk event passed to a handler."""
+
+    def __init__(self, x=0, y=0):
+        self.x = x
+        self.y = y
+
+
+def rebind(app):
+    """Point the bindings that captured bound methods at the current ones."""
+    app.canvas.bind("<Motion>", app.mouse_move)
+    app.canvas.bind("<Button-1>", app.lft_click)
+    app.entry.bind("<KeyPress-Return>", app.keyboard_entry)
+    app.entry.bind("<KeyPress-KP_Enter>", app.keyboard_entry)
+    app.bind("<Control-B1-ButtonRelease>", app.regen_pan)
+    app.bind("<Control-B3-ButtonRelease>", app.regen)
+
+
+class Recorder:
+    """Records handler calls of a PyurCad instance to a file."""
+
+    def __init__(self, app, path):
+        self.app = app
+        self.path = path
+        self.f = None
+        self.depth = 0      # > 0 while inside a recorded call
+        self.t0 = 0.0
+        self.count = 0
+
+    def start(self):
+        app = self.app
+        canvas = app.canvas
+        self.f = open(self.path, 'w')
+        header = {'drawing': [{e.type: e.get_attribs()}
+                              for e in app.curr.values()],
+                  'off': tuple(canvas.off), 'scl': tuple(canvas.scl),
+                  'size': (canvas.winfo_width(), canvas.winfo_height()),
+                  'units': app.units}
+        self.f.write(json.dumps(header) + '\n')
+        self.t0 = time.perf_counter()
+        for obj, names in ((app, APP_HANDLERS), (canvas, CANVAS_HANDLERS)):
+            for name in names:
+                instrument.add_wrapper(obj, name, self,
+                                       functools.partial(self.wrap, name))
+        rebind(app)
+
+    def stop(self):
+        instrument.remove_wrappers(self.app, self)
+        instrument.remove_wrappers(self.app.canvas, self)
+        rebind(self.app)
+        self.f.close()
+        self.f = None
+
+    def wrap(self, name, func):
+        @functools.wraps(func)
+        def recorded(*args):
+            if not self.depth:  # calls made by other handlers replay anyway
+                self.write(name, args)
+            self.depth += 1
+            try:
+                return func(*args)
+            finally:
+                self.depth -= 1
+        return recorded
+
+    def write(self, name, args):
+        app = self.app
+        record = {'t': time.perf_counter() - self.t0, 'h': name}
+        if name in EVENT_HANDLERS:
+            event = args[0]
+            record['x'] = event.x
+            record['y'] = event.y
+            record['catch'] = app.catchCntr
+            if name == 'keyboard_entry':
+                record['text'] = app.entry.get()
+        elif args and not hasattr(args[0], 'widget'):
+            record['args'] = args   # dispatch key, pan / zoom amounts
+        self.f.write(json.dumps(record) + '\n')
+        self.count += 1
+
+
+def read_recording(path):
+    with open(path) as f:
+        header = json.loads(f.readline())
+        events = [json.loads(line) for line in f if line.strip()]
+    return header, events
+
+
+def restore(app, header):
+    """Put app's drawing and view back as they were when recording began."""
+    app.end()
+    app.del_all()
+    app.set_units(header['units'])
+    app.canvas.off = Pair(*header['off'])
+    app.canvas.scl = Pair(*header['scl'])
+    for ent_dict in header['drawing']:
+        (t, attribs), = ent_dict.items()
+        app.add_draw(history.ENTITY_CLASSES[t](json_to_tuple(attribs)))
+    app.regen()
+    app.end()
+    app.update_idletasks()
+
+
+def json_to_tuple(value):
+    """Turn the lists that JSON made of attribute tuples back into tuples."""
+    if isinstance(value, list):
+        return tuple(json_to_tuple(v) for v in value)
+    return value
+
+
+def replay(app, path):
+    """Replay the recording at path into app. Return instrument.Timings."""
+    header, events = read_recording(path)
+    restore(app, header)
+    timings = instrument.Timings(window=len(events) or 1)
+    for record in events:
+        name = record['h']
+        if name in CANVAS_HANDLERS:
+            func = getattr(app.canvas, name)
+        else:
+            func = getattr(app, name)
+        if name in EVENT_HANDLERS:
+            app.catchCntr = record['catch']
+            if name == 'keyboard_entry':
+                app.entry.delete(0, 'end')
+                app.entry.insert(0, record['text'])
+            args = (Event(record['x'], record['y']),)
+        else:
+            args = json_to_tuple(record.get('args', ()))
+        t0 = time.perf_counter()
+        func(*args)
+        app.update_idletasks()
+        timings.add(name, time.perf_counter() - t0)
+    return timings
+
+
+if __name__ == '__main__':
+    import tkinter as tk
+    import pyurcad
+    app = pyurcad.PyurCad()
+    header, events = read_recording(sys.argv[1])
+    app.geometry('%dx%d' % (header['size'][0] + 60, header['size'][1] + 40))
+    tk.Tk.update(app)   # PyurCad.update belongs to the 3D demo
+    timings = replay(app, sys.argv[1])
+    print(timings.format_report())
+    if len(sys.argv) > 2:
+        timings.dump(sys.argv[2])
+    app.destroy()
@@ -0,0 +1,180 @@
+"""Read and write STL files as indexed meshes.
+
+STL keeps every triangle with its own three corners, so a vertex shared
+by six triangles is stored six times. On reading, corners are merged
+into the vertices of a mesh.Mesh by a hash on their coordinates rounded
+to QUANTUM, so that corners written with slightly different float
+rounding still meet. Triangles are read a block at a time, straight into
+flat arrays (or with numpy.fromfile, if numpy is there): no object is
+kept per triangle, so files of millions of triangles load in bounded
+extra memory.
+
+STL has no units; coordinates are taken to be mm, like the ECS.
+"""
+
+from array import array
+import struct
+import mesh
+
+try:
+    import numpy
+except ImportError:     # read with struct instead
+    numpy = None
+
+QUANTUM = 1e-5      # corners closer than this (mm) are merged
+BLOCK = 65536       # triangles read or written at a time
+
+HEADER = 80
+RECORD = struct.Struct('<12fH')     # normal, 3 corners, attribute bytes
+CORNERS = struct.Struct('<12x9f2x')     # the corners alone
+
+
+def read_stl(filename, quantum=QUANTUM):
+    """Return a mesh.Mesh of the triangles in binary or ASCII STL file."""
+    with open(filename, 'rb') as f:
+        head = f.read(HEADER + 4)
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(0)
+        if len(head) == HEADER + 4:
+            count = struct.unpack('<I', head[HEADER:])[0]
+            if size == HEADER + 4 + count * RECORD.size:
+                f.seek(HEADER + 4)
+                if numpy is not None:
+                    return _read_binary_numpy(f, count, quantum)
+                return _read_binary(f, count, quantum)
+        if not head.lstrip().startswith(b'solid'):
+            raise ValueError('%s is not an STL file' % filename)
+    with open(filename, 'r', errors='replace') as f:
+        return _read_ascii(f, quantum)
+
+
+class _Welder:
+    """Merges triangle corners into indexed vertices."""
+
+    def __init__(self, quantum):
+        self.scale = 1 / quantum
+        self.vertex_map = {}    # {(i, j, k) rounded coords: index}
+        self.vertices = array('d')
+        self.face_index = array('i')
+
+    def add(self, xyz):
+        """Add the triangles of the flat corner coords xyz (9 per
+        triangle), leaving out those that collapse to a line or point."""
+        vertex_map = self.vertex_map
+        vertices = self.vertices
+        scale = self.scale
+        tri = [0, 0, 0]
+        it = iter(xyz)
+        for n, (x, y, z) in enumerate(zip(it, it, it)):
+            key = (round(x*scale), round(y*scale), round(z*scale))
+            i = vertex_map.get(key)
+            if i is None:
+                i = vertex_map[key] = len(vertices) // 3
+                vertices.extend((x, y, z))
+            tri[n % 3] = i
+            if n % 3 == 2 and tri[0] != tri[1] != tri[2] != tri[0]:
+                self.face_index.extend(tri)
+
+    def mesh(self):
+        n = len(self.face_index) // 3
+        return mesh.Mesh(self.vertices, array('i', range(0, 3*n + 1, 3)),
+                         self.face_index)
+
+
+def _read_binary(f, count, quantum):
+    welder = _Welder(quantum)
+    while count:
+        n = min(count, BLOCK)
+        data = f.read(n * RECORD.size)
+        xyz = array('f')
+        for corners in CORNERS.iter_unpack(data):
+            xyz.extend(corners)
+        welder.add(xyz)
+        count -= n
+    return welder.mesh()
+
+
+def _read_binary_numpy(f, count, quantum):
+    record = numpy.dtype([('normal', '<f4', 3), ('corners', '<f4', 9),
+                          ('attribute', '<u2')])
+    corners = numpy.fromfile(f, dtype=record, count=count)['corners']
+    xyz = corners.reshape(-1, 3).astype(float)
+    keys = numpy.round(xyz / quantum).astype(numpy.int64)
+    keys, first, inverse = numpy.unique(keys, axis=0, return_index=True,
+                                        return_inverse=True)
+    tris = inverse.reshape(-1, 3)
+    keep = ((tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) &
+            (tris[:, 2] != tris[:, 0]))
+    tris = tris[keep]
+    return mesh.Mesh(xyz[first].ravel().tolist(),
+                     list(range(0, 3*len(tris) + 1, 3)),
+                     tris.ravel().tolist())
+
+
+def _read_ascii(f, quantum):
+    welder = _Welder(quantum)
+    xyz = array('d')
+    for line in f:
+        words = line.split()
+        if words and words[0] == 'vertex':
+            xyz.extend(float(w) for w in words[1:4])
+            if len(xyz) >= 9 * BLOCK:
+                welder.add(xyz)
+                xyz = array('d')
+    welder.add(xyz)
+    return welder.mesh()
+
+
+def triangles(part):
+    """Yield (f, a, b, c): the faces of part split into fans of triangles
+    (vertex indices a, b, c), with the face each came from."""
+    start = part.face_start
+    index = part.face_index
+    for f in range(part.face_count()):
+        face = index[start[f]:start[f+1]]
+        for k in range(1, len(face) - 1):
+            yield f, face[0], face[k], face[k+1]
+
+
+def write_stl(part, filename, binary=True, name='pyurcad'):
+    """Write the faces of mesh.Mesh part to an STL file."""
+    if binary:
+        _write_binary(part, filename, name)
+    else:
+        _write_ascii(part, filename, name)
+
+
+def _write_binary(part, filename, name):
+    v = part.vertices
+    normals = part.normals
+    start = part.face_start
+    count = sum(max(0, start[f+1] - start[f] - 2)
+                for f in range(part.face_count()))
+    with open(filename, 'wb') as f:
+        f.write(name.encode('ascii', 'replace')[:HEADER].ljust(HEADER))
+        f.write(struct.pack('<I', count))
+        block = bytearray()
+        for face, a, b, c in triangles(part):
+            block += RECORD.pack(*normals[3*face:3*face+3], *v[3*a:3*a+3],
+                                 *v[3*b:3*b+3], *v[3*c:3*c+3], 0)
+            if len(block) >= BLOCK * RECORD.size:
+                f.write(block)
+                block = bytearray()
+        f.write(block)
+
+
+def _write_ascii(part, filename, name):
+    v = part.vertices
+    normals = part.normals
+    with open(filename, 'w') as f:
+        f.write('solid %s\n' % name)
+        for face, a, b, c in triangles(part):
+            f.write('  facet normal %e %e %e\n'
+                    % tuple(normals[3*face:3*face+3]))
+            f.write('    outer loop\n')
+            for i in (a, b, c):
+                f.write('      vertex %e %e %e\n' % tuple(v[3*i:3*i+3]))
+            f.write('    endloop\n')
+            f.write('  endfacet\n')
+        f.write('endsolid %s\n' % name)
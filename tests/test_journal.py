@@ -0,0 +1,133 @@
+"""Round trips of the drawing journal (journal.py)."""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import entities
+import journal
+
+
+def gl(x):
+    return entities.GL((((x, 0.0), (x, 1.0)), 'white'))
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.drawing = os.path.join(self.dir, 'a.pkl')
+        self.write_base([])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_base(self, drawlist):
+        with open(self.drawing, 'wb') as f:
+            pickle.dump(drawlist, f)
+
+    def test_new_journal_is_empty(self):
+        j = journal.Journal(self.drawing)
+        j.close()
+        self.assertEqual(journal.recover(self.drawing), ([], []))
+
+    def test_saved_and_unsaved(self):
+        j = journal.Journal(self.drawing)
+        j.append({'+': {gl(1)}, '-': set()})
+        j.mark_saved()
+        j.append({'+': {gl(2)}, '-': set()})
+        j.close()
+        saved, unsaved = journal.recover(self.drawing)
+        self.assertEqual(saved, [{'+': [('gl', gl(1).get_attribs())],
+                                  '-': []}])
+        self.assertEqual(unsaved, [{'+': [('gl', gl(2).get_attribs())],
+                                    '-': []}])
+
+    def test_apply_delta(self):
+        drawlist = [{'gl': gl(1).get_attribs()}]
+        journal.apply_delta(drawlist, {'+': [('gl', gl(2).get_attribs())],
+                                       '-': [('gl', gl(1).get_attribs())]})
+        self.assertEqual(drawlist, [{'gl': gl(2).get_attribs()}])
+
+    def test_reopen_drops_unsaved(self):
+        j = journal.Journal(self.drawing)
+        j.append({'+': {gl(1)}, '-': set()})
+        j.mark_saved()
+        j.append({'+': {gl(2)}, '-': set()})
+        j.close()
+        j = journal.Journal(self.drawing)
+        self.assertEqual(j.count, 1)
+        j.append({'+': {gl(3)}, '-': set()})
+        j.close()
+        saved, unsaved = journal.recover(self.drawing)
+        self.assertEqual(len(saved), 1)
+        self.assertEqual(unsaved[0]['+'], [('gl', gl(3).get_attribs())])
+
+    def test_discard_unsaved(self):
+        j = journal.Journal(self.drawing)
+        j.append({'+': {gl(1)}, '-': set()})
+        j.mark_saved()
+        j.append({'+': {gl(2)}, '-': set()})
+        j.discard_unsaved()
+        self.assertEqual(j.count, 1)
+        j.close()
+        saved, unsaved = journal.recover(self.drawing)
+        self.assertEqual((len(saved), unsaved), (1, []))
+
+    def test_torn_record(self):
+        j = journal.Journal(self.drawing)
+        j.append({'+': {gl(1)}, '-': set()})
+        j.mark_saved()
+        j.append({'+': {gl(2)}, '-': set()})
+        j.close()
+        path = journal.journal_path(self.drawing)
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 3)
+        saved, unsaved = journal.recover(self.drawing)
+        self.assertEqual((len(saved), unsaved), (1, []))
+        j = journal.Journal(self.drawing)   # the torn tail is cut off
+        j.append({'+': {gl(3)}, '-': set()})
+        j.close()
+        saved, unsaved = journal.recover(self.drawing)
+        self.assertEqual(unsaved[0]['+'], [('gl', gl(3).get_attribs())])
+
+    def test_corrupt_record(self):
+        j = journal.Journal(self.drawing)
+        j.append({'+': {gl(1)}, '-': set()})
+        j.close()
+        path = journal.journal_path(self.drawing)
+        with open(path, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xff]))
+        self.assertEqual(journal.recover(self.drawing), ([], []))
+
+    def test_stale_base_stamp(self):
+        j = journal.Journal(self.drawing)
+        j.append({'+': {gl(1)}, '-': set()})
+        j.mark_saved()
+        j.close()
+        self.write_base([{'gl': gl(5).get_attribs()},
+                         {'gl': gl(6).get_attribs()}])
+        self.assertEqual(journal.recover(self.drawing), ([], []))
+        j = journal.Journal(self.drawing)   # starts a new journal
+        self.assertEqual(j.count, 0)
+        j.close()
+        self.assertEqual(journal.recover(self.drawing), ([], []))
+
+    def test_reset(self):
+        j = journal.Journal(self.drawing)
+        j.append({'+': {gl(1)}, '-': set()})
+        j.mark_saved()
+        j.close()
+        j = journal.Journal(self.drawing, reset=True)
+        self.assertEqual(j.count, 0)
+        j.close()
+        self.assertEqual(journal.recover(self.drawing), ([], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
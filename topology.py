@@ -0,0 +1,169 @@
+"""Endpoint connectivity of the drawing's geometry.
+
+Lines, arcs and open polylines meet at their end points. Rather than
+comparing every pair of them, a TopologyIndex hashes each end point into
+a square cell of side TOL of a uniform grid, so the ends meeting a point
+are found by looking in the cell holding it and its 8 neighbours. Chains
+of items meeting end to end, closed loops and dangling ends are then
+found in time about proportional to the number of items.
+
+The index is a listener of the drawing's VersionedDict: it is told of
+each entity added or removed, so it is kept up to date by the edits
+themselves, with no rebuilding.
+"""
+
+import math
+
+TOL = 1e-6      # ends closer than this (mm) meet, as for same_pt_p
+
+
+def end_points(entity):
+    """Return (p0, p1), the end points of a gl, ga or open pl entity, or
+    None for other entities."""
+    if entity.type == 'gl':
+        p0, p1 = entity.coords
+        return (tuple(p0), tuple(p1))
+    if entity.type == 'ga':
+        (x, y), r, a0, a1 = entity.coords
+        a0 = math.radians(a0)
+        a1 = math.radians(a1)
+        return ((x + r*math.cos(a0), y + r*math.sin(a0)),
+                (x + r*math.cos(a1), y + r*math.sin(a1)))
+    if entity.type == 'pl':
+        points, bulges, closed = entity.coords
+        if not closed and len(points) >= 4:
+            return (tuple(points[:2]), tuple(points[-2:]))
+    return None
+
+
+class TopologyIndex:
+    """Hash of the end points of the geometry items of a drawing.
+
+    Items are known by their keys (handles) in the drawing. Closed
+    polylines and circles have no ends, but each is a loop by itself."""
+
+    def __init__(self, tol=TOL):
+        self.tol = tol
+        self.cells = {}     # {(i, j): {(handle, end), ...}}
+        self.ends = {}      # {handle: (p0, p1)}
+        self.closed = set()     # handles of closed polylines & circles
+
+    def attach(self, curr):
+        """Index the entities of VersionedDict curr, and follow its
+        changes from now on."""
+        for handle, entity in curr.items():
+            self.added(handle, entity)
+        curr.listeners.append(self)
+
+    def detach(self, curr):
+        curr.listeners.remove(self)
+        self.cells.clear()
+        self.ends.clear()
+        self.closed.clear()
+
+    def _cell(self, p):
+        return (math.floor(p[0] / self.tol), math.floor(p[1] / self.tol))
+
+    # -- listener -----------------------------------------------------------
+
+    def added(self, handle, entity):
+        ends = end_points(entity)
+        if ends is not None:
+            self.ends[handle] = ends
+            for k, p in enumerate(ends):
+                self.cells.setdefault(self._cell(p), set()).add((handle, k))
+        elif entity.type == 'gc':
+            self.closed.add(handle)
+        elif entity.type == 'pl' and entity.coords[2]:
+            self.closed.add(handle)
+
+    def removed(self, handle, entity):
+        ends = self.ends.pop(handle, None)
+        if ends is not None:
+            for k, p in enumerate(ends):
+                cell = self._cell(p)
+                members = self.cells[cell]
+                members.discard((handle, k))
+                if not members:
+                    del self.cells[cell]
+        self.closed.discard(handle)
+
+    # -- queries ------------------------------------------------------------
+
+    def at(self, p):
+        """Return [(handle, end), ...] of the ends meeting point p."""
+        i, j = self._cell(p)
+        tol2 = self.tol * self.tol
+        found = []
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                for handle, k in self.cells.get((i + di, j + dj), ()):
+                    q = self.ends[handle][k]
+                    if (q[0] - p[0])**2 + (q[1] - p[1])**2 <= tol2:
+                        found.append((handle, k))
+        return found
+
+    def common_pt(self, handle1, handle2):
+        """Return (common pt, other end of 1, other end of 2) of two items
+        meeting end to end, or None (as geometryhelpers.find_common_pt)."""
+        for k, p in enumerate(self.ends.get(handle1, ())):
+            for h, j in self.at(p):
+                if h == handle2:
+                    return (p, self.ends[handle1][1 - k],
+                            self.ends[handle2][1 - j])
+        return None
+
+    def chain(self, handle):
+        """Return (handles, closed): the chain of items meeting end to end
+        through handle, in order, and whether it closes on itself. The
+        chain stops at an end where other than two items meet."""
+        if handle in self.closed:
+            return [handle], True
+        if handle not in self.ends:
+            return [], False
+        ahead, closed = self._walk(handle, 1, {handle})
+        if closed:
+            return [handle] + ahead, True
+        behind, _ = self._walk(handle, 0, {handle} | set(ahead))
+        return behind[::-1] + [handle] + ahead, False
+
+    def _walk(self, handle, k, seen):
+        """Follow the chain from end k of handle; return (handles, closed)."""
+        start = handle
+        found = []
+        while True:
+            meeting = [(h, j) for h, j in self.at(self.ends[handle][k])
+                       if h != handle]
+            if len(meeting) != 1:   # a dangling end or a branch
+                return found, False
+            handle, j = meeting[0]
+            if handle == start:
+                return found, True
+            if handle in seen:
+                return found, False
+            seen.add(handle)
+            found.append(handle)
+            k = 1 - j
+
+    def loops(self):
+        """Return a list of the closed chains of items, each a list of
+        handles in order (closed polylines and circles alone)."""
+        loops = [[handle] for handle in self.closed]
+        seen = set()
+        for handle in self.ends:
+            if handle in seen:
+                continue
+            handles, closed = self.chain(handle)
+            seen.update(handles)
+            if closed:
+                loops.append(handles)
+        return loops
+
+    def dangling(self):
+        """Return [(handle, point), ...] of the ends meeting no other."""
+        found = []
+        for handle, ends in self.ends.items():
+            for k, p in enumerate(ends):
+                if not any(h != handle or j != k for h, j in self.at(p)):
+                    found.append((handle, p))
+        return found
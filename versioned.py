@@ -0,0 +1,148 @@
+"""Versioned dictionary used for the drawing's {handle: entity} map.
+
+Rather than copying the whole map to remember a previous state, every
+change is appended to a log. A snapshot is just a position in that log,
+so taking one is O(1), and the difference between a snapshot and the
+present is found by walking only the changes made since.
+
+Listeners (objects with added(key, value) and removed(key, value)
+methods) may be attached, to keep indexes of the entities up to date as
+each change is made.
+"""
+
+
+class VersionedDict(dict):
+    """dict that records its changes so that snapshots are cheap.
+
+    Values are compared by value (== and hash), as the entity objects
+    are, so that deleting an entity and creating an equal one in its
+    place (as regen does) does not show up as a difference."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._log = []      # (value, +n | -n) changes since the snapshot
+        self._fold_at = 1024
+        self._version = 0   # incremented on every change
+        self._snap = 0      # version of the most recent snapshot
+        self._counts = {}   # {value: number of keys holding that value}
+        self.listeners = []     # told of each key added or removed
+        self.update(*args, **kwargs)
+
+    # -- mutation -----------------------------------------------------------
+
+    def __setitem__(self, key, value):
+        if key in self:
+            old = dict.__getitem__(self, key)
+            self._removed(old)
+            for listener in self.listeners:
+                listener.removed(key, old)
+        dict.__setitem__(self, key, value)
+        self._added(value)
+        for listener in self.listeners:
+            listener.added(key, value)
+
+    def __delitem__(self, key):
+        value = dict.__getitem__(self, key)
+        dict.__delitem__(self, key)
+        self._removed(value)
+        for listener in self.listeners:
+            listener.removed(key, value)
+
+    def pop(self, key, *default):
+        if key in self:
+            value = dict.__getitem__(self, key)
+            del self[key]
+            return value
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        self._removed(value)
+        for listener in self.listeners:
+            listener.removed(key, value)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        for key, value in dict.items(self):
+            self._removed(value)
+            for listener in self.listeners:
+                listener.removed(key, value)
+        dict.clear(self)
+
+    def copy(self):
+        return dict(self)
+
+    def _added(self, value):
+        self._counts[value] = self._counts.get(value, 0) + 1
+        self._log.append((value, 1))
+        self._version += 1
+        if len(self._log) > self._fold_at:
+            self._fold()
+
+    def _removed(self, value):
+        n = self._counts[value] - 1
+        if n:
+            self._counts[value] = n
+        else:
+            del self._counts[value]
+        self._log.append((value, -1))
+        self._version += 1
+        if len(self._log) > self._fold_at:
+            self._fold()
+
+    def _fold(self):
+        """Collapse the log to one net entry per value.
+
+        Repeated regens delete and recreate the same entities over and
+        over; folding keeps the log proportional to the real changes."""
+        self._log = [(value, n) for value, n in self._net().items() if n]
+        self._fold_at = 2 * len(self._log) + 1024
+
+    def _net(self):
+        net = {}
+        for value, n in self._log:
+            net[value] = net.get(value, 0) + n
+        return net
+
+    # -- versions -----------------------------------------------------------
+
+    def snapshot(self):
+        """Return a version number identifying the current contents.
+
+        Taking a snapshot releases all earlier ones; only the most recent
+        snapshot may be passed to diff()."""
+        self._log.clear()
+        self._fold_at = 1024
+        self._snap = self._version
+        return self._version
+
+    def changed(self, version):
+        """Return True if anything was changed since version."""
+        return self._version != version
+
+    def diff(self, version):
+        """Return (plus, minus) sets of values added / removed since version.
+
+        A value counts as added if no key held it at version but some key
+        holds it now, and as removed in the opposite case."""
+        if version != self._snap:
+            raise ValueError('version %s is no longer available' % version)
+        plus = set()
+        minus = set()
+        for value, n in self._net().items():
+            now = self._counts.get(value, 0)
+            then = now - n
+            if now and not then:
+                plus.add(value)
+            elif then and not now:
+                minus.add(value)
+        return plus, minus